@@ -1,29 +1,117 @@
-import json
 import os
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.responses import FileResponse, JSONResponse
+import gzip
+import importlib.util
+import tempfile
+import hashlib
+import heapq
+import threading
+import time
+from fastapi import FastAPI, HTTPException, Body, Request
+from fastapi.responses import JSONResponse, Response, PlainTextResponse, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import networkx as nx
 from networkx.readwrite import json_graph
 import sys
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from collections import deque
+
+try:
+    import brotli # Optional: enables "br" content encoding
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl # POSIX only: serialises writes to the data files across uvicorn workers
+except ImportError:
+    fcntl = None
 
 # Add project root to sys.path to allow importing from trabajo_modulado
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from trabajo_modulado.utils.reporting import generate_report_pdf
-from trabajo_modulado.model.nodo import generar_nodos # For type hinting if needed, not direct use
-from trabajo_modulado.model.order import generar_ordenes # For type hinting
-from trabajo_modulado.model.ruta import calcular_costo
+from trabajo_modulado.model.ruta import calcular_costo, ESTADISTICAS_BUSQUEDA
+from trabajo_modulado.model.grafo_dinamico import GrafoDinamico
+from trabajo_modulado.model.indice_espacial import IndiceEspacial
+from trabajo_modulado.model.avl import IndiceRutas
+from trabajo_modulado.model.order import crear_orden, siguiente_numero_orden
+from trabajo_modulado.model.despacho import PlanificadorDespacho, clave_prioridad
+from trabajo_modulado.model.recorridos import PlanificadorRecorridos
+from trabajo_modulado.utils.serialization import dumps, loads, load_file, dump_file, append_array_file, DecodeError
+from trabajo_modulado.utils import metrics
 
 
-DATA_DIR = "api/data"
+DATA_DIR = os.environ.get("API_DATA_DIR", "api/data") # Overridable to serve other datasets (e.g. load tests)
 NODOS_FILE = os.path.join(DATA_DIR, "nodos.json")
 ORDENES_FILE = os.path.join(DATA_DIR, "ordenes.json")
 RUTAS_USADAS_FILE = os.path.join(DATA_DIR, "rutas_usadas.json")
+INDICE_RUTAS_FILE = os.path.join(DATA_DIR, "indice_rutas.json") # Route AVL index persisted next to rutas_usadas.json
 GRAFO_FILE = os.path.join(DATA_DIR, "grafo.json")
+DATA_LOCK_FILE = os.path.join(DATA_DIR, ".escritura.lock") # flock target shared by every worker process
+REPORT_CHART_MODES = ("vector", "png") # Same values as GRAFICOS_VECTORIALES / GRAFICOS_PNG in utils.reporting
+REPORT_DPI_MIN, REPORT_DPI_MAX = 50, 600
+REPORT_APPENDICES = {"clients": "clientes", "nodes": "nodos", "routes": "rutas"} # API name -> key of APENDICES in utils.reporting
+APPENDIX_FORMATS = ("csv", "parquet") # Same values as FORMATO_CSV / FORMATO_PARQUET in utils.reporting
+SNAP_MAX_KM = float(os.environ.get("API_SNAP_MAX_KM", "5")) # Farthest a coordinate may be from the node it snaps to
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with the fastest available backend (orjson, msgspec or json)."""
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# --- Metrics ---
+REQUEST_LATENCY = metrics.Histogram("api_request_duration_seconds", "HTTP request latency by route template.",
+                                    ["method", "route", "status"])
+DATA_LOAD_SECONDS = metrics.Histogram("api_data_load_seconds", "Time spent reading and parsing a data file.", ["file"])
+DATA_CACHE_LOOKUPS = metrics.Counter("api_data_cache_lookups_total", "Data file loads served from cache or disk.",
+                                     ["file", "result"])
+INDEX_BUILD_SECONDS = metrics.Histogram("api_index_build_seconds", "Time spent building a derived index (node index, spatial index, graph).",
+                                        ["file"])
+PDF_RENDER_SECONDS = metrics.Histogram("api_report_pdf_render_seconds", "Time spent rendering the PDF report.",
+                                       buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+PDF_RENDER_ERRORS = metrics.Counter("api_report_pdf_errors_total", "PDF report renders that failed.")
+ROUTE_SEARCHES = metrics.Counter("route_search_total", "Battery-constrained route searches run.", ["algorithm"])
+ROUTE_STATES_EXPANDED = metrics.Counter("route_search_states_expanded_total", "Search states expanded.", ["algorithm"])
+ROUTE_QUEUE_PEAK = metrics.Gauge("route_search_queue_peak", "Largest queue size reached by a single search.", ["algorithm"])
+ROUTE_CACHE_HITS = metrics.Counter("route_search_cache_hits_total", "Route lookups answered without a new search.", ["algorithm"])
+ORDERS_DISPATCHED = metrics.Counter("orders_dispatched_total", "Orders handed to drones by the dispatch scheduler.")
+GRAPH_VERSION = metrics.Gauge("graph_version", "Version of the served graph; bumped by every batch of edge changes.")
+ROUTES_INVALIDATED = metrics.Counter("route_cache_invalidations_total", "Cached routes dropped because an edge they use changed.")
+
+class MetricsMiddleware:
+    """Records request latency labelled by route template (not raw path, to bound label cardinality)."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
 
-app = FastAPI(title="Correos Chile Drone Simulation API", version="1.0.0")
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route") # Set by the router once a route matches
+            REQUEST_LATENCY.observe(time.perf_counter() - start, method=scope["method"],
+                                    route=getattr(route, "path", "unmatched"), status=status[0])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up(preload_reports=os.environ.get("API_PRELOAD_REPORTS") == "1")
+    yield
+
+app = FastAPI(title="Correos Chile Drone Simulation API", version="1.0.0",
+              default_response_class=FastJSONResponse, lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 # --- Pydantic Models ---
 class NodeModel(BaseModel):
@@ -53,27 +141,359 @@ class ClientDetailModel(NodeModel):
 class OrderUpdateStatusModel(BaseModel):
     status: str # "Cancelled" or "Completed"
 
+class OrderCreateModel(BaseModel):
+    origen: Optional[str] = None # Client node ID; if omitted, lat/lon snap to the nearest client
+    destino: Optional[str] = None # Storage node ID; if omitted, the storage nearest to the client
+    prioridad: int = Field(1, ge=1, le=3)
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
+
+class NearbyNodeModel(NodeModel):
+    distancia_km: float
+
+class EdgeUpdateModel(BaseModel):
+    origen: str
+    destino: str
+    peso: Optional[float] = Field(None, gt=0) # New weight; also reopens a closed edge
+    cerrada: Optional[bool] = None # True closes the edge, False reopens it
+
+class DispatchRequestModel(BaseModel):
+    drones: int = Field(1, ge=1) # Drones available now; each one takes a batch
+    max_por_lote: int = Field(1, ge=1) # Orders per batch, all bound to the same storage node
+    destino: Optional[str] = None # Only dispatch orders bound to this storage node
+
+class DispatchBatchModel(BaseModel):
+    destino: str
+    ordenes: List[OrderModel]
+
 # --- Data Loading Helper Functions ---
+def stat_version(stat: os.stat_result):
+    # dump_file replaces files with os.replace, so a rewrite always gets a new inode even
+    # when size and mtime (coarse on some filesystems) come out the same
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def file_version(file_path: str):
+    return stat_version(os.stat(file_path))
+
+# Version of each data file read by load_data/read_data_bytes, recorded while a
+# response body is built inside track_loaded_versions (see conditional_response)
+_loaded_versions: ContextVar[Optional[Dict[str, Any]]] = ContextVar("loaded_versions", default=None)
+
+def record_loaded_version(file_path: str, version):
+    loaded = _loaded_versions.get()
+    if loaded is not None:
+        loaded[file_path] = version
+
+@contextmanager
+def track_loaded_versions():
+    token = _loaded_versions.set({})
+    try:
+        yield
+    finally:
+        _loaded_versions.reset(token)
+
+# Parsed data files, keyed by path and reused while the file is unchanged on disk.
+# The returned objects are shared with every other request (and worker threads), so
+# they are never modified: endpoints build new ones and save_data puts them in the
+# cache only once they are on disk. A failed save leaves the cache matching the files.
+_data_cache: Dict[str, Any] = {}
+
 def load_data(file_path: str):
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail=f"Data file not found: {os.path.basename(file_path)}. Run simulation first.")
+    file_name = os.path.basename(file_path)
+    version = file_version(file_path)
+    cached = _data_cache.get(file_path)
+    if cached is not None and cached[0] == version:
+        DATA_CACHE_LOOKUPS.inc(file=file_name, result="hit")
+        record_loaded_version(file_path, version)
+        return cached[1]
+    DATA_CACHE_LOOKUPS.inc(file=file_name, result="miss")
+    start = time.perf_counter()
     try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
+        with open(file_path, "rb") as f:
+            # Version of the file actually read, in case it was replaced after the stat above
+            version = stat_version(os.fstat(f.fileno()))
+            data = loads(f.read())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Data file not found: {file_name}. Run simulation first.")
+    except DecodeError:
         raise HTTPException(status_code=500, detail=f"Error decoding JSON from {os.path.basename(file_path)}.")
+    DATA_LOAD_SECONDS.observe(time.perf_counter() - start, file=file_name)
+    _data_cache[file_path] = (version, data)
+    record_loaded_version(file_path, version)
+    return data
 
-def save_data(file_path: str, data: Any):
+def read_data_bytes(file_path: str) -> bytes:
+    """Raw contents of a data file, recording the version read like load_data."""
     try:
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=4)
+        with open(file_path, "rb") as f:
+            record_loaded_version(file_path, stat_version(os.fstat(f.fileno())))
+            return f.read()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Data file not found: {os.path.basename(file_path)}. Run simulation first.")
+
+def save_data(file_path: str, data: Any, appended: Optional[List] = None):
+    """
+    Writes data to file_path and caches it. `appended` are the items data adds at the end of
+    the array loaded from the file (under data_lock); only they are encoded.
+    """
+    try:
+        stat = dump_file(file_path, data) if appended is None else append_array_file(file_path, appended)
     except Exception as e:
+        _data_cache.pop(file_path, None)
         raise HTTPException(status_code=500, detail=f"Error saving data to {os.path.basename(file_path)}: {e}")
+    # Keyed by the written file itself, not a later stat that could see another writer's file
+    _data_cache[file_path] = (stat_version(stat), data)
+
+_data_lock = threading.Lock()
+
+@contextmanager
+def data_lock():
+    """
+    Exclusive lock for a load -> modify -> save of the data files, taken by
+    the threads of this process and, through flock on DATA_LOCK_FILE, by every
+    worker process (without fcntl only the first applies). load_data re-checks
+    the file version, so data loaded inside the lock includes every write made
+    by another worker before it.
+    """
+    with _data_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(DATA_DIR, exist_ok=True)
+        with open(DATA_LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file is closed
+            yield
+
+# The in-memory dynamic graph is updated in place by update_edges (under data_lock, in
+# a worker thread). Graph readers that run outside data_lock hold this lock instead, so
+# they never see a change half-applied; it is only held for in-memory work.
+graph_lock = threading.Lock()
 
 def load_graph():
     data = load_data(GRAFO_FILE)
     return json_graph.node_link_graph(data)
 
+# Derived structures (node index, parsed graph) are rebuilt only when the
+# underlying file changes on disk, so hot endpoints don't re-parse them per request.
+_derived_cache: Dict[str, Any] = {}
+
+def get_cached(file_path: str, builder, key: Optional[str] = None):
+    """Structure derived from file_path, cached under `key` (default: the path) until the file changes."""
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"Data file not found: {os.path.basename(file_path)}. Run simulation first.")
+    key = key or file_path
+    version = file_version(file_path)
+    cached = _derived_cache.get(key)
+    if cached is None or cached[0] != version:
+        start = time.perf_counter()
+        cached = (version, builder())
+        INDEX_BUILD_SECONDS.observe(time.perf_counter() - start, file=os.path.basename(file_path))
+        _derived_cache[key] = cached
+    return cached[1]
+
+def get_node_index() -> Dict[str, Dict]:
+    return get_cached(NODOS_FILE, lambda: {node["id"]: node for node in load_data(NODOS_FILE)})
+
+def get_spatial_index() -> IndiceEspacial:
+    return get_cached(NODOS_FILE, lambda: IndiceEspacial(load_data(NODOS_FILE)), key="indice_espacial")
+
+def get_dynamic_graph() -> GrafoDinamico:
+    # The graph, its route cache and derived data are only rebuilt if grafo.json changes outside the API
+    return get_cached(GRAFO_FILE, lambda: GrafoDinamico(load_graph()))
+
+def get_graph():
+    return get_dynamic_graph().G
+
+def load_route_index() -> IndiceRutas:
+    rutas_usadas = load_data(RUTAS_USADAS_FILE)
+    try:
+        indice = IndiceRutas.desde_dict(load_file(INDICE_RUTAS_FILE))
+    except (OSError, ValueError, KeyError, TypeError, *DecodeError):
+        indice = IndiceRutas()
+    # An index for another version of rutas_usadas (or none) is brought up to date only on the routes that differ
+    indice.sincronizar(rutas_usadas)
+    return indice
+
+def get_route_index() -> IndiceRutas:
+    return get_cached(RUTAS_USADAS_FILE, load_route_index, key="indice_rutas")
+
+def save_route_index(indice: IndiceRutas):
+    save_data(INDICE_RUTAS_FILE, indice.a_dict())
+    # Call after saving rutas_usadas.json: the index in memory matches that version and is kept
+    _derived_cache["indice_rutas"] = (_data_cache[RUTAS_USADAS_FILE][0], indice)
+    _route_index_unsaved[0] = 0
+
+# Routes registered in the cached index since indice_rutas.json was last written. The file
+# only speeds up loading: load_route_index syncs an older one with rutas_usadas.json
+ROUTE_INDEX_SAVE_EVERY = 1000
+_route_index_unsaved = [0]
+
+def keep_route_index(indice: IndiceRutas, cambios: int):
+    """
+    Keeps the index, already updated in place, for the rutas_usadas.json just saved, and
+    writes indice_rutas.json once ROUTE_INDEX_SAVE_EVERY routes have changed since the last write.
+    """
+    _derived_cache["indice_rutas"] = (_data_cache[RUTAS_USADAS_FILE][0], indice)
+    _route_index_unsaved[0] += cambios
+    if _route_index_unsaved[0] >= ROUTE_INDEX_SAVE_EVERY:
+        save_route_index(indice)
+
+def get_dispatch_planner() -> PlanificadorDespacho:
+    # Call under data_lock: the endpoints that write ordenes.json apply the same changes to the queue
+    return get_cached(ORDENES_FILE, lambda: PlanificadorDespacho.desde_ordenes(load_data(ORDENES_FILE)), key="despacho")
+
+def next_order_number() -> int:
+    # Call under data_lock; save_orders keeps it for the version it writes
+    return get_cached(ORDENES_FILE, lambda: siguiente_numero_orden(load_data(ORDENES_FILE)), key="siguiente_orden")
+
+def save_orders(ordenes_data: List[Dict], planificador: Optional[PlanificadorDespacho] = None,
+                siguiente_numero: Optional[int] = None, nuevas: Optional[List[Dict]] = None):
+    """
+    Saves ordenes.json. `planificador` is the cached dispatch queue with the same changes already
+    applied and is kept for the new version; without it, or if the save fails, the queue is
+    rebuilt from the file the next time it is needed. `siguiente_numero` is the next free order
+    number after new orders were added; otherwise the cached one carries over, since no writer
+    removes or renames orders. `nuevas` are the orders appended at the end, if that is the only change.
+    """
+    anterior = _data_cache.get(ORDENES_FILE, (None,))[0]
+    numero = _derived_cache.get("siguiente_orden")
+    try:
+        save_data(ORDENES_FILE, ordenes_data, appended=nuevas)
+    except Exception:
+        _derived_cache.pop("despacho", None)
+        _derived_cache.pop("siguiente_orden", None)
+        raise
+    version = _data_cache[ORDENES_FILE][0]
+    if planificador is None:
+        _derived_cache.pop("despacho", None)
+    else:
+        _derived_cache["despacho"] = (version, planificador)
+    if siguiente_numero is None and numero is not None and numero[0] == anterior:
+        siguiente_numero = numero[1]
+    if siguiente_numero is None:
+        _derived_cache.pop("siguiente_orden", None)
+    else:
+        _derived_cache["siguiente_orden"] = (version, siguiente_numero)
+
+def warm_up(preload_reports: bool = False):
+    """
+    Preloads the data files and the derived indexes (node index, spatial index, graph, route index) so the
+    first requests of a new worker don't pay for parsing them. Missing files are
+    skipped, since the simulation may not have run yet. With preload_reports the
+    report dependencies (matplotlib, pandas, reportlab) are imported as well;
+    otherwise they are loaded on the first report request.
+    """
+    for file_path in (NODOS_FILE, ORDENES_FILE, RUTAS_USADAS_FILE):
+        try:
+            load_data(file_path)
+        except HTTPException:
+            pass
+    for builder in (get_node_index, get_spatial_index, get_graph, get_route_index):
+        try:
+            builder()
+        except HTTPException:
+            pass
+    if preload_reports:
+        import trabajo_modulado.utils.reporting
+
+# --- Conditional GET / Compression Helpers ---
+COMPRESSION_MIN_SIZE = 1024 # Bytes; smaller bodies are sent uncompressed
+
+def data_version(*file_paths: str, variant: str = "", versions: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Strong validator for a response built only from the given data files.
+    Changes whenever any of the files is rewritten. `variant` tells apart
+    representations of the same data (e.g. report options); `versions`
+    gives file versions already known (e.g. the ones read), the other files
+    are stat'ed.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for file_path in file_paths:
+        version = (versions or {}).get(file_path)
+        if version is None:
+            if not os.path.exists(file_path):
+                raise HTTPException(status_code=404, detail=f"Data file not found: {os.path.basename(file_path)}. Run simulation first.")
+            version = file_version(file_path)
+        digest.update(f"{file_path}:{version}".encode())
+    if variant:
+        digest.update(f":{variant}".encode())
+    return digest.hexdigest()
+
+def loaded_data_version(*file_paths: str, variant: str = "") -> str:
+    """data_version of the files as read inside the current track_loaded_versions block."""
+    return data_version(*file_paths, variant=variant, versions=_loaded_versions.get())
+
+def make_etag(version: str, encoding: Optional[str] = None) -> str:
+    # Each content encoding is a different representation, so it gets its own strong ETag
+    return f'"{version}-{encoding}"' if encoding else f'"{version}"'
+
+def matching_etag(request: Request, version: str) -> Optional[str]:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return make_etag(version)
+        opaque = tag[2:] if tag.startswith("W/") else tag
+        if opaque.strip('"').split("-", 1)[0] == version:
+            return tag
+    return None
+
+def choose_encoding(request: Request) -> Optional[str]:
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+def conditional_response(request: Request, file_paths, build_body, media_type: str = "application/json",
+                         headers: Optional[Dict[str, str]] = None, variant: str = "") -> Response:
+    """
+    Answers 304 when the client already has the current version of the data
+    files in `file_paths` (see data_version); otherwise calls build_body() and
+    sends it compressed with the best encoding the client accepts. The ETag
+    comes from the file versions build_body actually read, so a file replaced
+    in between never labels new data with the old version.
+    """
+    response_headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache", **(headers or {})}
+    matched = matching_etag(request, data_version(*file_paths, variant=variant))
+    if matched:
+        response_headers["ETag"] = matched
+        return Response(status_code=304, headers=response_headers)
+
+    with track_loaded_versions():
+        body = build_body()
+        version = loaded_data_version(*file_paths, variant=variant)
+    return encoded_response(request, body, version, media_type, response_headers)
+
+def encoded_response(request: Request, body: bytes, version: str, media_type: str,
+                     response_headers: Dict[str, str]) -> Response:
+    """Sends body compressed with the best encoding the client accepts, tagged with `version`."""
+    encoding = choose_encoding(request) if len(body) >= COMPRESSION_MIN_SIZE else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=5)
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    response_headers["ETag"] = make_etag(version, encoding)
+    return Response(content=body, media_type=media_type, headers=response_headers)
+
 # --- Basic Check Endpoint ---
 @app.get("/")
 async def read_root():
@@ -81,31 +501,35 @@ async def read_root():
 
 # --- Client Endpoints ---
 @app.get("/clients/", response_model=List[ClientDetailModel], tags=["Clients"])
-async def get_all_clients():
+async def get_all_clients(request: Request):
     """
     Get the list of all registered clients with their total order count.
     """
-    nodos_data = load_data(NODOS_FILE)
-    ordenes_data = load_data(ORDENES_FILE)
-    
-    client_nodes = [node for node in nodos_data if node.get("role") == "client"]
-    
-    # Calculate total orders for each client
-    client_order_counts = {}
-    for order in ordenes_data:
-        client_id = order.get("cliente_id")
-        if client_id:
-            client_order_counts[client_id] = client_order_counts.get(client_id, 0) + 1
-            
-    result_clients = []
-    for client_node in client_nodes:
-        client_id = client_node.get("client_id")
-        total_orders = client_order_counts.get(client_id, 0)
-        # Create a dictionary from client_node and add total_ordenes
-        client_detail = {**client_node, "total_ordenes": total_orders}
-        result_clients.append(ClientDetailModel(**client_detail))
+    def build_body():
+        nodos_data = load_data(NODOS_FILE)
+        ordenes_data = load_data(ORDENES_FILE)
+        
+        client_nodes = [node for node in nodos_data if node.get("role") == "client"]
         
-    return result_clients
+        # Calculate total orders for each client
+        client_order_counts = {}
+        for order in ordenes_data:
+            client_id = order.get("cliente_id")
+            if client_id:
+                client_order_counts[client_id] = client_order_counts.get(client_id, 0) + 1
+                
+        result_clients = []
+        for client_node in client_nodes:
+            client_id = client_node.get("client_id")
+            total_orders = client_order_counts.get(client_id, 0)
+            # Create a dictionary from client_node and add total_ordenes
+            result_clients.append({**client_node, "total_ordenes": total_orders})
+            
+        # The data files are written by the simulation already in this shape, so the
+        # list is encoded directly instead of being re-validated model by model.
+        return dumps(result_clients)
+
+    return conditional_response(request, (NODOS_FILE, ORDENES_FILE), build_body)
 
 @app.get("/clients/{client_id}", response_model=ClientDetailModel, tags=["Clients"])
 async def get_client_by_id(client_id: str):
@@ -133,14 +557,50 @@ async def get_client_by_id(client_id: str):
     client_detail = {**client_node_data, "total_ordenes": total_orders}
     return ClientDetailModel(**client_detail)
 
+# --- Node Endpoints ---
+ROLES = ("client", "storage", "recharge")
+
+def nearby_nodes(resultado) -> List[Dict]:
+    node_index = get_node_index()
+    return [{**node_index[node_id], "distancia_km": distancia} for node_id, distancia in resultado]
+
+def check_role(role: Optional[str]):
+    if role is not None and role not in ROLES:
+        raise HTTPException(status_code=400, detail=f"role must be one of {', '.join(ROLES)}.")
+
+@app.get("/nodes/nearest", response_model=List[NearbyNodeModel], tags=["Nodes"])
+async def get_nearest_nodes(lat: float, lon: float, k: int = 1, role: Optional[str] = None):
+    """
+    The `k` nodes closest to a point (great-circle distance), optionally only
+    of one role, e.g. the nearest recharge station.
+    """
+    check_role(role)
+    if k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1.")
+    return FastJSONResponse(nearby_nodes(get_spatial_index().k_cercanos(lat, lon, k, role)))
+
+@app.get("/nodes/within", response_model=List[NearbyNodeModel], tags=["Nodes"])
+async def get_nodes_within(lat: float, lon: float, radio_km: float, role: Optional[str] = None):
+    """
+    Every node within `radio_km` of a point, closest first, optionally only of
+    one role, e.g. all clients within 2 km.
+    """
+    check_role(role)
+    if radio_km < 0:
+        raise HTTPException(status_code=400, detail="radio_km must not be negative.")
+    return FastJSONResponse(nearby_nodes(get_spatial_index().en_radio(lat, lon, radio_km, role)))
+
 # --- Order Endpoints ---
 @app.get("/orders/", response_model=List[OrderModel], tags=["Orders"])
-async def get_all_orders():
+async def get_all_orders(request: Request):
     """
     List all orders registered in the system.
     """
-    ordenes_data = load_data(ORDENES_FILE)
-    return [OrderModel(**order) for order in ordenes_data]
+    def build_body():
+        # The file already holds the JSON list of orders; send it without a parse/encode round trip
+        return read_data_bytes(ORDENES_FILE)
+
+    return conditional_response(request, (ORDENES_FILE,), build_body)
 
 @app.get("/orders/orders/{order_id}", response_model=OrderModel, tags=["Orders"])
 async def get_order_by_id(order_id: str):
@@ -153,96 +613,547 @@ async def get_order_by_id(order_id: str):
             return OrderModel(**order)
     raise HTTPException(status_code=404, detail=f"Order with ID '{order_id}' not found.")
 
+def with_updated_orders(ordenes_data: List[Dict], actualizadas: List[Dict]) -> List[Dict]:
+    """New orders list with `actualizadas` in place of the orders with the same id (the cached list is not modified)."""
+    por_id = {orden["id"]: orden for orden in actualizadas}
+    return [por_id.get(orden.get("id"), orden) for orden in ordenes_data]
+
 @app.post("/orders/orders/{order_id}/cancel", response_model=OrderModel, tags=["Orders"])
-async def cancel_order(order_id: str):
+def cancel_order(order_id: str):
     """
     Cancel a specific order. Order must be in 'Pendiente' status.
     """
-    ordenes_data = load_data(ORDENES_FILE)
-    order_found = False
-    updated_order = None
+    with data_lock():
+        ordenes_data = load_data(ORDENES_FILE)
+        order_found = False
+        updated_order = None
 
-    for order in ordenes_data:
-        if order.get("id") == order_id:
-            order_found = True
-            if order.get("status") == "Pendiente":
-                order["status"] = "Cancelled"
-                order["fecha_entrega"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S") # Or set to None/CancelDate
-                updated_order = order
-                break
-            else:
-                raise HTTPException(status_code=400, detail=f"Order '{order_id}' cannot be cancelled. Status is '{order.get('status')}'.")
+        for order in ordenes_data:
+            if order.get("id") == order_id:
+                order_found = True
+                if order.get("status") == "Pendiente":
+                    updated_order = {**order, "status": "Cancelled",
+                                     "fecha_entrega": datetime.now().strftime("%Y-%m-%d %H:%M:%S")} # Or set to None/CancelDate
+                    break
+                else:
+                    raise HTTPException(status_code=400, detail=f"Order '{order_id}' cannot be cancelled. Status is '{order.get('status')}'.")
     
-    if not order_found:
-        raise HTTPException(status_code=404, detail=f"Order with ID '{order_id}' not found.")
+        if not order_found:
+            raise HTTPException(status_code=404, detail=f"Order with ID '{order_id}' not found.")
     
-    save_data(ORDENES_FILE, ordenes_data)
-    return OrderModel(**updated_order)
+        planificador = get_dispatch_planner()
+        planificador.quitar(order_id)
+        save_orders(with_updated_orders(ordenes_data, [updated_order]), planificador)
+        return OrderModel(**updated_order)
 
 @app.post("/orders/orders/{order_id}/complete", response_model=OrderModel, tags=["Orders"])
-async def complete_order(order_id: str):
+def complete_order(order_id: str):
     """
-    Mark a specific order as completed. Order must be in 'Pendiente' status.
+    Mark a specific order as completed. Order must be in 'Pendiente' or 'En ruta' status.
     """
-    ordenes_data = load_data(ORDENES_FILE)
-    order_found = False
-    updated_order = None
+    with data_lock():
+        ordenes_data = load_data(ORDENES_FILE)
+        order_found = False
+        updated_order = None
 
-    for order in ordenes_data:
-        if order.get("id") == order_id:
-            order_found = True
-            if order.get("status") == "Pendiente": # Assuming only pending can be completed directly
-                order["status"] = "Delivered"
-                order["fecha_entrega"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                # Potentially calculate/update costo_total if not done before
-                updated_order = order
-                break
-            elif order.get("status") == "Delivered":
-                 raise HTTPException(status_code=400, detail=f"Order '{order_id}' is already completed.")
-            else:
-                raise HTTPException(status_code=400, detail=f"Order '{order_id}' cannot be marked as completed. Status is '{order.get('status')}'.")
+        for order in ordenes_data:
+            if order.get("id") == order_id:
+                order_found = True
+                if order.get("status") in ("Pendiente", "En ruta"):
+                    updated_order = {**order, "status": "Delivered", "fecha_entrega": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+                    # Potentially calculate/update costo_total if not done before
+                    break
+                elif order.get("status") == "Delivered":
+                     raise HTTPException(status_code=400, detail=f"Order '{order_id}' is already completed.")
+                else:
+                    raise HTTPException(status_code=400, detail=f"Order '{order_id}' cannot be marked as completed. Status is '{order.get('status')}'.")
 
-    if not order_found:
-        raise HTTPException(status_code=404, detail=f"Order with ID '{order_id}' not found.")
+        if not order_found:
+            raise HTTPException(status_code=404, detail=f"Order with ID '{order_id}' not found.")
         
-    save_data(ORDENES_FILE, ordenes_data)
-    return OrderModel(**updated_order)
+        planificador = get_dispatch_planner()
+        planificador.quitar(order_id)
+        save_orders(with_updated_orders(ordenes_data, [updated_order]), planificador)
+        return OrderModel(**updated_order)
 
-# --- Report Endpoints ---
-@app.get("/reports/reports/pdf", tags=["Reports"])
-async def get_simulation_report_pdf():
+def snap_order(i: int, nueva: OrderCreateModel, node_index: Dict[str, Dict]):
     """
-    Generate and return a PDF report summarizing system simulation data,
-    including routes, clients, nodes, and charts.
+    Fills a missing origin with the client node nearest to the order's lat/lon
+    and a missing destination with the storage node nearest to the client,
+    using the spatial index. Points farther than SNAP_MAX_KM from any node
+    of the needed role are rejected.
+    """
+    if nueva.origen is not None and nueva.destino is not None:
+        return
+    indice = get_spatial_index()
+    if nueva.origen is None:
+        if nueva.lat is None or nueva.lon is None:
+            raise HTTPException(status_code=400, detail=f"Order {i}: give either origen or lat/lon.")
+        cercano = indice.cercano(nueva.lat, nueva.lon, "client")
+        if cercano is None or cercano[1] > SNAP_MAX_KM:
+            raise HTTPException(status_code=400, detail=f"Order {i}: no client node within {SNAP_MAX_KM} km of ({nueva.lat}, {nueva.lon}).")
+        nueva.origen = cercano[0]
+    if nueva.destino is None:
+        cliente = node_index.get(nueva.origen)
+        if cliente is None:
+            raise HTTPException(status_code=400, detail=f"Order {i}: origin '{nueva.origen}' is not a client node.")
+        cercano = indice.cercano(cliente["lat"], cliente["lon"], "storage")
+        if cercano is None:
+            raise HTTPException(status_code=400, detail=f"Order {i}: there are no storage nodes.")
+        nueva.destino = cercano[0]
+
+class PendingIngestion:
+    """An ingestion request waiting in _ingest_queue; done once stored (creadas) or rejected (error)."""
+    __slots__ = ("nuevas", "creadas", "error", "done")
+
+    def __init__(self, nuevas: List[OrderCreateModel]):
+        self.nuevas = nuevas
+        self.creadas: List[Dict] = []
+        self.error: Optional[HTTPException] = None
+        self.done = False
+
+# Validated ingestion requests waiting for data_lock. Whoever gets the lock stores every
+# queued request with a single write of each file (group commit), so concurrent inserts
+# share the cost of rewriting ordenes.json instead of paying it one after another.
+_ingest_queue = deque()
+
+def store_queued_ingestions():
+    """
+    Routes and stores every queued ingestion request. Call under data_lock.
+    A request with an unroutable order is rejected on its own; a failed write
+    fails every request of the group.
     """
+    lote = []
+    while _ingest_queue:
+        lote.append(_ingest_queue.popleft())
     try:
-        nodos = load_data(NODOS_FILE)
-        ordenes = load_data(ORDENES_FILE)
-        rutas_usadas = load_data(RUTAS_USADAS_FILE)
-    except HTTPException as e: # Catch if data files are missing
-        if e.status_code == 404:
-             raise HTTPException(status_code=404, detail="Required data files (nodos, ordenes, rutas_usadas) not found. Run simulation first.")
-        raise e # Re-raise other HTTPExceptions from load_data
+        node_index = get_node_index()
+        # Routing inside the lock: update_edges cannot change the graph under it
+        rutas = get_dynamic_graph().rutas([(n.origen, n.destino) for p in lote for n in p.nuevas])
+        aceptadas = []
+        for pendiente in lote:
+            for i, nueva in enumerate(pendiente.nuevas):
+                if rutas[(nueva.origen, nueva.destino)][0] is None:
+                    pendiente.error = HTTPException(status_code=400, detail=f"Order {i}: no battery-feasible route from '{nueva.origen}' to '{nueva.destino}'.")
+                    break
+            else:
+                aceptadas.append(pendiente)
+        if not aceptadas:
+            return
+
+        ordenes_data = load_data(ORDENES_FILE)
+        # Kept per ordenes.json version, so ids don't need a scan of every order; under the
+        # lock, so no other worker takes the same ones
+        numero = next_order_number()
+        fecha_creacion = datetime.now()
+        rutas_nuevas = []
+        for pendiente in aceptadas:
+            for nueva in pendiente.nuevas:
+                ruta, costo = rutas[(nueva.origen, nueva.destino)]
+                orden = crear_orden(numero, node_index[nueva.origen], nueva.destino, nueva.prioridad, fecha_creacion)
+                orden["costo_total"] = costo
+                pendiente.creadas.append(orden)
+                numero += 1
+                rutas_nuevas.append(" → ".join(ruta))
+        creadas = [orden for pendiente in aceptadas for orden in pendiente.creadas]
+
+        planificador = get_dispatch_planner()
+        for orden in creadas:
+            planificador.agregar(orden)
+        # The cached lists may be in use by other requests: the new versions are new objects,
+        # which save_data puts in the cache once they are on disk
+        save_orders(ordenes_data + creadas, planificador, siguiente_numero=numero, nuevas=creadas)
+        rutas_usadas = dict(load_data(RUTAS_USADAS_FILE))
+        for ruta_str in rutas_nuevas:
+            rutas_usadas[ruta_str] = rutas_usadas.get(ruta_str, 0) + 1
+        indice_rutas = get_route_index()
+        save_data(RUTAS_USADAS_FILE, rutas_usadas)
+        # The index is only read under data_lock (load_report_snapshot copies it), so it is
+        # updated in place, O(log n) per route, once rutas_usadas.json is on disk
+        for ruta_str in rutas_nuevas:
+            indice_rutas.registrar(ruta_str)
+        keep_route_index(indice_rutas, len(rutas_nuevas))
+    except Exception as e:
+        for pendiente in lote:
+            if pendiente.error is None:
+                pendiente.creadas = []
+                pendiente.error = e if isinstance(e, HTTPException) else HTTPException(status_code=500, detail=f"Could not store orders: {e}")
+    finally:
+        for pendiente in lote:
+            pendiente.done = True
+
+def ingest_orders(nuevas: List[OrderCreateModel]) -> List[Dict]:
+    """
+    Validates new orders against the node index, routes them in one batch with the
+    battery-aware router (through the graph's route cache) and appends them to the
+    orders and used-routes files.
+    Orders given by coordinates are snapped to graph nodes first (snap_order).
+    The whole batch is rejected if any order is invalid or has no feasible route.
+    Routing and the file updates run under data_lock, so concurrent requests
+    (threads or worker processes) never overwrite each other's orders; requests
+    queued in this process while the lock was held are stored together with it.
+    """
+    node_index = get_node_index()
+    for i, nueva in enumerate(nuevas):
+        snap_order(i, nueva, node_index)
+        origen = node_index.get(nueva.origen)
+        destino = node_index.get(nueva.destino)
+        if origen is None or origen.get("role") != "client":
+            raise HTTPException(status_code=400, detail=f"Order {i}: origin '{nueva.origen}' is not a client node.")
+        if destino is None or destino.get("role") != "storage":
+            raise HTTPException(status_code=400, detail=f"Order {i}: destination '{nueva.destino}' is not a storage node.")
+
+    pendiente = PendingIngestion(nuevas)
+    _ingest_queue.append(pendiente)
+    with data_lock():
+        # Another request may have stored this one along with its own while we waited
+        if not pendiente.done:
+            store_queued_ingestions()
+    if pendiente.error is not None:
+        raise pendiente.error
+    return pendiente.creadas
+
+# Plain def: FastAPI runs it in its threadpool, so routing and file writes don't block the event loop
+@app.post("/orders/", response_model=OrderModel, status_code=201, tags=["Orders"])
+def create_order(order: OrderCreateModel):
+    """
+    Register a new order from a client node to a storage node. The route and
+    `costo_total` are computed with the battery-aware router. Instead of node
+    ids, the order may give the delivery point's lat/lon: it is snapped to the
+    nearest client node, and a missing destination to the nearest storage node.
+    """
+    return OrderModel(**ingest_orders([order])[0])
+
+@app.post("/orders/batch", response_model=List[OrderModel], status_code=201, tags=["Orders"])
+def create_orders_batch(orders: List[OrderCreateModel]):
+    """
+    Register several orders at once. All orders are routed in a single batch and
+    appended together; if any order is invalid, none are stored.
+    """
+    if not orders:
+        return FastJSONResponse([], status_code=201)
+    return FastJSONResponse(ingest_orders(orders), status_code=201)
+
+# --- Graph Endpoints ---
+@app.get("/graph/version", response_model=Dict[str, Any], tags=["Graph"])
+def get_graph_version(cambios: int = 20):
+    """
+    Current graph version, closed edges and the last `cambios` edge changes.
+    """
+    with graph_lock:
+        G = get_graph()
+        recientes = G.graph["cambios"][-cambios:] if cambios > 0 else []
+        respuesta = {"version": G.graph["version"], "aristas_cerradas": G.graph["aristas_cerradas"],
+                     "cambios": recientes}
+    return FastJSONResponse(respuesta)
+
+@app.post("/graph/edges", response_model=Dict[str, Any], tags=["Graph"])
+def update_edges(cambios: List[EdgeUpdateModel]):
+    """
+    Update edge weights or close/reopen edges (wind, no-fly zones, congestion)
+    as one new graph version. Only the cached routes that use a changed edge
+    are invalidated, and shortest paths and the MST are repaired incrementally.
+    Pending orders whose route was invalidated are re-routed and get a new
+    `costo_total`. The batch is rejected if any change is invalid.
+    """
+    # Plain def: FastAPI runs it in its threadpool, so waiting for data_lock (held while an
+    # ingestion routes on this graph) does not stall the event loop
+    with data_lock():
+        with graph_lock:
+            dinamico = get_dynamic_graph()
+            try:
+                resumen = dinamico.actualizar([c.model_dump() for c in cambios])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            invalidados = resumen.pop("pares_invalidados")
+            ROUTES_INVALIDATED.inc(len(invalidados))
+            GRAPH_VERSION.set(dinamico.version)
+            if resumen["aplicados"]:
+                try:
+                    save_data(GRAFO_FILE, json_graph.node_link_data(dinamico.G))
+                except Exception:
+                    # actualizar already changed the graph in memory: drop it so it is rebuilt from the file
+                    _derived_cache.pop(GRAFO_FILE, None)
+                    raise
+                # The graph in memory matches the saved file: keep it along with its caches
+                _derived_cache[GRAFO_FILE] = (_data_cache[GRAFO_FILE][0], dinamico)
+
+        actualizadas = sin_ruta = 0
+        if resumen["aplicados"]:
+            if invalidados and os.path.exists(ORDENES_FILE):
+                ordenes_data = load_data(ORDENES_FILE)
+                afectadas = [o for o in ordenes_data
+                             if o.get("status") == "Pendiente" and (o["origen"], o["destino"]) in invalidados]
+                rutas = dinamico.rutas({(o["origen"], o["destino"]) for o in afectadas})
+                recosteadas = []
+                for orden in afectadas:
+                    ruta, costo = rutas[(orden["origen"], orden["destino"])]
+                    if ruta is None:
+                        sin_ruta += 1
+                    elif orden.get("costo_total") != costo:
+                        recosteadas.append({**orden, "costo_total": costo})
+                actualizadas = len(recosteadas)
+                if actualizadas:
+                    # The queued orders carry the old costo_total: the dispatch queue is rebuilt
+                    save_orders(with_updated_orders(ordenes_data, recosteadas))
+
+    resumen.update({"rutas_invalidadas": len(invalidados), "ordenes_actualizadas": actualizadas,
+                    "ordenes_sin_ruta": sin_ruta})
+    return FastJSONResponse(resumen)
+
+@app.get("/graph/shortest-path", response_model=Dict[str, Any], tags=["Graph"])
+def get_shortest_path(origen: str, destino: str):
+    """
+    Shortest path by edge weight (no battery constraint) from the all-pairs
+    matrices, which are built once and then kept current across edge changes.
+    """
+    with graph_lock:
+        dinamico = get_dynamic_graph()
+        for nodo in (origen, destino):
+            if nodo not in dinamico.G:
+                raise HTTPException(status_code=404, detail=f"Node '{nodo}' not found.")
+        distancias = dinamico.distancias()
+        camino = distancias.camino(origen, destino)
+        if camino is None:
+            raise HTTPException(status_code=404, detail=f"No path from '{origen}' to '{destino}'.")
+        respuesta = {"origen": origen, "destino": destino, "camino": camino,
+                     "costo": distancias.distancia(origen, destino), "version": dinamico.version}
+    return FastJSONResponse(respuesta)
+
+@app.get("/graph/mst", response_model=Dict[str, Any], tags=["Graph"])
+def get_minimum_spanning_tree():
+    """
+    Minimum spanning tree (a forest if closures disconnect the graph), repaired
+    incrementally after edge changes.
+    """
+    with graph_lock:
+        dinamico = get_dynamic_graph()
+        version = dinamico.version
+        aristas = dinamico.mst().aristas()
+    return FastJSONResponse({"version": version, "peso_total": sum(peso for _, _, peso in aristas),
+                             "aristas": [{"origen": u, "destino": v, "peso": peso} for u, v, peso in aristas]})
+
+# --- Dispatch Endpoints ---
+@app.post("/dispatch/", response_model=List[DispatchBatchModel], tags=["Dispatch"])
+def dispatch_orders(dispatch: DispatchRequestModel):
+    """
+    Hand pending orders to the available drones, most urgent first (prioridad 1,
+    then oldest). Each drone gets a batch of up to `max_por_lote` orders bound
+    to the same storage node. Dispatched orders move to 'En ruta'.
+    """
+    with data_lock():
+        ordenes_data = load_data(ORDENES_FILE)
+        if dispatch.destino is not None:
+            destino = get_node_index().get(dispatch.destino)
+            if destino is None or destino.get("role") != "storage":
+                raise HTTPException(status_code=400, detail=f"Destination '{dispatch.destino}' is not a storage node.")
+
+        # Queue cached per ordenes.json version: the O(n) heapify runs once, then O(log n) per order
+        planificador = get_dispatch_planner()
+        lotes = []
+        for _ in range(dispatch.drones):
+            lote = planificador.lote(dispatch.max_por_lote, dispatch.destino)
+            if not lote:
+                break
+            lotes.append({"destino": lote[0][1]["destino"], "ordenes": [{**orden, "status": "En ruta"} for _, orden in lote]})
+
+        if lotes:
+            save_orders(with_updated_orders(ordenes_data, [o for l in lotes for o in l["ordenes"]]), planificador)
+            ORDERS_DISPATCHED.inc(sum(len(l["ordenes"]) for l in lotes))
+    return FastJSONResponse(lotes)
+
+@app.get("/dispatch/queue", response_model=Dict[str, Any], tags=["Dispatch"])
+async def get_dispatch_queue(limite: int = 10):
+    """
+    Pending orders per storage node and the next `limite` orders in dispatch order.
+    """
+    pendientes = [o for o in load_data(ORDENES_FILE) if o.get("status") == "Pendiente"]
+    por_destino = {}
+    for orden in pendientes:
+        por_destino[orden["destino"]] = por_destino.get(orden["destino"], 0) + 1
+    siguientes = heapq.nsmallest(max(limite, 0), pendientes, key=clave_prioridad)
+    return FastJSONResponse({"pendientes": len(pendientes), "por_destino": por_destino, "siguientes": siguientes})
+
+@app.get("/dispatch/tours", response_model=Dict[str, Any], tags=["Dispatch"])
+def plan_dispatch_tours(capacidad: int = 4, destino: Optional[str] = None):
+    """
+    Plan multi-stop tours for the pending orders: per day and storage node, a
+    drone collects up to `capacidad` orders in one battery-feasible tour
+    (savings heuristic + 2-opt). Read-only; order statuses are not changed.
+    """
+    if capacidad < 1:
+        raise HTTPException(status_code=400, detail="capacidad must be at least 1.")
+    ordenes_data = load_data(ORDENES_FILE)
+    if destino is not None:
+        ordenes_data = [o for o in ordenes_data if o.get("destino") == destino]
+    # Legs (paths and battery profiles) are cached per graph version and shared by every request
+    with graph_lock:
+        tramos = get_cached(GRAFO_FILE, dict, key="tramos_recorridos")
+        plan = PlanificadorRecorridos(get_graph(), capacidad, tramos=tramos).planificar(ordenes_data)
+    return FastJSONResponse(plan)
 
+# --- Report Endpoints ---
+def check_report_options(charts: str, dpi: int):
+    if charts not in REPORT_CHART_MODES:
+        raise HTTPException(status_code=400, detail=f"charts must be one of: {', '.join(REPORT_CHART_MODES)}.")
+    if not REPORT_DPI_MIN <= dpi <= REPORT_DPI_MAX:
+        raise HTTPException(status_code=400, detail=f"dpi must be between {REPORT_DPI_MIN} and {REPORT_DPI_MAX}.")
+
+REPORT_FILES = (NODOS_FILE, ORDENES_FILE, RUTAS_USADAS_FILE)
+
+def report_data_version(variant: str = "") -> str:
+    try:
+        return data_version(*REPORT_FILES, variant=variant)
+    except HTTPException: # Catch if data files are missing
+        raise HTTPException(status_code=404, detail="Required data files (nodos, ordenes, rutas_usadas) not found. Run simulation first.")
+
+def load_report_data():
+    nodos = load_data(NODOS_FILE)
+    ordenes = load_data(ORDENES_FILE)
+    rutas_usadas = load_data(RUTAS_USADAS_FILE)
     if not nodos or not ordenes: # rutas_usadas can be empty
         raise HTTPException(status_code=400, detail="Not enough data to generate a report. Ensure simulation has run and produced nodes and orders.")
+    return nodos, ordenes, rutas_usadas
+
+def load_report_snapshot(variant: str):
+    """
+    The report data, a private copy of the route frequency index and the data versions, read together
+    under data_lock. Reports rendered or streamed from a worker thread use this snapshot, so they never
+    see an ingestion half-applied nor share a tree with later requests.
 
+    Returns:
+        tuple: (nodos, ordenes, rutas_usadas, indice_rutas, data version, version with `variant`)
+    """
+    with data_lock(), track_loaded_versions():
+        nodos, ordenes, rutas_usadas = load_report_data()
+        indice_rutas = get_route_index().frecuencias.copia()
+        return (nodos, ordenes, rutas_usadas, indice_rutas, loaded_data_version(*REPORT_FILES),
+                loaded_data_version(*REPORT_FILES, variant=variant))
+
+def temporary_file_response(path: str, media_type: str, filename: str, version: str) -> FileResponse:
+    """Streams a generated file from disk and deletes it once it has been sent."""
+    return FileResponse(path, media_type=media_type, filename=filename, background=BackgroundTask(os.remove, path),
+                        headers={"ETag": make_etag(version), "Cache-Control": "no-cache"})
+
+@app.get("/reports/reports/pdf", tags=["Reports"])
+async def get_simulation_report_pdf(request: Request, charts: str = "vector", dpi: int = 150):
+    """
+    Generate and return a PDF report summarizing system simulation data,
+    including routes, clients, nodes, and charts. charts=vector draws the
+    charts as PDF vector graphics; charts=png embeds matplotlib images
+    rendered at `dpi`.
+    """
+    check_report_options(charts, dpi)
+    current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"informe_simulacion_drones_api_{current_time}.pdf"
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache",
+               "Content-Disposition": f'attachment; filename="{filename}"'}
+    # Each chart option is a different representation of the same data, so it gets its own ETag
+    variant = f"{charts}:{dpi if charts == 'png' else ''}"
+    # Unchanged data answers 304 without rendering the report again
+    matched = matching_etag(request, report_data_version(variant))
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+
+    nodos, ordenes, rutas_usadas, indice_rutas, data_ver, version = await run_in_threadpool(load_report_snapshot, variant)
     try:
-        pdf_buffer = generate_report_pdf(nodos, ordenes, rutas_usadas)
-        # pdf_buffer is a BytesIO object
-        
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"informe_simulacion_drones_api_{current_time}.pdf"
-        
-        return FileResponse(
-            path=pdf_buffer, 
-            media_type='application/pdf', 
-            filename=filename
-        )
+        # Imported here: matplotlib, pandas and reportlab are only needed for reports
+        from trabajo_modulado.utils.reporting import generate_report_pdf
+        start = time.perf_counter()
+        # The tables and charts computed for this data version are reused by later reports.
+        # Rendered in a worker thread, like the full report, so the event loop stays free
+        pdf_buffer = await run_in_threadpool(generate_report_pdf, nodos, ordenes, rutas_usadas, indice_rutas=indice_rutas,
+                                             graficos=charts, dpi=dpi, version=data_ver)
+        PDF_RENDER_SECONDS.observe(time.perf_counter() - start)
     except Exception as e:
         # Log the exception e for debugging
+        PDF_RENDER_ERRORS.inc()
         print(f"Error generating PDF report: {e}")
         raise HTTPException(status_code=500, detail=f"Could not generate PDF report: {str(e)}")
+    # pdf_buffer is a BytesIO object
+    return encoded_response(request, pdf_buffer.getvalue(), version, 'application/pdf', headers)
+
+@app.get("/reports/reports/pdf/full", tags=["Reports"])
+async def get_full_report_pdf(request: Request, charts: str = "vector", dpi: int = 150,
+                              appendices: str = ",".join(REPORT_APPENDICES), max_rows: Optional[int] = None):
+    """
+    The PDF report followed by full appendices with one row per client, node
+    and/or route (`appendices`, comma separated). The appendix tables are laid
+    out a page at a time into a temporary file, which is streamed back and then
+    deleted. max_rows cuts each appendix; the full tables are available from
+    /reports/reports/appendix/{appendix}.
+    """
+    check_report_options(charts, dpi)
+    names = [name.strip() for name in appendices.split(",") if name.strip()]
+    unknown = [name for name in names if name not in REPORT_APPENDICES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown appendices: {', '.join(unknown)}. Valid: {', '.join(REPORT_APPENDICES)}.")
+    if max_rows is not None and max_rows < 1:
+        raise HTTPException(status_code=400, detail="max_rows must be at least 1.")
+    variant = f"{charts}:{dpi if charts == 'png' else ''}:{','.join(names)}:{max_rows}"
+    matched = matching_etag(request, report_data_version(variant))
+    if matched:
+        return Response(status_code=304, headers={"ETag": matched, "Cache-Control": "no-cache"})
+
+    # In a worker thread: the snapshot waits for data_lock while an ingestion is writing
+    nodos, ordenes, rutas_usadas, indice_rutas, data_ver, version = await run_in_threadpool(load_report_snapshot, variant)
+    # Imported here: matplotlib, pandas and reportlab are only needed for reports
+    from trabajo_modulado.utils.reporting import generate_full_report_pdf
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        # Rendering a large report takes a while; the worker thread keeps the event loop free meanwhile
+        await run_in_threadpool(generate_full_report_pdf, path, nodos, ordenes, rutas_usadas,
+                                indice_rutas=indice_rutas, apendices=[REPORT_APPENDICES[n] for n in names],
+                                graficos=charts, dpi=dpi, version=data_ver, max_filas=max_rows)
+        PDF_RENDER_SECONDS.observe(time.perf_counter() - start)
+    except Exception as e:
+        os.remove(path)
+        PDF_RENDER_ERRORS.inc()
+        print(f"Error generating full PDF report: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not generate PDF report: {str(e)}")
+
+    current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return temporary_file_response(path, "application/pdf", f"informe_completo_drones_api_{current_time}.pdf", version)
+
+@app.get("/reports/reports/appendix/{appendix}", tags=["Reports"])
+async def get_report_appendix(request: Request, appendix: str, format: str = "csv"):
+    """
+    One full report appendix (clients, nodes or routes) as CSV or Parquet.
+    CSV is streamed in blocks of rows as it is generated; Parquet is written
+    to a temporary file in row groups and streamed from there.
+    """
+    if appendix not in REPORT_APPENDICES:
+        raise HTTPException(status_code=400, detail=f"appendix must be one of: {', '.join(REPORT_APPENDICES)}.")
+    if format not in APPENDIX_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(APPENDIX_FORMATS)}.")
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed.")
+    variant = f"{appendix}:{format}"
+    matched = matching_etag(request, report_data_version(variant))
+    if matched:
+        return Response(status_code=304, headers={"ETag": matched, "Cache-Control": "no-cache"})
+
+    nodos, ordenes, rutas_usadas, indice_rutas, _, version = await run_in_threadpool(load_report_snapshot, variant)
+    from trabajo_modulado.utils.reporting import iter_apendice_csv, exportar_apendice
+    apendice = REPORT_APPENDICES[appendix]
+    filename = f"apendice_{appendix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    if format == "csv":
+        # Starlette iterates the generator in a worker thread, one block of rows per chunk
+        return StreamingResponse(iter_apendice_csv(apendice, nodos, ordenes, rutas_usadas, indice_rutas), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"',
+                                          "ETag": make_etag(version), "Cache-Control": "no-cache"})
+
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await run_in_threadpool(exportar_apendice, path, apendice, nodos, ordenes, rutas_usadas, indice_rutas, format)
+    except Exception as e:
+        os.remove(path)
+        print(f"Error exporting report appendix: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not export appendix: {str(e)}")
+    return temporary_file_response(path, "application/vnd.apache.parquet", filename, version)
 
 # --- Info/Stats Endpoints ---
 def get_node_visit_counts(rutas_usadas_data: Dict[str, int]) -> Dict[str, int]:
@@ -269,40 +1180,49 @@ def get_ranked_nodes_by_role(role: str, nodos_data: List[Dict], node_visits: Dic
     return sorted(role_nodes_visits, key=lambda x: x["visits"], reverse=True)
 
 @app.get("/info/reports/visits/clients", response_model=List[Dict], tags=["Info Reports"])
-async def get_top_visited_clients():
+async def get_top_visited_clients(request: Request):
     """
     Get the ranking of client nodes most visited in simulation routes.
     """
-    nodos = load_data(NODOS_FILE)
-    rutas_usadas = load_data(RUTAS_USADAS_FILE)
-    if not rutas_usadas: # If no routes, then no visits
-        return []
-    node_visits = get_node_visit_counts(rutas_usadas)
-    return get_ranked_nodes_by_role("client", nodos, node_visits)
+    def build_body():
+        nodos = load_data(NODOS_FILE)
+        rutas_usadas = load_data(RUTAS_USADAS_FILE)
+        if not rutas_usadas: # If no routes, then no visits
+            return dumps([])
+        node_visits = get_node_visit_counts(rutas_usadas)
+        return dumps(get_ranked_nodes_by_role("client", nodos, node_visits))
+
+    return conditional_response(request, (NODOS_FILE, RUTAS_USADAS_FILE), build_body)
 
 @app.get("/info/reports/visits/recharges", response_model=List[Dict], tags=["Info Reports"])
-async def get_top_visited_recharge_nodes():
+async def get_top_visited_recharge_nodes(request: Request):
     """
     Get the ranking of recharge nodes most visited in simulation routes.
     """
-    nodos = load_data(NODOS_FILE)
-    rutas_usadas = load_data(RUTAS_USADAS_FILE)
-    if not rutas_usadas:
-        return []
-    node_visits = get_node_visit_counts(rutas_usadas)
-    return get_ranked_nodes_by_role("recharge", nodos, node_visits)
+    def build_body():
+        nodos = load_data(NODOS_FILE)
+        rutas_usadas = load_data(RUTAS_USADAS_FILE)
+        if not rutas_usadas: # If no routes, then no visits
+            return dumps([])
+        node_visits = get_node_visit_counts(rutas_usadas)
+        return dumps(get_ranked_nodes_by_role("recharge", nodos, node_visits))
+
+    return conditional_response(request, (NODOS_FILE, RUTAS_USADAS_FILE), build_body)
 
 @app.get("/info/reports/visits/storages", response_model=List[Dict], tags=["Info Reports"])
-async def get_top_visited_storage_nodes():
+async def get_top_visited_storage_nodes(request: Request):
     """
     Get the ranking of storage nodes most visited in simulation routes.
     """
-    nodos = load_data(NODOS_FILE)
-    rutas_usadas = load_data(RUTAS_USADAS_FILE)
-    if not rutas_usadas:
-        return []
-    node_visits = get_node_visit_counts(rutas_usadas)
-    return get_ranked_nodes_by_role("storage", nodos, node_visits)
+    def build_body():
+        nodos = load_data(NODOS_FILE)
+        rutas_usadas = load_data(RUTAS_USADAS_FILE)
+        if not rutas_usadas: # If no routes, then no visits
+            return dumps([])
+        node_visits = get_node_visit_counts(rutas_usadas)
+        return dumps(get_ranked_nodes_by_role("storage", nodos, node_visits))
+
+    return conditional_response(request, (NODOS_FILE, RUTAS_USADAS_FILE), build_body)
 
 @app.get("/info/reports/summary", response_model=Dict[str, Any], tags=["Info Reports"])
 async def get_simulation_summary():
@@ -313,7 +1233,7 @@ async def get_simulation_summary():
     nodos = load_data(NODOS_FILE)
     ordenes = load_data(ORDENES_FILE)
     rutas_usadas = load_data(RUTAS_USADAS_FILE)
-    G = load_graph() # For edge count and potentially route cost recalculation
+    G = get_graph() # For edge count and potentially route cost recalculation
 
     summary = {}
 
@@ -367,6 +1287,20 @@ async def get_simulation_summary():
         
     return summary
 
+# --- Metrics Endpoint ---
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Metrics"])
+async def get_metrics():
+    """
+    Prometheus text exposition of request latencies, data-load timings,
+    route-search counters and PDF render durations.
+    """
+    for algorithm, stats in ESTADISTICAS_BUSQUEDA.items():
+        ROUTE_SEARCHES.set_total(stats["busquedas"], algorithm=algorithm)
+        ROUTE_STATES_EXPANDED.set_total(stats["estados_expandidos"], algorithm=algorithm)
+        ROUTE_QUEUE_PEAK.set(stats["cola_maxima"], algorithm=algorithm)
+        ROUTE_CACHE_HITS.set_total(stats["aciertos_cache"], algorithm=algorithm)
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Endpoints will be added below this line in subsequent steps.
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+"""
+Benchmark for the routing algorithms in model/ruta.py and model/grafo.py.
+
+Builds seeded graphs with generar_nodos / generar_aristas_aleatorias for each
+combination of size, density (edges per node) and battery limit, then runs
+client -> storage queries (the same shape as generated orders) through
+encontrar_ruta_con_bateria and dijkstra_with_battery, plus
+get_floyd_warshall_paths and kruskal_mst once per graph.
+
+For every case it records wall time, states expanded (from
+ESTADISTICAS_BUSQUEDA), peak traced memory and a checksum of the results
+(routes found and total cost), so a diff between releases shows both speed
+and behaviour changes. Time and memory are measured in separate runs because
+tracemalloc slows the code it traces.
+
+Usage (from the repository root):
+    python benchmarks/bench_routing.py --salida resultados.json
+    python benchmarks/bench_routing.py --salida nuevos.json --comparar resultados.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from trabajo_modulado.model.nodo import generar_nodos
+from trabajo_modulado.model.grafo import generar_aristas_aleatorias, kruskal_mst
+from trabajo_modulado.model import ruta
+
+
+def construir_grafo(n_nodos, densidad, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    nodos = generar_nodos(n_nodos)
+    G = generar_aristas_aleatorias(nodos, int(n_nodos * densidad))
+    return nodos, G
+
+
+def construir_consultas(nodos, n_consultas, seed):
+    rng = random.Random(seed)
+    clientes = [n["id"] for n in nodos if n["role"] == "client"]
+    storages = [n["id"] for n in nodos if n["role"] == "storage"]
+    return [(rng.choice(clientes), rng.choice(storages)) for _ in range(n_consultas)]
+
+
+def _estados_expandidos(algoritmo):
+    return ruta.ESTADISTICAS_BUSQUEDA[algoritmo]["estados_expandidos"]
+
+
+def medir(func, repeticiones, algoritmo=None):
+    """
+    Runs func `repeticiones` times keeping the best wall time, then once more
+    under tracemalloc. Returns (result, metrics).
+    """
+    tiempo = float("inf")
+    for _ in range(repeticiones):
+        expandidos_antes = _estados_expandidos(algoritmo) if algoritmo else 0
+        inicio = time.perf_counter()
+        resultado = func()
+        tiempo = min(tiempo, time.perf_counter() - inicio)
+        expandidos = (_estados_expandidos(algoritmo) - expandidos_antes) if algoritmo else None
+
+    tracemalloc.start()
+    func()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, {"tiempo_s": tiempo, "estados_expandidos": expandidos, "memoria_pico_bytes": pico}
+
+
+def resumen_rutas(resultados):
+    encontradas = [costo for camino, costo in resultados if camino is not None]
+    return {"rutas_encontradas": len(encontradas), "costo_total": float(sum(encontradas))}
+
+
+def ejecutar(args):
+    casos = []
+    for n_nodos in args.tamanos:
+        for densidad in args.densidades:
+            nodos, G = construir_grafo(n_nodos, densidad, args.seed)
+            consultas = construir_consultas(nodos, args.consultas, args.seed)
+            base = {"nodos": n_nodos, "aristas": G.number_of_edges(), "densidad": densidad}
+
+            for bateria in args.baterias:
+                recargas = ruta.nodos_recarga(G)
+                resultados, m = medir(lambda: [ruta.encontrar_ruta_con_bateria(G, o, d, recargas, bateria)
+                                               for o, d in consultas], args.repeticiones, "bfs_bateria")
+                casos.append({**base, "bateria": bateria, "algoritmo": "encontrar_ruta_con_bateria",
+                              "consultas": len(consultas), **m, **resumen_rutas(resultados)})
+
+                resultados, m = medir(lambda: [ruta.dijkstra_with_battery(G, o, d, bateria)
+                                               for o, d in consultas], args.repeticiones, "dijkstra_bateria")
+                casos.append({**base, "bateria": bateria, "algoritmo": "dijkstra_with_battery",
+                              "consultas": len(consultas), **m, **resumen_rutas(resultados)})
+
+            if n_nodos <= args.max_nodos_floyd:
+                (_, distancias), m = medir(lambda: ruta.get_floyd_warshall_paths(G), args.repeticiones)
+                finitas = [d for fila in distancias.values() for d in fila.values() if d != float("inf")]
+                casos.append({**base, "bateria": None, "algoritmo": "get_floyd_warshall_paths", **m,
+                              "costo_total": float(sum(finitas))})
+
+            mst, m = medir(lambda: kruskal_mst(G), args.repeticiones)
+            casos.append({**base, "bateria": None, "algoritmo": "kruskal_mst", **m,
+                          "costo_total": float(sum(G.edges[u, v]["weight"] for u, v in mst))})
+
+            print(f"  {n_nodos} nodos, densidad {densidad}: listo", file=sys.stderr)
+    return casos
+
+
+def clave(caso):
+    return (caso["algoritmo"], caso["nodos"], caso["densidad"], caso["bateria"])
+
+
+def comparar(actual, anterior, umbral):
+    """Prints per-case differences. Returns True if there is a regression."""
+    anteriores = {clave(c): c for c in anterior["casos"]}
+    regresion = False
+    print(f"{'algoritmo':<28}{'nodos':>7}{'dens':>6}{'bat':>6}{'tiempo':>10}{'estados':>10}{'memoria':>10}  cambios")
+    for caso in actual["casos"]:
+        previo = anteriores.get(clave(caso))
+        if previo is None:
+            continue
+        relativo = lambda k: (caso[k] / previo[k] - 1) if previo.get(k) else 0.0
+        notas = []
+        if caso.get("rutas_encontradas") != previo.get("rutas_encontradas") or \
+                abs(caso.get("costo_total", 0) - previo.get("costo_total", 0)) > 1e-6:
+            notas.append("RESULTADOS DISTINTOS")
+            regresion = True
+        if relativo("tiempo_s") > umbral:
+            notas.append("más lento")
+            regresion = True
+        print(f"{caso['algoritmo']:<28}{caso['nodos']:>7}{caso['densidad']:>6}{str(caso['bateria']):>6}"
+              f"{relativo('tiempo_s'):>+10.1%}{relativo('estados_expandidos') if caso['estados_expandidos'] else 0:>+10.1%}"
+              f"{relativo('memoria_pico_bytes'):>+10.1%}  {', '.join(notas)}")
+    return regresion
+
+
+def version_git():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def entero_positivo(valor):
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {valor!r}")
+    if numero < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {numero}")
+    return numero
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--densidades", type=float, nargs="+", default=[1.5, 3.0],
+                        help="Edges per node")
+    parser.add_argument("--baterias", type=int, nargs="+", default=[20, ruta.MAX_BATTERY, 100])
+    parser.add_argument("--consultas", type=int, default=200, help="Queries per graph and battery limit")
+    parser.add_argument("--max-nodos-floyd", type=int, default=500,
+                        help="Skip Floyd-Warshall above this many nodes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--salida", help="Write results to this JSON file")
+    parser.add_argument("--comparar", help="Previous results file to diff against")
+    parser.add_argument("--umbral", type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (default 0.2 = 20%%)")
+    parser.add_argument("--repeticiones", type=entero_positivo, default=3,
+                        help="Timed runs per case; the best one is kept")
+    args = parser.parse_args()
+
+    resultado = {
+        "meta": {
+            "commit": version_git(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "seed": args.seed,
+            "consultas": args.consultas,
+            "repeticiones": args.repeticiones,
+        },
+        "casos": ejecutar(args),
+    }
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2)
+    else:
+        json.dump(resultado, sys.stdout, indent=2)
+        print()
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)
+        if comparar(resultado, anterior, args.umbral):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
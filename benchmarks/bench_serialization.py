@@ -0,0 +1,132 @@
+"""
+Benchmark for the JSON paths used by the API and the data files.
+
+Compares, for the biggest payloads we produce (all orders, all clients with
+their order counts, the used-routes map and the node-link graph):
+
+- the old disk format (json.dump with indent=4) against utils.serialization
+- the old API path (build Pydantic models, let FastAPI validate and encode them)
+  against encoding the raw dicts with FastJSONResponse
+
+Usage (from the repository root):
+    python benchmarks/bench_serialization.py --nodos 150 --ordenes 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import networkx as nx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "api"))
+from trabajo_modulado.model.nodo import generar_nodos
+from trabajo_modulado.model.grafo import generar_aristas_aleatorias
+from trabajo_modulado.model.order import generar_ordenes
+from trabajo_modulado.utils import serialization
+
+
+def medir(func, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        func()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def construir_payloads(n_nodos, n_aristas, n_ordenes):
+    nodos = generar_nodos(n_nodos)
+    G = generar_aristas_aleatorias(nodos, n_aristas)
+    ordenes = generar_ordenes(n_ordenes, nodos)
+    rutas_usadas = {}
+    for orden in ordenes:
+        ruta_str = f"{orden['origen']} → {orden['destino']}"
+        rutas_usadas[ruta_str] = rutas_usadas.get(ruta_str, 0) + 1
+    conteo = {}
+    for orden in ordenes:
+        conteo[orden["cliente_id"]] = conteo.get(orden["cliente_id"], 0) + 1
+    clientes = [{**n, "total_ordenes": conteo.get(n["client_id"], 0)} for n in nodos if n["role"] == "client"]
+    # Same conversion the stdlib json path needs for numpy scalars
+    grafo = json.loads(json.dumps(nx.node_link_data(G), default=lambda o: o.item()))
+    return {"ordenes": ordenes, "clientes": clientes, "rutas_usadas": rutas_usadas, "grafo": grafo}
+
+
+def bench_disco(nombre, payload, repeticiones):
+    antiguo = json.dumps(payload, indent=4)
+    nuevo = serialization.dumps(payload)
+    return {
+        "payload": nombre,
+        "caso": "disco",
+        "bytes_antes": len(antiguo.encode("utf-8")),
+        "bytes_despues": len(nuevo),
+        "encode_antes_s": medir(lambda: json.dumps(payload, indent=4), repeticiones),
+        "encode_despues_s": medir(lambda: serialization.dumps(payload), repeticiones),
+        "decode_antes_s": medir(lambda: json.loads(antiguo), repeticiones),
+        "decode_despues_s": medir(lambda: serialization.loads(nuevo), repeticiones),
+    }
+
+
+def bench_respuesta(nombre, payload, modelo, repeticiones):
+    from typing import List
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    adaptador = TypeAdapter(List[modelo])
+
+    def antes():
+        # What FastAPI did for `return [Model(**d) ...]` with a response_model
+        objetos = [modelo(**d) for d in payload]
+        validados = adaptador.validate_python(objetos)
+        json.dumps(jsonable_encoder(validados), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    return {
+        "payload": nombre,
+        "caso": "respuesta_api",
+        "encode_antes_s": medir(antes, repeticiones),
+        "encode_despues_s": medir(lambda: serialization.dumps(payload), repeticiones),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodos", type=int, default=150)
+    parser.add_argument("--aristas", type=int, default=300)
+    parser.add_argument("--ordenes", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    payloads = construir_payloads(args.nodos, args.aristas, args.ordenes)
+
+    resultados = [bench_disco(nombre, payload, args.repeticiones) for nombre, payload in payloads.items()]
+    try:
+        from main import OrderModel, ClientDetailModel
+    except ImportError as e:
+        print(f"Skipping API response benchmark ({e})", file=sys.stderr)
+    else:
+        resultados.append(bench_respuesta("ordenes", payloads["ordenes"], OrderModel, args.repeticiones))
+        resultados.append(bench_respuesta("clientes", payloads["clientes"], ClientDetailModel, args.repeticiones))
+
+    if args.json:
+        print(json.dumps({"backend": serialization.JSON_BACKEND, "resultados": resultados}, indent=2))
+        return
+
+    print(f"Backend: {serialization.JSON_BACKEND}  ({args.nodos} nodos, {args.ordenes} órdenes)")
+    print(f"{'payload':<14}{'caso':<15}{'encode antes':>14}{'encode ahora':>14}{'decode antes':>14}{'decode ahora':>14}{'bytes antes':>13}{'bytes ahora':>13}")
+    for r in resultados:
+        fmt = lambda k: f"{r[k] * 1000:.1f} ms" if k in r else "-"
+        print(f"{r['payload']:<14}{r['caso']:<15}{fmt('encode_antes_s'):>14}{fmt('encode_despues_s'):>14}"
+              f"{fmt('decode_antes_s'):>14}{fmt('decode_despues_s'):>14}"
+              f"{r.get('bytes_antes', '-'):>13}{r.get('bytes_despues', '-'):>13}")
+
+
+if __name__ == "__main__":
+    main()
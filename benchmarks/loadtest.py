@@ -0,0 +1,285 @@
+"""
+Load test for the FastAPI service in api/main.py.
+
+1. Generates datasets of several sizes with the simulation generators
+   (generar_nodos, generar_aristas_aleatorias, generar_ordenes and the
+   battery router) and writes them in the same format as the dashboard.
+2. Starts a local uvicorn instance per dataset (API_DATA_DIR points at it).
+3. Drives a mixed read/write workload from several threads for a fixed
+   duration: client lookups, order ingestion, order cancel/complete,
+   summaries, PDF reports and dispatch batches.
+4. Reports throughput and latency percentiles per operation.
+
+Usage (from the repository root):
+    python benchmarks/loadtest.py --tamanos pequeno mediano --duracion 30 --concurrencia 16
+    python benchmarks/loadtest.py --tamanos grande --workers 4 --salida carga.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import networkx as nx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from trabajo_modulado.model.nodo import generar_nodos
+from trabajo_modulado.model.grafo import generar_aristas_aleatorias
+from trabajo_modulado.model.order import generar_ordenes
+from trabajo_modulado.model.ruta_paralela import enrutar_ordenes
+from trabajo_modulado.utils.serialization import dump_file
+
+# (nodos, aristas, órdenes)
+TAMANOS = {
+    "pequeno": (15, 20, 10),
+    "mediano": (150, 300, 5000),
+    "grande": (1000, 3000, 100000),
+}
+
+# Peso relativo de cada operación en la mezcla
+MEZCLA_DEFECTO = {
+    "cliente": 45,
+    "crear_orden": 15,
+    "mutar_orden": 20,
+    "resumen": 15,
+    "pdf": 5,
+}
+
+# Operaciones fuera de la mezcla por defecto: despachar órdenes hace que algunas
+# cancelaciones de mutar_orden fallen con 400, así que solo se usa con --mezcla
+OPERACIONES_OPCIONALES = {"despacho"}
+
+
+def generar_dataset(directorio, n_nodos, n_aristas, n_ordenes, seed):
+    """Runs the same pipeline as the dashboard simulation and writes the four data files."""
+    random.seed(seed)
+    np.random.seed(seed)
+    nodos = generar_nodos(n_nodos)
+    G = generar_aristas_aleatorias(nodos, n_aristas)
+    ordenes = generar_ordenes(n_ordenes, nodos)
+
+    rutas_usadas = enrutar_ordenes(G, ordenes)
+
+    os.makedirs(directorio, exist_ok=True)
+    dump_file(os.path.join(directorio, "nodos.json"), nodos)
+    dump_file(os.path.join(directorio, "ordenes.json"), ordenes)
+    dump_file(os.path.join(directorio, "rutas_usadas.json"), rutas_usadas)
+    dump_file(os.path.join(directorio, "grafo.json"), nx.node_link_data(G))
+    return nodos, ordenes
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(directorio, puerto, workers):
+    env = {**os.environ, "API_DATA_DIR": directorio}
+    comando = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(ROOT, "api"),
+               "--host", "127.0.0.1", "--port", str(puerto), "--workers", str(workers), "--log-level", "warning"]
+    proceso = subprocess.Popen(comando, cwd=ROOT, env=env)
+    limite = time.time() + 60
+    while time.time() < limite:
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=2)
+            conexion.request("GET", "/")
+            conexion.getresponse().read()
+            return proceso
+        except OSError:
+            if proceso.poll() is not None:
+                raise RuntimeError("uvicorn terminó antes de estar listo")
+            time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError("uvicorn no respondió en 60 s")
+
+
+class Carga:
+    """Shared workload state: what to request next and where to record latencies."""
+
+    def __init__(self, nodos, ordenes, mezcla, seed):
+        self.clientes = [n for n in nodos if n["role"] == "client"]
+        self.storages = [n["id"] for n in nodos if n["role"] == "storage"]
+        self.pendientes = [o["id"] for o in ordenes if o["status"] == "Pendiente"]
+        random.Random(seed).shuffle(self.pendientes)
+        self.operaciones = list(mezcla)
+        self.pesos = [mezcla[op] for op in self.operaciones]
+        self.latencias = {op: [] for op in self.operaciones}
+        self.errores = {op: 0 for op in self.operaciones}
+        self.lock = threading.Lock()
+
+    def siguiente_pendiente(self):
+        with self.lock:
+            return self.pendientes.pop() if self.pendientes else None
+
+    def peticion(self, operacion, rng):
+        """Returns (method, path, body) for one operation, or None if it can't run now."""
+        if operacion == "cliente":
+            return "GET", f"/clients/{rng.choice(self.clientes)['client_id']}", None
+        if operacion == "crear_orden":
+            cuerpo = {"origen": rng.choice(self.clientes)["id"], "destino": rng.choice(self.storages),
+                      "prioridad": rng.randint(1, 3)}
+            return "POST", "/orders/", cuerpo
+        if operacion == "mutar_orden":
+            orden_id = self.siguiente_pendiente()
+            if orden_id is None:
+                return None
+            accion = "cancel" if rng.random() < 0.5 else "complete"
+            return "POST", f"/orders/orders/{orden_id}/{accion}", None
+        if operacion == "resumen":
+            return "GET", "/info/reports/summary", None
+        if operacion == "pdf":
+            return "GET", "/reports/reports/pdf", None
+        if operacion == "despacho":
+            return "POST", "/dispatch/", {"drones": rng.randint(1, 4), "max_por_lote": rng.randint(1, 3)}
+        raise ValueError(operacion)
+
+    def registrar(self, operacion, latencia, ok):
+        with self.lock:
+            if ok:
+                self.latencias[operacion].append(latencia)
+            else:
+                self.errores[operacion] += 1
+
+
+def trabajador(carga, puerto, fin, seed):
+    rng = random.Random(seed)
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=120)
+    while time.time() < fin:
+        operacion = rng.choices(carga.operaciones, carga.pesos)[0]
+        peticion = carga.peticion(operacion, rng)
+        if peticion is None:
+            continue
+        metodo, ruta, cuerpo = peticion
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        cabeceras = {"Content-Type": "application/json"} if datos else {}
+        inicio = time.perf_counter()
+        try:
+            conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            ok = respuesta.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conexion.close()
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=120)
+        carga.registrar(operacion, time.perf_counter() - inicio, ok)
+    conexion.close()
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def resumir(carga, duracion):
+    filas = {}
+    todas = []
+    for operacion in carga.operaciones:
+        valores = sorted(carga.latencias[operacion])
+        todas.extend(valores)
+        filas[operacion] = {
+            "peticiones": len(valores),
+            "errores": carga.errores[operacion],
+            "rps": len(valores) / duracion,
+            "p50_ms": _ms(percentil(valores, 50)),
+            "p90_ms": _ms(percentil(valores, 90)),
+            "p99_ms": _ms(percentil(valores, 99)),
+            "max_ms": _ms(valores[-1] if valores else None),
+        }
+    todas.sort()
+    filas["total"] = {
+        "peticiones": len(todas),
+        "errores": sum(carga.errores.values()),
+        "rps": len(todas) / duracion,
+        "p50_ms": _ms(percentil(todas, 50)),
+        "p90_ms": _ms(percentil(todas, 90)),
+        "p99_ms": _ms(percentil(todas, 99)),
+        "max_ms": _ms(todas[-1] if todas else None),
+    }
+    return filas
+
+
+def _ms(segundos):
+    return None if segundos is None else round(segundos * 1000, 2)
+
+
+def imprimir(nombre, filas):
+    print(f"\n== {nombre} ==")
+    print(f"{'operación':<14}{'peticiones':>11}{'errores':>9}{'req/s':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for operacion, f in filas.items():
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"
+        print(f"{operacion:<14}{f['peticiones']:>11}{f['errores']:>9}{f['rps']:>9.1f}"
+              f"{fmt(f['p50_ms']):>10}{fmt(f['p90_ms']):>10}{fmt(f['p99_ms']):>10}{fmt(f['max_ms']):>10}")
+
+
+def parsear_mezcla(texto):
+    mezcla = {}
+    for parte in texto.split(","):
+        operacion, _, peso = parte.partition("=")
+        if operacion not in MEZCLA_DEFECTO and operacion not in OPERACIONES_OPCIONALES:
+            raise argparse.ArgumentTypeError(f"Operación desconocida: {operacion}")
+        mezcla[operacion] = float(peso)
+    return {op: peso for op, peso in mezcla.items() if peso > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", nargs="+", choices=list(TAMANOS), default=["pequeno", "mediano"])
+    parser.add_argument("--duracion", type=float, default=20, help="Seconds of load per dataset")
+    parser.add_argument("--concurrencia", type=int, default=8, help="Client threads")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mezcla", type=parsear_mezcla, default=MEZCLA_DEFECTO,
+                        help="Operation weights, e.g. cliente=50,resumen=30,pdf=0,despacho=5")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--directorio", help="Where to write the datasets (default: a temporary directory)")
+    parser.add_argument("--salida", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    base = args.directorio or tempfile.mkdtemp(prefix="loadtest_")
+    resultados = {"meta": {"duracion_s": args.duracion, "concurrencia": args.concurrencia,
+                           "workers": args.workers, "mezcla": args.mezcla, "seed": args.seed},
+                  "datasets": {}}
+    for nombre in args.tamanos:
+        n_nodos, n_aristas, n_ordenes = TAMANOS[nombre]
+        directorio = os.path.join(base, nombre)
+        print(f"Generando dataset '{nombre}' ({n_nodos} nodos, {n_aristas} aristas, {n_ordenes} órdenes) en {directorio}")
+        nodos, ordenes = generar_dataset(directorio, n_nodos, n_aristas, n_ordenes, args.seed)
+
+        puerto = puerto_libre()
+        servidor = iniciar_servidor(directorio, puerto, args.workers)
+        try:
+            carga = Carga(nodos, ordenes, args.mezcla, args.seed)
+            fin = time.time() + args.duracion
+            hilos = [threading.Thread(target=trabajador, args=(carga, puerto, fin, args.seed + i))
+                     for i in range(args.concurrencia)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+        filas = resumir(carga, args.duracion)
+        resultados["datasets"][nombre] = {"nodos": n_nodos, "aristas": n_aristas, "ordenes": n_ordenes,
+                                          "operaciones": filas}
+        imprimir(nombre, filas)
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
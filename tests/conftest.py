@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Same imports as the API and the benchmarks: trabajo_modulado.model.x from the repository root
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,137 @@
+"""
+AVLTree, IndiceFrecuencias and IndiceRutas against plain dicts and sorted
+lists over long random operation sequences, checking the AVL invariants
+(order, balance, heights and subtree sizes) along the way.
+"""
+import bisect
+import random
+
+from trabajo_modulado.model.avl import AVLTree, IndiceFrecuencias, IndiceRutas, clave_ruta
+
+
+def verificar_invariantes(arbol, root):
+    """Checks order, balance, height and size of every node; returns the keys in order."""
+    claves = []
+
+    def visitar(nodo, minimo, maximo):
+        if nodo is None:
+            return 0, 0
+        assert minimo is None or nodo.key > minimo
+        assert maximo is None or nodo.key < maximo
+        altura_izq, tamano_izq = visitar(nodo.left, minimo, nodo.key)
+        claves.append(nodo.key)
+        altura_der, tamano_der = visitar(nodo.right, nodo.key, maximo)
+        assert abs(altura_izq - altura_der) <= 1
+        assert nodo.height == 1 + max(altura_izq, altura_der)
+        assert nodo.size == 1 + tamano_izq + tamano_der
+        return nodo.height, nodo.size
+
+    visitar(root, None, None)
+    return claves
+
+
+def test_avl_contra_dict():
+    rng = random.Random(43)
+    arbol = AVLTree()
+    root = None
+    esperado = {}
+    for paso in range(20_000):
+        clave = rng.randrange(3_000)
+        if rng.random() < 0.6:
+            freq = rng.randint(1, 100)
+            root = arbol.insert(root, clave, freq)
+            esperado[clave] = freq
+        else:
+            root = arbol.delete(root, clave)
+            esperado.pop(clave, None)
+
+        nodo = arbol.search(root, clave)
+        assert (nodo.freq if nodo else None) == esperado.get(clave)
+        assert arbol.getSize(root) == len(esperado)
+        if paso % 1_000 == 0:
+            claves = sorted(esperado)
+            assert verificar_invariantes(arbol, root) == claves
+            for _ in range(50):
+                i = rng.randrange(-1, len(claves) + 1)
+                nodo = arbol.select(root, i)
+                assert (nodo.key if nodo else None) == (claves[i] if 0 <= i < len(claves) else None)
+                consulta = rng.randrange(-5, 3_005)
+                assert arbol.rank(root, consulta) == bisect.bisect_left(claves, consulta)
+            desde, hasta = sorted(rng.randrange(3_000) for _ in range(2))
+            assert list(arbol.rangeQuery(root, desde, hasta)) == [(c, esperado[c]) for c in claves if desde <= c <= hasta]
+
+    claves = sorted(esperado)
+    assert verificar_invariantes(arbol, root) == claves
+    assert list(arbol.inorder(root)) == [(c, esperado[c]) for c in claves]
+
+
+def test_build_from_sorted_es_balanceado():
+    arbol = AVLTree()
+    for n in (0, 1, 2, 3, 7, 100, 1_023, 1_024, 5_000):
+        items = [(i, i * 2) for i in range(n)]
+        root = arbol.buildFromSorted(items)
+        assert verificar_invariantes(arbol, root) == list(range(n))
+        assert list(arbol.inorder(root)) == items
+
+
+def ranking(frecuencias):
+    return sorted(frecuencias.items(), key=lambda item: (-item[1], item[0]))
+
+
+def test_indice_frecuencias_contra_dict():
+    rng = random.Random(44)
+    rutas = [f"R{i}" for i in range(500)]
+    indice = IndiceFrecuencias()
+    esperado = {}
+    copia, esperado_copia = None, None
+    for paso in range(20_000):
+        ruta = rng.choice(rutas)
+        if rng.random() < 0.8:
+            delta = rng.randint(-3, 5)
+            indice.incrementar(ruta, delta)
+            nueva = esperado.get(ruta, 0) + delta
+        else:
+            nueva = rng.randint(0, 20)
+            indice.fijar(ruta, nueva)
+        if nueva > 0:
+            esperado[ruta] = nueva
+        else:
+            esperado.pop(ruta, None)
+
+        if paso == 10_000:
+            copia, esperado_copia = indice.copia(), dict(esperado)
+        if paso % 1_000 == 0:
+            orden = ranking(esperado)
+            assert verificar_invariantes(indice.avl, indice.root) == [(-f, r) for r, f in orden]
+            assert indice.frecuencias == esperado
+            assert indice.top(10) == orden[:10]
+            for posicion, (r, _) in enumerate(orden[:50], start=1):
+                assert indice.posicion(r) == posicion
+
+    assert list(indice.items()) == ranking(esperado)
+    assert indice.posicion("no-existe") is None
+    # La copia no ve los cambios posteriores del original
+    assert list(copia.items()) == ranking(esperado_copia)
+    assert len(copia) == len(esperado_copia)
+
+
+def test_indice_rutas_sincronizar_y_serializar():
+    rng = random.Random(45)
+    rutas = [" → ".join(rng.choice("ABCDEFGH") for _ in range(rng.randint(2, 6))) for _ in range(300)]
+    indice = IndiceRutas()
+    for _ in range(50):
+        objetivo = {ruta: rng.randint(1, 30) for ruta in rng.sample(rutas, rng.randint(0, 200))}
+        indice.sincronizar(objetivo)
+        assert indice.frecuencias.frecuencias == objetivo
+        assert [clave for clave, _ in indice.avl.inorder(indice.root)] == sorted(clave_ruta(r) for r in objetivo)
+        assert indice.top(5) == ranking(objetivo)[:5]
+
+    restaurado = IndiceRutas.desde_dict(indice.a_dict())
+    assert restaurado.a_dict() == indice.a_dict()
+    assert list(restaurado.frecuencias.items()) == list(indice.frecuencias.items())
+
+    copia = indice.copia()
+    version = indice.version
+    copia.registrar(rutas[0], 5)
+    assert indice.version == version and copia.version == version + 1
+    assert indice.frecuencias.frecuencia(rutas[0]) + 5 == copia.frecuencias.frecuencia(rutas[0])
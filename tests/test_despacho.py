@@ -0,0 +1,86 @@
+"""
+PlanificadorDespacho against a brute-force model (a plain dict of queued
+orders, sorted on every pop) over long random sequences of agregar, quitar,
+siguiente and lote, enough removals to trigger the lazy-deletion compaction.
+"""
+import random
+
+import pytest
+
+from trabajo_modulado.model.despacho import PlanificadorDespacho, clave_prioridad
+
+DESTINOS = ["S1", "S2", "S3"]
+
+
+def orden_aleatoria(rng, numero):
+    return {"id": f"O{numero}", "destino": rng.choice(DESTINOS), "prioridad": rng.randint(1, 3),
+            "status": rng.choice(["Pendiente", "Pendiente", "Delivered"]),
+            "fecha_creacion": f"2025-01-01 08:{rng.randint(0, 5):02d}:00"}
+
+
+def mas_urgentes(modelo, destino=None):
+    # Misma prioridad y fecha: sale primero la que entró antes a la cola
+    claves = [c for c, (_, orden) in modelo.items() if destino is None or orden["destino"] == destino]
+    return sorted(claves, key=lambda c: (clave_prioridad(modelo[c][1])[:2], modelo[c][0]))
+
+
+def test_planificador_contra_fuerza_bruta():
+    rng = random.Random(37)
+    iniciales = [orden_aleatoria(rng, n) for n in range(1, 201)]
+    planificador = PlanificadorDespacho.desde_ordenes(iniciales)
+    # clave -> (orden de llegada, orden)
+    modelo = {o["id"]: (n, o) for n, o in enumerate(iniciales) if o["status"] == "Pendiente"}
+    llegada = len(iniciales)
+    numero = len(iniciales) + 1
+
+    for _ in range(5000):
+        operacion = rng.random()
+        if operacion < 0.4:
+            orden = orden_aleatoria(rng, numero)
+            numero += 1
+            planificador.agregar(orden)
+            modelo[orden["id"]] = (llegada, orden)
+            llegada += 1
+        elif operacion < 0.6:
+            clave = rng.choice(list(modelo)) if modelo and rng.random() < 0.8 else f"O{rng.randint(1, numero)}"
+            assert planificador.quitar(clave) == (clave in modelo)
+            modelo.pop(clave, None)
+        elif operacion < 0.8:
+            esperada = mas_urgentes(modelo)
+            assert planificador.siguiente() == (esperada[0] if esperada else None)
+            if esperada:
+                del modelo[esperada[0]]
+        else:
+            maximo = rng.randint(1, 8)
+            destino = rng.choice(DESTINOS + [None])
+            if destino is None:
+                primera = mas_urgentes(modelo)
+                esperadas = mas_urgentes(modelo, modelo[primera[0]][1]["destino"]) if primera else []
+            else:
+                esperadas = mas_urgentes(modelo, destino)
+            tomadas = planificador.lote(maximo, destino)
+            assert [clave for clave, _ in tomadas] == esperadas[:maximo]
+            for clave, orden in tomadas:
+                assert orden is modelo.pop(clave)[1]
+
+        assert len(planificador) == len(modelo)
+        conteo = {}
+        for _, orden in modelo.values():
+            conteo[orden["destino"]] = conteo.get(orden["destino"], 0) + 1
+        assert planificador.pendientes_por_destino() == conteo
+
+    while modelo:
+        esperada = mas_urgentes(modelo)[0]
+        assert esperada in planificador
+        assert planificador.siguiente() == esperada
+        del modelo[esperada]
+    assert planificador.siguiente() is None and planificador.lote(5) == []
+
+
+def test_agregar_una_orden_ya_en_cola_falla():
+    planificador = PlanificadorDespacho()
+    orden = {"id": "O1", "destino": "S1", "prioridad": 1, "fecha_creacion": "2025-01-01 08:00:00"}
+    planificador.agregar(orden)
+    with pytest.raises(ValueError):
+        planificador.agregar(orden)
+    assert len(planificador) == 1
@@ -0,0 +1,120 @@
+"""
+OptimizadorEstaciones against brute force on small random graphs: pair
+costs from an explicit search over the charging points, the vectorised
+candidate gains against evaluating every candidate one by one, and
+optimizar against every single station and every extra candidate.
+"""
+import itertools
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from trabajo_modulado.model.nodo import generar_nodos
+from trabajo_modulado.model.grafo import generar_aristas_aleatorias
+from trabajo_modulado.model.estaciones import OptimizadorEstaciones, matriz_distancias, _mejora
+
+MAX_BATERIA = 10
+
+
+def construir_grafo(seed, n_nodos=20, n_aristas=35):
+    random.seed(seed)
+    np.random.seed(seed)
+    return generar_aristas_aleatorias(generar_nodos(n_nodos), n_aristas)
+
+
+def demanda_aleatoria(G, rng, n_pares=15):
+    clientes = [n for n, d in G.nodes(data=True) if d["role"] == "client"]
+    almacenes = [n for n, d in G.nodes(data=True) if d["role"] == "storage"]
+    return {(rng.choice(clientes), rng.choice(almacenes)): rng.randint(1, 5) for _ in range(n_pares)}
+
+
+def metricas_fuerza_bruta(G, demanda, estaciones):
+    # Saltos entre puntos de carga que caben en una batería, sobre el camino más corto del grafo
+    distancias = dict(nx.all_pairs_dijkstra_path_length(G, weight="weight"))
+    no_factible = 0.0
+    total = 0.0
+    for (origen, destino), peso in demanda.items():
+        puntos = set(estaciones) | {origen, destino}
+        H = nx.Graph()
+        H.add_nodes_from(puntos)
+        for a, b in itertools.combinations(puntos, 2):
+            d = distancias[a].get(b, np.inf)
+            if d <= MAX_BATERIA:
+                H.add_edge(a, b, weight=d)
+        try:
+            total += peso * nx.dijkstra_path_length(H, origen, destino, weight="weight")
+        except nx.NetworkXNoPath:
+            no_factible += peso
+    return no_factible, total
+
+
+def test_matriz_distancias_contra_dijkstra():
+    G = construir_grafo(39)
+    nodos = random.Random(39).sample(list(G.nodes), 10)
+    D = matriz_distancias(G, nodos)
+    for i, a in enumerate(nodos):
+        distancias = nx.single_source_dijkstra_path_length(G, a, weight="weight")
+        for j, b in enumerate(nodos):
+            assert D[i, j] == distancias.get(b, np.inf)
+
+
+def test_evaluar_contra_fuerza_bruta():
+    rng = random.Random(39)
+    for seed in range(39, 49):
+        G = construir_grafo(seed)
+        demanda = demanda_aleatoria(G, rng)
+        optimizador = OptimizadorEstaciones(G, demanda, max_bateria=MAX_BATERIA)
+        for k in range(4):
+            estaciones = rng.sample(optimizador.candidatos, k)
+            metricas = optimizador.evaluar(estaciones)
+            no_factible, total = metricas_fuerza_bruta(G, demanda, estaciones)
+            assert metricas["demanda_no_factible"] == no_factible
+            assert metricas["costo_total"] == pytest.approx(total)
+
+
+def test_mejor_candidato_contra_evaluar_cada_uno():
+    rng = random.Random(40)
+    for seed in range(50, 60):
+        G = construir_grafo(seed)
+        optimizador = OptimizadorEstaciones(G, demanda_aleatoria(G, rng), max_bateria=MAX_BATERIA)
+        estaciones = rng.sample(list(optimizador.idx_candidatos), 2)
+        columnas = optimizador._libres(estaciones)
+        objetivo, candidato = optimizador._mejor_candidato(estaciones, columnas)
+        esperados = []
+        for c in columnas:
+            metricas = optimizador.evaluar([optimizador.nodos[e] for e in estaciones + [c]])
+            esperados.append((metricas["demanda_no_factible"], metricas["costo_total"]))
+        mejor = min(esperados)
+        assert objetivo == (mejor[0], pytest.approx(mejor[1]))
+        assert esperados[list(columnas).index(candidato)] == (mejor[0], pytest.approx(mejor[1]))
+
+
+def test_optimizar_contra_fuerza_bruta():
+    rng = random.Random(41)
+    for seed in range(60, 70):
+        G = construir_grafo(seed, n_nodos=14, n_aristas=22)
+        demanda = demanda_aleatoria(G, rng, n_pares=8)
+        optimizador = OptimizadorEstaciones(G, demanda, max_bateria=MAX_BATERIA)
+        plan = optimizador.optimizar(2)
+        estaciones = plan["estaciones"]
+        assert len(estaciones) == len(set(estaciones)) <= 2
+        assert set(estaciones) <= set(optimizador.candidatos)
+        obtenido = metricas_fuerza_bruta(G, demanda, estaciones)
+        assert plan["metricas"]["demanda_no_factible"] == obtenido[0]
+        assert plan["metricas"]["costo_total"] == pytest.approx(obtenido[1])
+
+        sin_estaciones = metricas_fuerza_bruta(G, demanda, [])
+        assert obtenido <= sin_estaciones
+        # Con menos de k estaciones, ninguna estación más habría mejorado el resultado
+        if len(estaciones) < 2:
+            for c in optimizador.candidatos:
+                if c not in estaciones:
+                    assert not _mejora(metricas_fuerza_bruta(G, demanda, estaciones + [c]), obtenido)
+        # Con una sola estación la selección voraz es exacta: igual al mejor de todos los candidatos
+        una = optimizador.optimizar(1)["estaciones"]
+        if una:
+            optimo = min(metricas_fuerza_bruta(G, demanda, [c]) for c in optimizador.candidatos)
+            obtenido = metricas_fuerza_bruta(G, demanda, una)
+            assert obtenido[0] == optimo[0] and obtenido[1] == pytest.approx(optimo[1])
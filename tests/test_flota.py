@@ -0,0 +1,78 @@
+"""
+SimuladorFlota on a three-node line (client -> recharge -> storage) where
+the whole event trace can be worked out by hand: delivery times, waiting at
+a station with a single charger, simultaneous events and priority dispatch.
+"""
+import networkx as nx
+
+from trabajo_modulado.model.despacho import PlanificadorDespacho
+from trabajo_modulado.model.flota import SimuladorFlota
+
+RUTA = ["C1", "R1", "S1"]
+
+
+def construir_grafo():
+    G = nx.Graph()
+    G.add_node("C1", role="client")
+    G.add_node("R1", role="recharge")
+    G.add_node("S1", role="storage")
+    G.add_edge("C1", "R1", weight=4)
+    G.add_edge("R1", "S1", weight=6)
+    return G
+
+
+def orden(numero, minuto, prioridad=3):
+    return {"id": f"O{numero}", "origen": "C1", "destino": "S1", "prioridad": prioridad,
+            "status": "Pending", "fecha_creacion": f"2025-01-01 08:{minuto:02d}:00"}
+
+
+def simular(ordenes, n_drones, cola=None):
+    # 2 min de preparación, 1 min de vuelo y 0.5 min de carga por unidad, un cargador en R1
+    simulador = SimuladorFlota(construir_grafo(), n_drones, cargadores=1)
+    return simulador.simular(ordenes, {("C1", "S1"): (RUTA, 10)}, cola=cola)
+
+
+def test_drones_esperan_su_turno_en_la_estacion():
+    ordenes = [orden(1, 0), orden(2, 0), orden(3, 0)]
+    resumen = simular(ordenes, 3)
+    # Los tres llegan a R1 en el minuto 6 y cargan 2 min cada uno por turno (6-8, 8-10, 10-12);
+    # luego vuelan 6 min hasta S1
+    assert [o["fecha_entrega"] for o in ordenes] == ["2025-01-01 08:14:00", "2025-01-01 08:16:00", "2025-01-01 08:18:00"]
+    assert all(o["status"] == "Delivered" for o in ordenes)
+    assert resumen["ordenes_entregadas"] == 3
+    assert resumen["minutos_totales"] == 18
+    assert resumen["eventos"] == 15 # Liberación, llegada a R1, fin de carga, entrega y dron libre por orden
+    assert resumen["cargas_en_estaciones"] == 3
+    assert resumen["espera_estaciones_promedio"] == 2 # (0 + 2 + 4) / 3
+    assert resumen["estaciones_con_cola"] == 1
+    assert resumen["cola_estacion_maxima"] == 2
+    # Ocupados hasta cargar 3 min en S1: 17, 19 y 21 minutos de 3 drones durante 21 minutos
+    assert resumen["utilizacion_flota"] == 57 / 63
+
+
+def test_carga_que_termina_al_llegar_otro_dron_libera_el_cargador_primero():
+    ordenes = [orden(1, 0), orden(2, 2)]
+    resumen = simular(ordenes, 2)
+    # El segundo dron llega a R1 en el minuto 8, justo cuando termina la carga del primero
+    assert resumen["estaciones_con_cola"] == 0
+    assert resumen["espera_estaciones_promedio"] == 0
+    assert [o["fecha_entrega"] for o in ordenes] == ["2025-01-01 08:14:00", "2025-01-01 08:16:00"]
+
+
+def test_despacho_por_prioridad_con_un_dron():
+    ordenes = [orden(1, 0), orden(2, 0), orden(3, 0, prioridad=1)]
+    resumen = simular(ordenes, 1, cola=PlanificadorDespacho())
+    # O1 sale al instante; cuando el dron queda libre (minuto 17) pasa O3 antes que O2.
+    # Cada misión dura 14 min hasta la entrega y 17 hasta quedar libre
+    assert [o["fecha_entrega"] for o in ordenes] == ["2025-01-01 08:14:00", "2025-01-01 08:48:00", "2025-01-01 08:31:00"]
+    assert resumen["espera_despacho_maxima"] == 34
+    assert resumen["espera_despacho_por_prioridad"] == {1: 17, 3: 17}
+    assert resumen["estaciones_con_cola"] == 0
+
+
+def test_ordenes_sin_ruta_no_se_tocan():
+    ordenes = [orden(1, 0), {**orden(2, 0), "destino": "S2"}]
+    resumen = simular(ordenes, 1)
+    assert resumen["ordenes_entregadas"] == 1
+    assert resumen["ordenes_sin_ruta"] == 1
+    assert ordenes[1]["status"] == "Pending" and "fecha_entrega" not in ordenes[1]
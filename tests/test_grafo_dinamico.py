@@ -0,0 +1,114 @@
+"""
+GrafoDinamico against a full recomputation after every edge change: the
+incrementally repaired all-pairs shortest paths and MST must match
+Floyd-Warshall and a fresh minimum spanning forest, and the cached battery
+routes must still be valid paths on the current graph.
+"""
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from trabajo_modulado.model.nodo import generar_nodos
+from trabajo_modulado.model.grafo import generar_aristas_aleatorias
+from trabajo_modulado.model.grafo_dinamico import GrafoDinamico, clave_arista
+from trabajo_modulado.model.ruta import encontrar_rutas_lote, nodos_recarga
+
+MAX_BATERIA = 15
+
+
+def construir_grafo(seed, n_nodos=40, n_aristas=90):
+    random.seed(seed)
+    np.random.seed(seed)
+    return generar_aristas_aleatorias(generar_nodos(n_nodos), n_aristas)
+
+
+def cambio_aleatorio(rng, dinamico, aristas):
+    u, v = rng.choice(aristas)
+    if clave_arista(u, v) in dinamico.cerradas:
+        if rng.random() < 0.5:
+            return {"origen": u, "destino": v, "cerrada": False}
+        return {"origen": u, "destino": v, "peso": rng.randint(1, 12)}
+    if rng.random() < 0.15:
+        return {"origen": u, "destino": v, "cerrada": True}
+    return {"origen": u, "destino": v, "peso": rng.randint(1, 12)}
+
+
+def verificar_distancias(dinamico, rng):
+    distancias = dinamico.distancias()
+    esperadas = nx.floyd_warshall_numpy(dinamico.G, nodelist=distancias.nodos, weight="weight")
+    np.testing.assert_allclose(distancias.D, esperadas)
+    for _ in range(20):
+        origen, destino = rng.sample(distancias.nodos, 2)
+        camino = distancias.camino(origen, destino)
+        if np.isinf(esperadas[distancias.indice[origen], distancias.indice[destino]]):
+            assert camino is None
+        else:
+            assert camino[0] == origen and camino[-1] == destino
+            costo = sum(dinamico.G.edges[a, b]["weight"] for a, b in zip(camino, camino[1:]))
+            assert costo == pytest.approx(distancias.distancia(origen, destino))
+
+
+def verificar_mst(dinamico):
+    aristas = dinamico.mst().aristas()
+    esperado = nx.minimum_spanning_tree(dinamico.G, weight="weight")
+    assert sum(peso for _, _, peso in aristas) == pytest.approx(esperado.size(weight="weight"))
+    assert len(aristas) == esperado.number_of_edges()
+    for u, v, peso in aristas:
+        assert dinamico.G.edges[u, v]["weight"] == peso
+
+
+def verificar_rutas(dinamico, pares):
+    recargas = nodos_recarga(dinamico.G)
+    cacheadas = dinamico.rutas(pares)
+    nuevas = encontrar_rutas_lote(dinamico.G, pares, MAX_BATERIA)
+    for par in pares:
+        camino, costo = cacheadas[par]
+        assert (camino is None) == (nuevas[par][0] is None), par
+        if camino is None:
+            continue
+        assert (camino[0], camino[-1]) == par
+        carga = 0
+        for a, b in zip(camino, camino[1:]):
+            peso = dinamico.G.edges[a, b]["weight"] # Falla si la ruta usa una arista cerrada
+            carga = peso if b in recargas else carga + peso
+            assert carga <= MAX_BATERIA
+        assert costo == sum(dinamico.G.edges[a, b]["weight"] for a, b in zip(camino, camino[1:]))
+
+
+def test_cambios_aleatorios_contra_recalculo_completo():
+    rng = random.Random(40)
+    G = construir_grafo(40)
+    dinamico = GrafoDinamico(G, max_bateria=MAX_BATERIA)
+    aristas = [clave_arista(u, v) for u, v in G.edges]
+    clientes = [n for n, d in G.nodes(data=True) if d["role"] == "client"]
+    almacenes = [n for n, d in G.nodes(data=True) if d["role"] == "storage"]
+    pares = [(c, a) for c in clientes for a in almacenes]
+    # Se construyen antes de los cambios para que se reparen en vez de recalcularse
+    dinamico.distancias()
+    dinamico.mst()
+    dinamico.rutas(pares)
+
+    version = dinamico.version
+    for paso in range(300):
+        resumen = dinamico.actualizar([cambio_aleatorio(rng, dinamico, aristas)])
+        if resumen["aplicados"]:
+            version += 1
+        assert dinamico.version == version
+        verificar_distancias(dinamico, rng)
+        verificar_mst(dinamico)
+        if paso % 10 == 0:
+            verificar_rutas(dinamico, pares)
+    verificar_rutas(dinamico, pares)
+
+
+def test_cambio_invalido_no_aplica_nada():
+    G = construir_grafo(41, n_nodos=10, n_aristas=15)
+    dinamico = GrafoDinamico(G)
+    u, v = next(iter(G.edges))
+    peso = G.edges[u, v]["weight"]
+    with pytest.raises(ValueError):
+        dinamico.actualizar([{"origen": u, "destino": v, "peso": peso + 1}, {"origen": u, "destino": v, "peso": -1}])
+    assert G.edges[u, v]["weight"] == peso
+    assert dinamico.version == 0
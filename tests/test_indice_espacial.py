@@ -0,0 +1,90 @@
+"""
+IndiceEspacial against a brute-force haversine scan over every node.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from trabajo_modulado.model.nodo import generar_nodos, TEMUCO_BOUNDS
+from trabajo_modulado.model.indice_espacial import IndiceEspacial, haversine_km
+
+ROLES = [None, "client", "storage", "recharge"]
+
+
+@pytest.fixture(scope="module")
+def nodos():
+    random.seed(46)
+    np.random.seed(46)
+    nodos = generar_nodos(400)
+    # Un grupo muy denso y un nodo aislado: celdas con muchos nodos y anillos vacíos
+    for i in range(60):
+        nodos.append({"id": f"Z{i}", "role": "client", "lat": -38.74 + np.random.normal(0, 1e-4),
+                      "lon": -72.60 + np.random.normal(0, 1e-4)})
+    nodos.append({"id": "LEJOS", "role": "storage", "lat": -38.0, "lon": -71.5})
+    return nodos
+
+
+def fuerza_bruta(nodos, lat, lon, rol):
+    candidatos = [n for n in nodos if rol is None or n["role"] == rol]
+    distancias = haversine_km(lat, lon, np.array([n["lat"] for n in candidatos]), np.array([n["lon"] for n in candidatos]))
+    return {n["id"]: float(d) for n, d in zip(candidatos, distancias)}
+
+
+def punto_aleatorio(rng):
+    # Algo más amplio que el área de los nodos, para consultar también desde fuera
+    margen = 0.05
+    return (rng.uniform(TEMUCO_BOUNDS["min_lat"] - margen, TEMUCO_BOUNDS["max_lat"] + margen),
+            rng.uniform(TEMUCO_BOUNDS["min_lon"] - margen, TEMUCO_BOUNDS["max_lon"] + margen))
+
+
+def test_k_cercanos_contra_fuerza_bruta(nodos):
+    rng = random.Random(47)
+    indice = IndiceEspacial(nodos)
+    for _ in range(500):
+        lat, lon = punto_aleatorio(rng)
+        rol = rng.choice(ROLES)
+        k = rng.randint(1, 10)
+        distancias = fuerza_bruta(nodos, lat, lon, rol)
+        esperadas = sorted(distancias.values())[:k]
+
+        resultado = indice.k_cercanos(lat, lon, k, rol)
+        assert [d for _, d in resultado] == pytest.approx(esperadas)
+        for nodo_id, d in resultado:
+            assert distancias[nodo_id] == pytest.approx(d)
+        assert len({nodo_id for nodo_id, _ in resultado}) == len(resultado)
+
+        cercano = indice.cercano(lat, lon, rol)
+        assert cercano[1] == pytest.approx(esperadas[0])
+
+
+def test_en_radio_contra_fuerza_bruta(nodos):
+    rng = random.Random(48)
+    indice = IndiceEspacial(nodos)
+    for _ in range(500):
+        lat, lon = punto_aleatorio(rng)
+        rol = rng.choice(ROLES)
+        radio = rng.uniform(0, 3)
+        distancias = fuerza_bruta(nodos, lat, lon, rol)
+        resultado = indice.en_radio(lat, lon, radio, rol)
+        assert {nodo_id for nodo_id, _ in resultado} == {nodo_id for nodo_id, d in distancias.items() if d <= radio}
+        assert [d for _, d in resultado] == sorted(d for _, d in resultado)
+
+
+def test_k_vecinos_todos_contra_fuerza_bruta(nodos):
+    indice = IndiceEspacial(nodos)
+    k = 5
+    vecinos, distancias = indice.k_vecinos_todos(k)
+    lat, lon = indice.lat, indice.lon
+    for i in range(len(nodos)):
+        todas = haversine_km(lat[i], lon[i], lat, lon)
+        todas[i] = np.inf
+        np.testing.assert_allclose(distancias[i], np.sort(todas)[:k])
+        np.testing.assert_allclose(todas[vecinos[i]], distancias[i])
+
+
+def test_rol_sin_nodos():
+    indice = IndiceEspacial([{"id": "A", "role": "client", "lat": -38.7, "lon": -72.6}])
+    assert indice.k_cercanos(-38.7, -72.6, 3, "storage") == []
+    assert indice.cercano(-38.7, -72.6, "storage") is None
+    assert indice.k_cercanos(-38.7, -72.6, 3) == [("A", 0.0)]
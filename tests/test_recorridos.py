@@ -0,0 +1,128 @@
+"""
+PlanificadorRecorridos on small random graphs with a tight battery, checked
+by brute force: every tour is flown edge by edge to verify the battery, its
+cost and its capacity; the O(stops) feasibility check is compared with that
+simulation for every order of the stops; 2-opt results are checked against
+every possible 2-opt move.
+"""
+import itertools
+import random
+
+import numpy as np
+
+from trabajo_modulado.model.nodo import generar_nodos
+from trabajo_modulado.model.grafo import generar_aristas_aleatorias
+from trabajo_modulado.model.recorridos import PlanificadorRecorridos
+from trabajo_modulado.model.ruta import nodos_recarga
+
+MAX_BATERIA = 25
+
+
+def construir_grafo(seed, n_nodos=25, n_aristas=55):
+    random.seed(seed)
+    np.random.seed(seed)
+    return generar_aristas_aleatorias(generar_nodos(n_nodos), n_aristas)
+
+
+def ordenes_aleatorias(G, rng, n):
+    clientes = [n for n, d in G.nodes(data=True) if d["role"] == "client"]
+    almacenes = [n for n, d in G.nodes(data=True) if d["role"] == "storage"]
+    return [{"id": f"O{i}", "origen": rng.choice(clientes), "destino": rng.choice(almacenes),
+             "status": rng.choice(["Pendiente", "Pendiente", "Pendiente", "Delivered"]),
+             "fecha_creacion": f"2025-01-0{rng.randint(1, 2)} 08:00:00"} for i in range(1, n + 1)]
+
+
+def vuelo_factible(G, ruta, recargas):
+    # Vuelo arista por arista: la batería se recarga al llegar a cada nodo de recarga
+    carga = 0
+    for a, b in zip(ruta, ruta[1:]):
+        carga += G.edges[a, b]["weight"]
+        if carga > MAX_BATERIA:
+            return False
+        if b in recargas:
+            carga = 0
+    return True
+
+
+def ruta_de(matriz, secuencia):
+    puntos = [0] + list(secuencia) + [0]
+    ruta = [matriz["nodos"][0]]
+    for a, b in zip(puntos, puntos[1:]):
+        ruta.extend(matriz["caminos"][(a, b)][1:])
+    return ruta
+
+
+def test_recorridos_validos_y_cada_orden_una_vez():
+    rng = random.Random(38)
+    for seed in range(38, 48):
+        G = construir_grafo(seed)
+        recargas = nodos_recarga(G)
+        ordenes = ordenes_aleatorias(G, rng, 40)
+        capacidad = rng.randint(1, 5)
+        plan = PlanificadorRecorridos(G, capacidad, max_bateria=MAX_BATERIA).planificar(ordenes)
+        por_id = {o["id"]: o for o in ordenes}
+
+        asignadas = [i for r in plan["recorridos"] for i in r["ordenes"]] + plan["no_servidas"]
+        assert sorted(asignadas) == sorted(o["id"] for o in ordenes if o["status"] == "Pendiente")
+        for r in plan["recorridos"]:
+            ruta = r["ruta"]
+            assert ruta[0] == ruta[-1] == r["destino"]
+            assert len(r["ordenes"]) <= capacidad
+            assert all(por_id[i]["destino"] == r["destino"] for i in r["ordenes"])
+            assert all(por_id[i]["fecha_creacion"][:10] == r["dia"] for i in r["ordenes"])
+            assert {por_id[i]["origen"] for i in r["ordenes"]} == set(r["paradas"])
+            assert set(r["paradas"]) <= set(ruta)
+            assert r["costo"] == sum(G.edges[a, b]["weight"] for a, b in zip(ruta, ruta[1:]))
+            assert vuelo_factible(G, ruta, recargas), r
+        resumen = plan["resumen"]
+        assert resumen["ordenes_servidas"] + resumen["ordenes_no_servidas"] == len(asignadas)
+        assert resumen["viajes"] == len(plan["recorridos"])
+
+
+def test_factibilidad_por_perfiles_contra_vuelo_completo():
+    rng = random.Random(39)
+    for seed in range(50, 60):
+        G = construir_grafo(seed)
+        recargas = nodos_recarga(G)
+        planificador = PlanificadorRecorridos(G, max_bateria=MAX_BATERIA)
+        clientes = [n for n, d in G.nodes(data=True) if d["role"] == "client"]
+        almacenes = [n for n, d in G.nodes(data=True) if d["role"] == "storage"]
+        matriz = planificador.compilar_matriz(rng.choice(almacenes), rng.sample(clientes, min(4, len(clientes))))
+        paradas = range(1, len(matriz["nodos"]))
+        for k in range(1, len(matriz["nodos"])):
+            for secuencia in itertools.permutations(paradas, k):
+                secuencia = list(secuencia)
+                puntos = [0] + secuencia + [0]
+                if not all(np.isfinite(matriz["costo"][a, b]) for a, b in zip(puntos, puntos[1:])):
+                    assert not planificador._recorrido_factible(matriz, secuencia)
+                    continue
+                ruta = ruta_de(matriz, secuencia)
+                assert planificador._recorrido_factible(matriz, secuencia) == vuelo_factible(G, ruta, recargas)
+                costo = sum(G.edges[a, b]["weight"] for a, b in zip(ruta, ruta[1:]))
+                assert planificador._costo_recorrido(matriz["costo"], secuencia) == costo
+
+
+def test_dos_opt_deja_un_optimo_local():
+    rng = random.Random(40)
+    for seed in range(60, 70):
+        G = construir_grafo(seed)
+        planificador = PlanificadorRecorridos(G, capacidad=5, max_bateria=MAX_BATERIA)
+        clientes = [n for n, d in G.nodes(data=True) if d["role"] == "client"]
+        almacenes = [n for n, d in G.nodes(data=True) if d["role"] == "storage"]
+        matriz = planificador.compilar_matriz(rng.choice(almacenes), rng.sample(clientes, min(10, len(clientes))))
+        secuencias, _ = planificador._ahorros(matriz, [0] + [1] * (len(matriz["nodos"]) - 1))
+        for inicial in secuencias:
+            rng.shuffle(inicial)
+            if not planificador._recorrido_factible(matriz, inicial):
+                continue
+            resultado = planificador._dos_opt(matriz, inicial)
+            assert sorted(resultado) == sorted(inicial)
+            assert planificador._recorrido_factible(matriz, resultado)
+            costo = planificador._costo_recorrido(matriz["costo"], resultado)
+            assert costo <= planificador._costo_recorrido(matriz["costo"], inicial)
+            # Ninguna inversión de un tramo del recorrido lo mejora sin romper la batería
+            for a in range(len(resultado)):
+                for b in range(a + 1, len(resultado)):
+                    candidata = resultado[:a] + resultado[a:b + 1][::-1] + resultado[b + 1:]
+                    if planificador._recorrido_factible(matriz, candidata):
+                        assert planificador._costo_recorrido(matriz["costo"], candidata) >= costo - 1e-9
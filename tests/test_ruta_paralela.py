@@ -0,0 +1,76 @@
+"""
+EnrutadorParalelo (shared-memory process pool and the in-process path)
+against the sequential battery BFS of encontrar_rutas_lote.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from trabajo_modulado.model.nodo import generar_nodos
+from trabajo_modulado.model.grafo import generar_aristas_aleatorias
+from trabajo_modulado.model.ruta import encontrar_rutas_lote, nodos_recarga
+from trabajo_modulado.model.ruta_paralela import EnrutadorParalelo, enrutar_ordenes
+
+MAX_BATERIA = 20
+
+
+@pytest.fixture(scope="module")
+def grafo():
+    random.seed(49)
+    np.random.seed(49)
+    return generar_aristas_aleatorias(generar_nodos(80), 160)
+
+
+@pytest.fixture(scope="module")
+def pares(grafo):
+    rng = random.Random(50)
+    clientes = [n for n, d in grafo.nodes(data=True) if d["role"] == "client"]
+    almacenes = [n for n, d in grafo.nodes(data=True) if d["role"] == "storage"]
+    todos = [(c, a) for c in clientes for a in almacenes]
+    # Pares repetidos y un nodo inexistente, como llegan desde las órdenes
+    return todos + rng.sample(todos, 50) + [("NO-EXISTE", almacenes[0])]
+
+
+def verificar_camino(G, camino, costo, origen, destino):
+    recargas = nodos_recarga(G)
+    assert (camino[0], camino[-1]) == (origen, destino)
+    carga = 0
+    for a, b in zip(camino, camino[1:]):
+        peso = G.edges[a, b]["weight"]
+        carga = peso if b in recargas else carga + peso
+        assert carga <= MAX_BATERIA
+    assert costo == sum(G.edges[a, b]["weight"] for a, b in zip(camino, camino[1:]))
+
+
+@pytest.mark.parametrize("procesos", [1, 3])
+def test_paralelo_contra_secuencial(grafo, pares, procesos):
+    secuencial = encontrar_rutas_lote(grafo, [par for par in pares if par[0] in grafo], MAX_BATERIA)
+    with EnrutadorParalelo(grafo, procesos=procesos, max_bateria=MAX_BATERIA) as enrutador:
+        paralelo = enrutador.enrutar(pares)
+
+    assert set(paralelo) == set(pares)
+    alcanzables = 0
+    for par in set(pares):
+        camino, costo = paralelo[par]
+        esperado_camino, esperado_costo = secuencial.get(par, (None, None))
+        if esperado_camino is None:
+            assert (camino, costo) == (None, None), par
+            continue
+        alcanzables += 1
+        # La misma búsqueda: mismo costo (el camino puede diferir solo entre empates)
+        assert costo == esperado_costo, par
+        verificar_camino(grafo, camino, costo, *par)
+    assert alcanzables > 0
+
+
+def test_enrutar_ordenes_contra_secuencial(grafo, pares):
+    ordenes = [{"id": f"O{i}", "origen": o, "destino": d} for i, (o, d) in enumerate(pares) if o in grafo]
+    rutas_usadas = enrutar_ordenes(grafo, ordenes, procesos=2, max_bateria=MAX_BATERIA)
+    secuencial = encontrar_rutas_lote(grafo, [(o["origen"], o["destino"]) for o in ordenes], MAX_BATERIA)
+
+    con_ruta = [o for o in ordenes if secuencial[(o["origen"], o["destino"])][0] is not None]
+    assert sum(rutas_usadas.values()) == len(con_ruta)
+    for orden in con_ruta:
+        assert orden["costo_total"] == secuencial[(orden["origen"], orden["destino"])][1]
+    assert all("costo_total" not in o for o in ordenes if o not in con_ruta)
@@ -1,25 +1,105 @@
 import sys
 import os
-import json # For saving data for API
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import streamlit as st
 import matplotlib.pyplot as plt
 import pandas as pd
 import networkx as nx
 from datetime import datetime
-from model.nodo import generar_nodos
-from model.grafo import generar_aristas_aleatorias
-from model.ruta import encontrar_ruta_con_bateria
-from model.order import generar_ordenes
-from model.avl import AVLTree
-from visual.grafo_viz import visualizar_mapa_folium, visualizar_avl
-from utils.helpers import calcular_visitas_por_nodo
-from model.grafo import generar_aristas_aleatorias, kruskal_mst
+from io import BytesIO
+from collections import Counter
+from model.grafo import kruskal_mst, VECINOS_POR_DEFECTO
 from model.ruta import encontrar_ruta_con_bateria, dijkstra_with_battery, get_floyd_warshall_paths, reconstruct_path_from_floyd_warshall, calcular_costo
-from utils.reporting import generate_report_pdf # Added PDF report generator
+from model.avl import IndiceRutas
+from visual.grafo_viz import visualizar_mapa_folium, visualizar_avl
+from utils.helpers import calcular_visitas_por_nodo, top_n_con_otros
+from utils.serialization import dump_file, load_file # Data files shared with the API
+from utils.profiling import SimulationProfiler
+from app.simulacion import ejecutar_simulacion
+from model.despacho import clave_prioridad
+from utils.reporting import generate_report_pdf, iter_apendice_csv, APENDICES # Added PDF report generator
 
 st.set_page_config(page_title="Dashboard con 5 Pestañas", layout="wide")
 
+PERFILES_DIR = "perfiles" # Artefactos del perfilado de simulaciones
+INDICE_RUTAS_ARCHIVO = "api/data/indice_rutas.json" # Índice AVL de rutas que escriben la simulación y la API
+TOP_N_ESTADISTICAS = 15 # Nodos por gráfico en Statistics; el resto va a la barra "Otros"
+UMBRAL_BARRAS_MATPLOTLIB = 60 # Con más barras se usa st.bar_chart en lugar de una imagen de matplotlib
+COLORES_ROL = {"client": "#ff0000", "recharge": "#008000", "storage": "#0000ff"}
+
+
+def obtener_indice_rutas(rutas_usadas):
+    """
+    Route index for Route Analytics, kept in session_state so reruns reuse
+    it. A new session restores it from INDICE_RUTAS_ARCHIVO; afterwards only
+    the routes whose frequency changed are re-inserted (IndiceRutas.sincronizar).
+    """
+    indice = st.session_state.get("indice_rutas")
+    if indice is None and not rutas_usadas:
+        return IndiceRutas()
+    if indice is None:
+        try:
+            indice = IndiceRutas.desde_dict(load_file(INDICE_RUTAS_ARCHIVO))
+        except Exception:
+            indice = IndiceRutas()
+        st.session_state["indice_rutas"] = indice
+    # Firma barata de rutas_usadas: si no cambió desde el último rerun no hay nada que sincronizar
+    firma = (id(rutas_usadas), len(rutas_usadas), sum(rutas_usadas.values()))
+    if st.session_state.get("indice_rutas_firma") != firma:
+        indice.sincronizar(rutas_usadas)
+        st.session_state["indice_rutas_firma"] = firma
+    return indice
+
+
+def _figura_png(fig):
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def graficos_estadisticas(rutas_usadas, nodos, top_n):
+    """
+    Data and charts of the Statistics tab: per role, a DataFrame with the
+    top_n most visited nodes plus an "Otros" bar (all of them with
+    top_n=None) and its bar chart as PNG (None above UMBRAL_BARRAS_MATPLOTLIB
+    bars, drawn with st.bar_chart instead), and the role pie chart. Kept in
+    session_state while rutas_usadas, nodos and top_n stay the same.
+    """
+    firma = (len(rutas_usadas), sum(rutas_usadas.values()), len(nodos), top_n)
+    cache = st.session_state.get("estadisticas_cache")
+    # Se guardan los objetos mismos: una simulación nueva nunca reutiliza gráficos de la anterior
+    if cache is not None and cache[0] is rutas_usadas and cache[1] is nodos and cache[2] == firma:
+        return cache[3]
+
+    visitas_clientes, visitas_recarga, visitas_storage = calcular_visitas_por_nodo(rutas_usadas, nodos)
+    graficos = {}
+    for rol, visitas, etiqueta in (("client", visitas_clientes, "Cliente"),
+                                   ("recharge", visitas_recarga, "Recarga"),
+                                   ("storage", visitas_storage, "Storage")):
+        df = pd.DataFrame(top_n_con_otros(visitas, top_n), columns=["Nodo", "Visitas"])
+        png = None
+        if len(df) <= UMBRAL_BARRAS_MATPLOTLIB:
+            fig, ax = plt.subplots(figsize=(6, 4))
+            ax.bar(df["Nodo"], df["Visitas"], color=COLORES_ROL[rol])
+            ax.set_xlabel(etiqueta)
+            ax.set_ylabel("Visitas")
+            ax.tick_params(axis="x", rotation=45)
+            fig.tight_layout()
+            png = _figura_png(fig)
+        graficos[rol] = (df, png)
+
+    counts = Counter(n["role"] for n in nodos)
+    fig_pie, ax_pie = plt.subplots(figsize=(6, 4))
+    ax_pie.pie([counts.get("storage", 0), counts.get("recharge", 0), counts.get("client", 0)],
+               labels=["Storage", "Recharge", "Client"], autopct="%1.1f%%", startangle=90)
+    ax_pie.axis("equal")
+    fig_pie.tight_layout()
+    graficos["roles"] = _figura_png(fig_pie)
+
+    st.session_state["estadisticas_cache"] = (rutas_usadas, nodos, firma, graficos)
+    return graficos
+
 st.title("🚁  Simulador logistico de drones - Correos Chile")
 st.markdown("Proporciones de roles de nodo:")
 st.markdown("• 📦 Nodo de almacenamiento: 20%")
@@ -31,50 +111,98 @@ tabs = st.tabs(["Run Simulation", "Explore Network", "Clients & Orders", "Route
 with tabs[0]:
     st.header("⚙️ Iniciar simulación")
     n_nodes = st.slider("Number of Nodes", min_value=10, max_value=150, value=15)
-    n_edges = st.slider("Number of Edges", min_value=n_nodes-1, max_value=300, value=20)
+    modo_grafo = st.radio("Generación de aristas", ["aleatorio", "geografico"], horizontal=True,
+                          format_func={"aleatorio": "Aleatorias (peso 1-9)", "geografico": "Vecinos más cercanos (peso por distancia)"}.get)
+    if modo_grafo == "geografico":
+        vecinos = st.slider("Vecinos por nodo", min_value=1, max_value=10, value=VECINOS_POR_DEFECTO)
+        n_edges = None
+    else:
+        n_edges = st.slider("Number of Edges", min_value=n_nodes-1, max_value=300, value=20)
+        vecinos = VECINOS_POR_DEFECTO
     n_orders = st.slider("Number of Orders", min_value=1, max_value=500, value=10)
+    n_drones = st.number_input("Drones para simular entregas (0 = sin simulación de flota)", min_value=0, max_value=10000, value=0)
 
-    if st.button("Iniciar simulación"):
-        nodos = generar_nodos(n_nodes)
-        G = generar_aristas_aleatorias(nodos, n_edges)
-        ordenes = generar_ordenes(n_orders, nodos)
-
-        rutas_usadas = {}
-        for orden in ordenes:
-            ruta, costo = encontrar_ruta_con_bateria(G, orden["origen"], orden["destino"])
-            if ruta:
-                ruta_str = " → ".join(ruta)
-                rutas_usadas[ruta_str] = rutas_usadas.get(ruta_str, 0) + 1
-            else:
-                # Si no hay ruta válida, puedes decidir omitir o manejar aparte
-                pass
-
-        st.session_state["nodos"] = nodos
-        st.session_state["grafo"] = G
-        st.session_state["ordenes"] = ordenes
-        st.session_state["rutas_usadas"] = rutas_usadas
-
-        st.success(f"Simulación inicializada con {n_nodes} nodos, {n_edges} aristas y {n_orders} órdenes.")
+    with st.expander("🔬 Perfilado de la simulación"):
+        perfilar = st.checkbox("Registrar tiempos por etapa", key="perfilar_sim")
+        usar_cprofile = st.checkbox("Incluir cProfile", key="perfilar_cprofile", disabled=not perfilar)
+        usar_tracemalloc = st.checkbox("Incluir memoria (tracemalloc)", key="perfilar_tracemalloc", disabled=not perfilar)
 
-        # --- Save data for API ---
-        api_data_path = "api/data"
-        os.makedirs(api_data_path, exist_ok=True)
+    if st.button("Iniciar simulación"):
+        perfil = SimulationProfiler(enabled=perfilar, use_cprofile=usar_cprofile, use_tracemalloc=usar_tracemalloc)
+        barra = st.progress(0.0, text="Generando órdenes...")
+        def mostrar_progreso(etapa, hechas, total):
+            barra.progress(hechas / total if total else 1.0, text=f"Órdenes enrutadas: {hechas}/{total}")
         try:
-            with open(os.path.join(api_data_path, "nodos.json"), "w") as f:
-                json.dump(nodos, f, indent=4)
-            with open(os.path.join(api_data_path, "ordenes.json"), "w") as f:
-                json.dump(ordenes, f, indent=4)
-            with open(os.path.join(api_data_path, "rutas_usadas.json"), "w") as f:
-                json.dump(rutas_usadas, f, indent=4)
-            
-            # Serialize graph: NetworkX's node_link_data is a good choice for JSON
-            graph_data = nx.node_link_data(G)
-            with open(os.path.join(api_data_path, "grafo.json"), "w") as f:
-                json.dump(graph_data, f, indent=4)
-            st.toast("Datos de simulación guardados para la API.", icon="💾")
+            # Mismo motor que la línea de comandos; deja los archivos de datos para la API.
+            # El perfilador se detiene al salir del with aunque la simulación falle
+            with perfil:
+                resultado = ejecutar_simulacion(n_nodes, n_edges, n_orders, directorio="api/data",
+                                                progreso=mostrar_progreso, perfil=perfil, n_drones=n_drones or None,
+                                                modo_grafo=modo_grafo, vecinos=vecinos)
         except Exception as e:
-            st.error(f"Error al guardar datos para la API: {e}")
-        # --- End save data for API ---
+            st.error(f"Error al ejecutar la simulación: {e}")
+        else:
+            st.session_state["nodos"] = resultado["nodos"]
+            st.session_state["grafo"] = resultado["grafo"]
+            st.session_state["ordenes"] = resultado["ordenes"]
+            st.session_state["rutas_usadas"] = resultado["rutas_usadas"]
+            st.session_state["indice_rutas"] = resultado["indice_rutas"]
+            st.session_state.pop("indice_rutas_firma", None)
+            st.session_state["flota"] = resultado["flota"]
+            n_edges = resultado["grafo"].number_of_edges()
+            st.success(f"Simulación inicializada con {n_nodes} nodos, {n_edges} aristas y {n_orders} órdenes.")
+            st.toast("Datos de simulación guardados para la API.", icon="💾")
+        barra.empty()
+
+        if perfilar:
+            metadata = {"nodos": n_nodes, "aristas": n_edges, "ordenes": n_orders}
+            archivos = perfil.save(PERFILES_DIR, metadata)
+            st.session_state["perfil_simulacion"] = {
+                "etapas": perfil.stages,
+                "total": perfil.total_seconds(),
+                "cprofile": perfil.cprofile_text(),
+                "memoria": perfil.tracemalloc_text(),
+                "archivos": archivos,
+                "metadata": metadata,
+            }
+        else:
+            st.session_state.pop("perfil_simulacion", None)
+
+    if st.session_state.get("flota"):
+        flota = st.session_state["flota"]
+        st.subheader("🚁 Simulación de la flota")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Entregadas", f"{flota['ordenes_entregadas']}", f"{flota['ordenes_sin_ruta']} sin ruta", delta_color="off")
+        col2.metric("Duración total", f"{flota['minutos_totales']:.0f} min")
+        col3.metric("Espera de despacho promedio", f"{flota['espera_despacho_promedio']:.1f} min")
+        col4.metric("Utilización de la flota", f"{flota['utilizacion_flota'] * 100:.0f}%")
+        st.caption(f"{flota['cargas_en_estaciones']} cargas en estaciones, espera promedio "
+                   f"{flota['espera_estaciones_promedio']:.1f} min, cola máxima {flota['cola_estacion_maxima']} drones.")
+
+    if "perfil_simulacion" in st.session_state:
+        datos_perfil = st.session_state["perfil_simulacion"]
+        meta = datos_perfil["metadata"]
+        st.subheader("⏱️ Perfil de la última simulación")
+        st.caption(f"{meta['nodos']} nodos, {meta['aristas']} aristas, {meta['ordenes']} órdenes — "
+                   f"total {datos_perfil['total'] * 1000:.1f} ms")
+        df_etapas = pd.DataFrame(datos_perfil["etapas"])
+        df_etapas["ms"] = df_etapas["seconds"] * 1000
+        df_etapas["% del total"] = (df_etapas["seconds"] / max(datos_perfil["total"], 1e-9) * 100).round(1)
+        columnas = ["stage", "calls", "ms", "% del total"] + [c for c in ("memory_delta_bytes", "memory_peak_bytes") if c in df_etapas]
+        st.dataframe(df_etapas[columnas].rename(columns={"stage": "Etapa", "calls": "Llamadas"}), hide_index=True)
+        st.bar_chart(df_etapas.set_index("stage")["ms"])
+        if datos_perfil["cprofile"]:
+            with st.expander("cProfile (ordenado por tiempo acumulado)"):
+                st.code(datos_perfil["cprofile"])
+        if datos_perfil["memoria"]:
+            with st.expander("Mayores asignaciones de memoria (tracemalloc)"):
+                st.code(datos_perfil["memoria"])
+        st.caption("Artefactos guardados en: " + ", ".join(datos_perfil["archivos"]))
+        for ruta_archivo in datos_perfil["archivos"]:
+            if os.path.exists(ruta_archivo):
+                with open(ruta_archivo, "rb") as f:
+                    st.download_button(f"📥 {os.path.basename(ruta_archivo)}", data=f.read(),
+                                       file_name=os.path.basename(ruta_archivo), key=f"descargar_{ruta_archivo}")
 
 
 
@@ -198,11 +326,10 @@ with tabs[1]:
             # Botón Complete Delivery siempre visible
             if st.button("Complete Delivery", key="complete_delivery"):
                 ordenes = st.session_state["ordenes"]
-                orden_coincidente = None
-                for orden in ordenes:
-                    if orden["origen"] == origen and orden["destino"] == destino and orden["status"] == "Pendiente":
-                        orden_coincidente = orden
-                        break
+                # Entre las órdenes de este trayecto se entrega la más urgente (prioridad, luego antigüedad)
+                coincidentes = [orden for orden in ordenes if orden["origen"] == origen and orden["destino"] == destino
+                                and orden["status"] in ("Pendiente", "En ruta")]
+                orden_coincidente = min(coincidentes, key=clave_prioridad, default=None)
                 if orden_coincidente:
                     from datetime import datetime
 
@@ -212,8 +339,7 @@ with tabs[1]:
 
                     # Guardar cambios en el archivo para que FastAPI los vea
                     try:
-                        with open("api/data/ordenes.json", "w") as f:
-                            json.dump(ordenes, f, indent=4)
+                        dump_file("api/data/ordenes.json", ordenes)
                     except Exception as e:
                         st.error(f"Error al guardar cambios en ordenes.json: {e}")
 
@@ -260,8 +386,7 @@ with tabs[2]:
         clientes = [n for n in st.session_state["nodos"] if n["role"] == "client"]
         # Leer siempre el archivo actualizado de ordenes.json
         try:
-            with open("api/data/ordenes.json", "r") as f:
-                ordenes = json.load(f)
+            ordenes = load_file("api/data/ordenes.json")
         except Exception as e:
             st.error(f"Error al leer ordenes.json: {e}")
             ordenes = []
@@ -310,23 +435,20 @@ with tabs[3]:
     st.header("Route Frequency & History")
     rutas_usadas = st.session_state.get("rutas_usadas", {})
 
-    avl = AVLTree()
-    root = None
-    rutas_ordenadas = sorted(rutas_usadas.items(), key=lambda x: (len(x[0]), x[0]))
-
-    for ruta, freq in rutas_ordenadas:
-        clave = (len(ruta), ruta)
-        root = avl.insert(root, clave, freq)
+    # Árbol AVL por clave y por frecuencia, conservado entre reruns (el top-k recorre solo k nodos)
+    indice_rutas = obtener_indice_rutas(rutas_usadas)
+    root = indice_rutas.root
 
     if rutas_usadas:
         st.subheader("Rutas más frecuentes usadas")
-        for ruta, freq in sorted(rutas_usadas.items(), key=lambda x: x[1], reverse=True):
+        n_top = st.number_input("Rutas a mostrar", min_value=1, max_value=len(indice_rutas), value=min(10, len(indice_rutas)))
+        for ruta, freq in indice_rutas.top(int(n_top)):
             st.write(f"Ruta: {ruta} | Frecuencia: {freq}")
     else:
         st.info("No hay rutas completadas para mostrar.")
 
     st.subheader("Visualización del Árbol AVL de Rutas")
-    visualizar_avl(root)
+    visualizar_avl(root, version=indice_rutas.version)
 
     st.markdown("---")
     st.subheader("📄 Generar Informe PDF del Sistema")
@@ -337,7 +459,7 @@ with tabs[3]:
                 ordenes_report = st.session_state["ordenes"]
                 # rutas_usadas is already available
                 
-                pdf_buffer = generate_report_pdf(nodos_report, ordenes_report, rutas_usadas)
+                pdf_buffer = generate_report_pdf(nodos_report, ordenes_report, rutas_usadas, indice_rutas=indice_rutas.frecuencias)
                 
                 st.download_button(
                     label="📥 Descargar Informe PDF",
@@ -346,6 +468,27 @@ with tabs[3]:
                     mime="application/pdf"
                 )
                 st.success("¡Informe PDF listo para descargar!")
+
+        # Tablas completas (una fila por cliente, nodo o ruta) que el PDF resume en su top 10
+        apendice = st.selectbox("Apéndice completo (CSV)", list(APENDICES), format_func=lambda a: APENDICES[a]["titulo"])
+        # El CSV se arma solo al pedirlo y se reutiliza mientras no cambien el índice de rutas ni los datos
+        fuentes = (indice_rutas, st.session_state["nodos"], st.session_state["ordenes"], rutas_usadas)
+        cache = st.session_state.get("apendice_csv")
+        vigente = (cache is not None and cache[0] == apendice and cache[1] == indice_rutas.version
+                   and all(a is b for a, b in zip(cache[2], fuentes)))
+        if not vigente and st.button("Preparar apéndice CSV", key="apendice_csv_button"):
+            with st.spinner("Generando apéndice..."):
+                datos = b"".join(iter_apendice_csv(apendice, fuentes[1], fuentes[2], rutas_usadas, indice_rutas.frecuencias))
+            cache = (apendice, indice_rutas.version, fuentes, datos)
+            st.session_state["apendice_csv"] = cache
+            vigente = True
+        if vigente:
+            st.download_button(
+                label="📥 Descargar apéndice CSV",
+                data=cache[3],
+                file_name=f"apendice_{apendice}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv"
+            )
     else:
         st.info("Se requieren datos de simulación (nodos, órdenes y rutas usadas) para generar el informe PDF.")
 
@@ -367,100 +510,29 @@ with tabs[4]:
     if not rutas_usadas:
         st.info("No hay rutas procesadas aún. Inicia la simulación para generar datos.")
     else:
-        # 2. Contar cuántas veces aparece cada nodo en todas las rutas
-        visit_counts = Counter()
-        for ruta_str, freq in rutas_usadas.items():
-            # separa "A → B → C" en ["A", "B", "C"]
-            nodos_en_ruta = ruta_str.split(" → ")
-            for nodo in nodos_en_ruta:
-                visit_counts[nodo] += freq
-
-        # 3. Obtener listas de IDs de nodos por rol
         nodos = st.session_state["nodos"]
-        clientes_ids = [n["id"] for n in nodos if n["role"] == "client"]
-        recarga_ids  = [n["id"] for n in nodos if n["role"] == "recharge"]
-        storage_ids  = [n["id"] for n in nodos if n["role"] == "storage"]
-
-        # 4. Construir DataFrames para cada rol, con conteos (0 si no aparece)
-        df_clientes = pd.DataFrame({
-            "Nodo": clientes_ids,
-            "Visitas": [visit_counts.get(nid, 0) for nid in clientes_ids]
-        })
-        df_recarga = pd.DataFrame({
-            "Nodo": recarga_ids,
-            "Visitas": [visit_counts.get(nid, 0) for nid in recarga_ids]
-        })
-        df_storage = pd.DataFrame({
-            "Nodo": storage_ids,
-            "Visitas": [visit_counts.get(nid, 0) for nid in storage_ids]
-        })
-
-        # Ordenar cada DataFrame por “Visitas” descendente para resaltar los más visitados
-        df_clientes = df_clientes.sort_values(by="Visitas", ascending=False).reset_index(drop=True)
-        df_recarga  = df_recarga.sort_values(by="Visitas", ascending=False).reset_index(drop=True)
-        df_storage  = df_storage.sort_values(by="Visitas", ascending=False).reset_index(drop=True)
+        mostrar_todos = st.checkbox("Mostrar todos los nodos", key="estadisticas_todos")
+        top_n = None if mostrar_todos else st.slider(
+            "Nodos por gráfico (el resto se agrupa en 'Otros')", min_value=5, max_value=50, value=TOP_N_ESTADISTICAS,
+            key="estadisticas_top_n")
+
+        # 2-4. Visitas por rol, top-N y gráficos: se calculan una vez por versión de los datos
+        graficos = graficos_estadisticas(rutas_usadas, nodos, top_n)
 
         # 5. Colocar los tres gráficos de barras en una fila, usando columnas:
         col1, col2, col3 = st.columns([1, 1, 1], gap="small")
+        for col, rol, titulo in ((col1, "client", "Clientes más visitados"),
+                                 (col2, "recharge", "Recarga más usada"),
+                                 (col3, "storage", "Storage más visitado")):
+            with col:
+                st.subheader(titulo)
+                df, png = graficos[rol]
+                if png is not None:
+                    st.image(png, width="stretch")
+                else:
+                    # Series largas: gráfico nativo de Streamlit, dibujado en el navegador
+                    st.bar_chart(df, x="Nodo", y="Visitas", color=COLORES_ROL[rol])
 
-        # 5.1 Clientes más visitados (col1)
-        with col1:
-            st.subheader("Clientes más visitados")
-            fig1, ax1 = plt.subplots(figsize=(6, 4))
-            ax1.bar(df_clientes["Nodo"], df_clientes["Visitas"], color="red")
-            ax1.set_xlabel("Cliente")
-            ax1.set_ylabel("Visitas")
-            ax1.tick_params(axis="x", rotation=45)
-            ax1.set_title("")  # Si quieres un título corto, o déjalo en blanco
-            plt.tight_layout()
-            st.pyplot(fig1)
-
-        # 5.2 Nodos de recarga más usados (col2)
-        with col2:
-            st.subheader("Recarga más usada")
-            fig2, ax2 = plt.subplots(figsize=(6, 4))
-            ax2.bar(df_recarga["Nodo"], df_recarga["Visitas"], color="green")
-            ax2.set_xlabel("Recarga")
-            ax2.set_ylabel("Visitas")
-            ax2.tick_params(axis="x", rotation=45)
-            ax2.set_title("") 
-            plt.tight_layout()
-            st.pyplot(fig2)
-
-        # 5.3 Nodos de almacenamiento más visitados (col3)
-        with col3:
-            st.subheader("Storage más visitado")
-            fig3, ax3 = plt.subplots(figsize=(6, 4))
-            ax3.bar(df_storage["Nodo"], df_storage["Visitas"], color="blue")
-            ax3.set_xlabel("Storage")
-            ax3.set_ylabel("Visitas")
-            ax3.tick_params(axis="x", rotation=45)
-            ax3.set_title("") 
-            plt.tight_layout()
-            st.pyplot(fig3)
-
-        # ----------------------------------------------------------------
         # 5.4 Gráfico de tarta con la distribución total de nodos por rol
-        # ----------------------------------------------------------------
-
-        # Contar cuántos nodos hay de cada rol en total
-        roles = [n["role"] for n in nodos]
-        counts = Counter(roles)
-        storage_count = counts.get("storage", 0)
-        recharge_count = counts.get("recharge", 0)
-        client_count   = counts.get("client", 0)
-
-        labels = ["Storage", "Recharge", "Client"]
-        sizes  = [storage_count, recharge_count, client_count]
-
         st.subheader("Distribución de nodos por rol")
-        fig_pie, ax_pie = plt.subplots(figsize=(6, 4))
-        ax_pie.pie(
-            sizes,
-            labels=labels,
-            autopct="%1.1f%%",
-            startangle=90
-        )
-        ax_pie.axis("equal")
-        plt.tight_layout()
-        st.pyplot(fig_pie)
+        st.image(graficos["roles"])
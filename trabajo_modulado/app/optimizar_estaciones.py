@@ -0,0 +1,170 @@
+"""
+Recharge-station placement.
+
+Reads a simulation's data files (grafo.json plus rutas_usadas.json or
+ordenes.json), chooses k recharge locations with OptimizadorEstaciones and
+compares them with the current recharge nodes of the graph. Prints the plan
+as JSON; --aplicar also rewrites nodos.json and grafo.json so the chosen
+nodes are the recharge nodes. The replaced stations become clients with
+their own client_id, nombre and tipo. Only the current stations and the
+clients without orders or demand can receive a station, so no order is
+ever left pointing at a recharge node. The orders are then routed again
+over the new stations, rewriting their costo_total, rutas_usadas.json and
+indice_rutas.json. A plan with fewer than k stations, or one that leaves
+more demand without a feasible route than the current stations, is not
+applied.
+
+Usage (from the repository root):
+    python trabajo_modulado/app/optimizar_estaciones.py --k 10
+    python trabajo_modulado/app/optimizar_estaciones.py --k 25 --demanda ordenes --datos /tmp/datos --salida plan.json
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import json
+import time
+import networkx as nx
+from model.ruta import MAX_BATTERY, nodos_recarga, encontrar_rutas_lote
+from model.estaciones import OptimizadorEstaciones, demanda_desde_rutas, demanda_desde_ordenes
+from model.ruta_paralela import enrutar_ordenes
+from model.avl import IndiceRutas
+from utils.serialization import load_file, dump_file
+
+DATA_DIR = "api/data"
+
+
+def optimizar_desde_datos(directorio, k, demanda="rutas", max_bateria=MAX_BATTERY, iteraciones_intercambio=20):
+    """Runs the optimiser over the data files in `directorio`. Returns (plan, G)."""
+    G = nx.node_link_graph(load_file(os.path.join(directorio, "grafo.json")))
+    ruta_ordenes = os.path.join(directorio, "ordenes.json")
+    ordenes = load_file(ruta_ordenes) if os.path.exists(ruta_ordenes) else []
+    if demanda == "rutas":
+        pares = demanda_desde_rutas(load_file(os.path.join(directorio, "rutas_usadas.json")))
+    else:
+        pares = demanda_desde_ordenes(ordenes)
+
+    inicio = time.perf_counter()
+    optimizador = OptimizadorEstaciones(G, pares, max_bateria=max_bateria, candidatos=candidatos_estacion(G, pares, ordenes))
+    plan = optimizador.optimizar(k, iteraciones_intercambio)
+    plan["actual"] = {"estaciones": len(nodos_recarga(G)), **optimizador.evaluar(list(nodos_recarga(G)))}
+    plan["pares"] = len(optimizador.pares)
+    plan["candidatos"] = len(optimizador.candidatos)
+    plan["segundos"] = time.perf_counter() - inicio
+    return plan, G
+
+
+def candidatos_estacion(G, demanda, ordenes):
+    """
+    Nodes that may receive a station: the current recharge nodes and the
+    clients that are not the origin of any order nor a demand endpoint.
+    """
+    ocupados = {orden["origen"] for orden in ordenes} | {orden["destino"] for orden in ordenes}
+    ocupados.update(nodo for par in demanda for nodo in par)
+    return [n for n, datos in G.nodes(data=True)
+            if datos.get("role") == "recharge" or (datos.get("role") == "client" and n not in ocupados)]
+
+
+def aplicar_estaciones(directorio, G, estaciones):
+    """
+    Makes `estaciones` the only recharge nodes in nodos.json and grafo.json.
+    A client turned into a station loses its client fields; a replaced
+    station becomes a client numbered after the existing ones.
+    """
+    nuevas = set(estaciones)
+    nodos = load_file(os.path.join(directorio, "nodos.json"))
+    numeros = [int(nodo["client_id"][1:]) for nodo in nodos if str(nodo.get("client_id", ""))[1:].isdigit()]
+    siguiente_cliente = max(numeros, default=0) + 1
+    for nodo in nodos:
+        if nodo["id"] in nuevas:
+            nodo["role"] = "recharge"
+            for campo in ("client_id", "nombre", "tipo"):
+                nodo.pop(campo, None)
+        elif nodo["role"] == "recharge":
+            # Mismos campos que generar_nodos da a un cliente
+            nodo.update({"role": "client", "client_id": f"C{siguiente_cliente:03d}",
+                         "nombre": f"Client{siguiente_cliente - 1}", "tipo": "normal"})
+            siguiente_cliente += 1
+    for n, datos in G.nodes(data=True):
+        if n in nuevas:
+            datos["role"] = "recharge"
+        elif datos.get("role") == "recharge":
+            datos["role"] = "client"
+    dump_file(os.path.join(directorio, "nodos.json"), nodos)
+    dump_file(os.path.join(directorio, "grafo.json"), nx.node_link_data(G))
+
+
+def motivo_para_no_aplicar(plan, k):
+    """Why `plan` must not replace the current stations, or None if it can be applied."""
+    if len(plan["estaciones"]) < k:
+        return (f"the plan has {len(plan['estaciones'])} stations for --k {k}: more stations would not "
+                "improve any route, and applying it would drop the other current stations")
+    if plan["metricas"]["demanda_no_factible"] > plan["actual"]["demanda_no_factible"]:
+        return "the plan leaves more demand without a feasible route than the current stations"
+    return None
+
+
+def reenrutar(directorio, G, max_bateria=None):
+    """
+    Routes the orders again over G (after aplicar_estaciones) and rewrites
+    their costo_total, rutas_usadas.json and indice_rutas.json. Without
+    ordenes.json the pairs of rutas_usadas.json are routed again with their
+    frequencies. Returns the number of trips left without a feasible route.
+    """
+    ruta_ordenes = os.path.join(directorio, "ordenes.json")
+    if os.path.exists(ruta_ordenes):
+        ordenes = load_file(ruta_ordenes)
+        for orden in ordenes:
+            orden["costo_total"] = 0 # Como en crear_orden: sin ruta factible no hay costo
+        rutas_usadas = enrutar_ordenes(G, ordenes, max_bateria=max_bateria)
+        sin_ruta = sum(1 for orden in ordenes if not orden["costo_total"])
+        dump_file(ruta_ordenes, ordenes)
+    else:
+        demanda = demanda_desde_rutas(load_file(os.path.join(directorio, "rutas_usadas.json")))
+        rutas = encontrar_rutas_lote(G, list(demanda), max_bateria)
+        rutas_usadas = {}
+        sin_ruta = 0
+        for par, viajes in demanda.items():
+            ruta, _ = rutas[par]
+            if ruta is None:
+                sin_ruta += viajes
+                continue
+            ruta_str = " → ".join(ruta)
+            rutas_usadas[ruta_str] = rutas_usadas.get(ruta_str, 0) + viajes
+    dump_file(os.path.join(directorio, "rutas_usadas.json"), rutas_usadas)
+    dump_file(os.path.join(directorio, "indice_rutas.json"), IndiceRutas(rutas_usadas).a_dict())
+    return sin_ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, required=True, help="Number of recharge stations to place")
+    parser.add_argument("--datos", default=DATA_DIR, help=f"Directory with the data files (default: {DATA_DIR})")
+    parser.add_argument("--demanda", choices=["rutas", "ordenes"], default="rutas",
+                        help="Demand source: rutas_usadas.json (route frequencies) or ordenes.json")
+    parser.add_argument("--bateria", type=float, default=MAX_BATTERY, help="Battery range per charge")
+    parser.add_argument("--intercambios", type=int, default=20, help="Maximum swap local-search rounds")
+    parser.add_argument("--salida", help="Also write the plan to this JSON file")
+    parser.add_argument("--aplicar", action="store_true",
+                        help="Rewrite nodos.json and grafo.json with the new stations and route the orders again")
+    args = parser.parse_args()
+
+    if args.k < 1:
+        parser.error("--k must be at least 1")
+
+    plan, G = optimizar_desde_datos(args.datos, args.k, args.demanda, args.bateria, args.intercambios)
+    if args.salida:
+        dump_file(args.salida, plan)
+    json.dump(plan, sys.stdout, indent=2)
+    print()
+    if args.aplicar:
+        motivo = motivo_para_no_aplicar(plan, args.k)
+        if motivo is not None:
+            sys.exit(f"Not applied: {motivo}.")
+        aplicar_estaciones(args.datos, G, plan["estaciones"])
+        sin_ruta = reenrutar(args.datos, G, args.bateria)
+        print(f"Applied {len(plan['estaciones'])} stations; {sin_ruta} trips have no feasible route.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
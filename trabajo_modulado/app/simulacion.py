@@ -0,0 +1,273 @@
+"""
+Headless simulation engine.
+
+Runs the same pipeline as the "Run Simulation" tab of the dashboard
+(generar_nodos -> generar_aristas_aleatorias -> generar_ordenes -> battery
+routing -> data files for the API) without Streamlit, so large simulations
+can run in batch. Orders are generated, routed and written in chunks: with
+conservar_ordenes=False memory stays bounded by the chunk size and the
+number of distinct (origin, destination) pairs, not by the number of orders.
+
+Usage (from the repository root):
+    python trabajo_modulado/app/simulacion.py --nodos 1000 --aristas 3000 --ordenes 1000000 --seed 42
+    python trabajo_modulado/app/simulacion.py --nodos 150 --aristas 300 --ordenes 5000 --salida /tmp/datos --perfil
+    python trabajo_modulado/app/simulacion.py --nodos 500 --aristas 1500 --ordenes 50000 --drones 2000 --cargadores 4
+    python trabajo_modulado/app/simulacion.py --nodos 400 --aristas 900 --ordenes 5000 --capacidad-recorrido 4
+    python trabajo_modulado/app/simulacion.py --nodos 1000 --grafo geografico --vecinos 5 --ordenes 5000
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import json
+import random
+import time
+import numpy as np
+import networkx as nx
+from model.nodo import generar_nodos
+from model.grafo import generar_aristas_aleatorias, generar_aristas_geograficas, VECINOS_POR_DEFECTO, PESO_POR_KM
+from model.order import generar_ordenes_por_bloques
+from model.ruta_paralela import EnrutadorParalelo, registrar_rutas, MIN_PARES_PARALELO
+from model.flota import SimuladorFlota, CARGADORES_POR_ESTACION
+from model.despacho import PlanificadorDespacho
+from model.recorridos import PlanificadorRecorridos
+from model.avl import IndiceRutas
+from utils.serialization import dump_file, dump_array_file
+from utils.profiling import SimulationProfiler
+
+DATA_DIR = "api/data" # Mismo directorio que lee la API
+TAMANO_BLOQUE = 50000 # Órdenes generadas, enrutadas y escritas por bloque
+PERFILES_DIR = "perfiles"
+
+
+def ejecutar_simulacion(n_nodos, n_aristas, n_ordenes, seed=None, directorio=DATA_DIR, procesos=1,
+                        tamano_bloque=TAMANO_BLOQUE, progreso=None, perfil=None, conservar_ordenes=True,
+                        n_drones=None, parametros_flota=None, despacho="prioridad", capacidad_recorrido=None,
+                        modo_grafo="aleatorio", vecinos=VECINOS_POR_DEFECTO, peso_por_km=PESO_POR_KM):
+    """
+    Generates a network and its orders, routes every order with the battery
+    BFS and writes nodos.json, grafo.json, ordenes.json, rutas_usadas.json
+    and indice_rutas.json to `directorio` (skipped when directorio is None).
+
+    Args:
+        n_aristas: number of edges for modo_grafo="aleatorio"; unused otherwise.
+        seed: seeds random and numpy.random; None keeps the current state.
+        procesos: worker processes for routing; 1 routes in this process.
+        progreso: optional callback(etapa, hechas, total) called after each chunk.
+        perfil: optional SimulationProfiler; its stages accumulate across chunks.
+        conservar_ordenes: keep the order dicts in the result. Turn it off for
+            very large runs, the orders are still written to disk.
+        n_drones: when given, the orders are delivered by a SimuladorFlota of
+            this size (extra keyword arguments in parametros_flota) before
+            being written, so they end up "Delivered" with their fecha_entrega.
+            The fleet simulation needs every order at once, so in this mode
+            ordenes.json is written after it instead of chunk by chunk.
+        despacho: "prioridad" hands pending orders to free drones through a
+            PlanificadorDespacho (prioridad, then age); "fifo" in release order.
+        capacidad_recorrido: when given, the pending orders are also planned
+            as multi-stop tours of up to this many orders per drone
+            (PlanificadorRecorridos), written to recorridos.json. Like
+            n_drones, this keeps every order in memory.
+        modo_grafo: "aleatorio" (generar_aristas_aleatorias, random 1-9 weights)
+            or "geografico" (generar_aristas_geograficas: each node linked to
+            its `vecinos` nearest nodes, `peso_por_km` battery units per km).
+
+    Returns:
+        dict: nodos, grafo, ordenes (None when not kept), rutas_usadas, flota
+        (fleet metrics or None), recorridos (tour summary or None), indice_rutas
+        (IndiceRutas, None without directorio) and resumen.
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    perfil = perfil or SimulationProfiler(enabled=False)
+    inicio = time.perf_counter()
+
+    with perfil.stage("generar_nodos"):
+        nodos = generar_nodos(n_nodos)
+    with perfil.stage("generar_grafo"):
+        if modo_grafo == "geografico":
+            G = generar_aristas_geograficas(nodos, vecinos, peso_por_km)
+        else:
+            G = generar_aristas_aleatorias(nodos, n_aristas)
+
+    if directorio is not None:
+        os.makedirs(directorio, exist_ok=True)
+        with perfil.stage("guardar_nodos"):
+            dump_file(os.path.join(directorio, "nodos.json"), nodos)
+        with perfil.stage("guardar_grafo"):
+            dump_file(os.path.join(directorio, "grafo.json"), nx.node_link_data(G))
+
+    # El pool solo se levanta si el lote puede llegar al umbral de pares distintos
+    if n_ordenes < MIN_PARES_PARALELO:
+        procesos = 1
+    enrutador = EnrutadorParalelo(G, procesos)
+
+    rutas_por_par = {} # Compartido entre bloques: cada par se enruta una sola vez
+    rutas_usadas = {}
+    necesita_ordenes = bool(n_drones or capacidad_recorrido)
+    ordenes = [] if conservar_ordenes or necesita_ordenes else None
+    escribir_por_bloques = directorio is not None and not necesita_ordenes
+    contadores = {"ordenes": 0, "enrutadas": 0, "costo_total": 0}
+
+    def bloques_enrutados():
+        bloques = generar_ordenes_por_bloques(n_ordenes, nodos, tamano_bloque)
+        while True:
+            with perfil.stage("generar_ordenes"):
+                bloque = next(bloques, None)
+            if bloque is None:
+                return
+            with perfil.stage("enrutar_ordenes"):
+                faltantes = {(o["origen"], o["destino"]) for o in bloque} - rutas_por_par.keys()
+                if faltantes:
+                    rutas_por_par.update(enrutador.enrutar(faltantes))
+                registrar_rutas(bloque, rutas_por_par, rutas_usadas)
+
+            contadores["ordenes"] += len(bloque)
+            for orden in bloque:
+                if orden["costo_total"]:
+                    contadores["enrutadas"] += 1
+                    contadores["costo_total"] += orden["costo_total"]
+            if ordenes is not None:
+                ordenes.extend(bloque)
+            if progreso is not None:
+                progreso("ordenes", contadores["ordenes"], n_ordenes)
+            if escribir_por_bloques:
+                # El consumidor escribe el bloque antes de pedir el siguiente
+                with perfil.stage("guardar_ordenes"):
+                    yield bloque
+            else:
+                yield bloque
+
+    try:
+        if escribir_por_bloques:
+            # La escritura consume los bloques a medida que se generan y enrutan
+            dump_array_file(os.path.join(directorio, "ordenes.json"), bloques_enrutados())
+        else:
+            for _ in bloques_enrutados():
+                pass
+    finally:
+        enrutador.cerrar()
+
+    recorridos = None
+    if capacidad_recorrido:
+        # Se planifica antes de la flota, mientras las órdenes siguen pendientes
+        with perfil.stage("planificar_recorridos"):
+            plan = PlanificadorRecorridos(G, capacidad_recorrido).planificar(ordenes)
+        recorridos = plan["resumen"]
+        if directorio is not None:
+            with perfil.stage("guardar_recorridos"):
+                dump_file(os.path.join(directorio, "recorridos.json"), plan)
+
+    flota = None
+    if n_drones:
+        with perfil.stage("simular_flota"):
+            cola = PlanificadorDespacho() if despacho == "prioridad" else None
+            flota = SimuladorFlota(G, n_drones, **(parametros_flota or {})).simular(ordenes, rutas_por_par, cola=cola)
+            flota["despacho"] = despacho
+        if progreso is not None:
+            progreso("entregas", flota["ordenes_entregadas"], contadores["enrutadas"])
+
+    if necesita_ordenes:
+        if directorio is not None:
+            with perfil.stage("guardar_ordenes"):
+                dump_array_file(os.path.join(directorio, "ordenes.json"),
+                                (ordenes[i:i + tamano_bloque] for i in range(0, len(ordenes), tamano_bloque)))
+        if not conservar_ordenes:
+            ordenes = None
+
+    indice_rutas = None
+    if directorio is not None:
+        with perfil.stage("guardar_rutas_usadas"):
+            dump_file(os.path.join(directorio, "rutas_usadas.json"), rutas_usadas)
+        with perfil.stage("guardar_indice_rutas"):
+            # Índice AVL de rutas persistido junto a rutas_usadas: el dashboard y la API lo restauran sin reconstruirlo
+            indice_rutas = IndiceRutas(rutas_usadas)
+            dump_file(os.path.join(directorio, "indice_rutas.json"), indice_rutas.a_dict())
+
+    resumen = {
+        "nodos": n_nodos,
+        "aristas": G.number_of_edges(),
+        "grafo": modo_grafo,
+        "ordenes": contadores["ordenes"],
+        "ordenes_enrutadas": contadores["enrutadas"],
+        "ordenes_sin_ruta": contadores["ordenes"] - contadores["enrutadas"],
+        "costo_total": contadores["costo_total"],
+        "rutas_distintas": len(rutas_usadas),
+        "pares_distintos": len(rutas_por_par),
+        "segundos": time.perf_counter() - inicio,
+        "directorio": directorio,
+    }
+    if recorridos is not None:
+        resumen["recorridos"] = recorridos
+    if flota is not None:
+        resumen["flota"] = flota
+    return {"nodos": nodos, "grafo": G, "ordenes": ordenes, "rutas_usadas": rutas_usadas, "flota": flota,
+            "recorridos": recorridos, "indice_rutas": indice_rutas, "resumen": resumen}
+
+
+def _imprimir_progreso(etapa, hechas, total):
+    porcentaje = hechas / total * 100 if total else 100.0
+    print(f"[{etapa}] {hechas}/{total} ({porcentaje:.0f}%)", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodos", type=int, required=True)
+    parser.add_argument("--aristas", type=int, help="Number of edges (required with --grafo aleatorio)")
+    parser.add_argument("--ordenes", type=int, required=True)
+    parser.add_argument("--grafo", choices=["aleatorio", "geografico"], default="aleatorio",
+                        help="Random edges with random weights, or k-nearest-neighbour edges weighted by distance")
+    parser.add_argument("--vecinos", type=int, default=VECINOS_POR_DEFECTO,
+                        help="Nearest neighbours per node (with --grafo geografico)")
+    parser.add_argument("--peso-km", type=float, default=PESO_POR_KM,
+                        help="Battery units per km of edge (with --grafo geografico); weights are rounded, minimum 1")
+    parser.add_argument("--seed", type=int, help="Seed for random and numpy.random")
+    parser.add_argument("--salida", default=DATA_DIR, help=f"Directory for the data files (default: {DATA_DIR})")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1, help="Routing worker processes")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="Orders per chunk")
+    parser.add_argument("--drones", type=int, help="Deliver the orders with a simulated fleet of this size")
+    parser.add_argument("--cargadores", type=int, default=CARGADORES_POR_ESTACION,
+                        help="Drones each recharge station can charge at once (with --drones)")
+    parser.add_argument("--despacho", choices=["prioridad", "fifo"], default="prioridad",
+                        help="Order in which pending orders get a drone (with --drones)")
+    parser.add_argument("--capacidad-recorrido", type=int,
+                        help="Plan multi-stop tours of up to this many orders per drone (recorridos.json)")
+    parser.add_argument("--perfil", action="store_true", help=f"Save stage timings and a cProfile to {PERFILES_DIR}/")
+    args = parser.parse_args()
+
+    if args.grafo == "aleatorio":
+        if args.aristas is None:
+            parser.error("--aristas is required with --grafo aleatorio")
+        if args.aristas < args.nodos - 1:
+            parser.error("--aristas must be at least --nodos - 1 (the generator always builds a spanning path)")
+        if args.aristas > args.nodos * (args.nodos - 1) // 2:
+            parser.error("--aristas exceeds the number of possible edges")
+    elif args.vecinos < 1:
+        parser.error("--vecinos must be at least 1")
+    elif args.peso_km <= 0:
+        parser.error("--peso-km must be positive")
+    if args.drones is not None and args.drones < 1:
+        parser.error("--drones must be at least 1")
+    if args.capacidad_recorrido is not None and args.capacidad_recorrido < 1:
+        parser.error("--capacidad-recorrido must be at least 1")
+
+    perfil = SimulationProfiler(enabled=args.perfil, use_cprofile=args.perfil)
+    with perfil:
+        resultado = ejecutar_simulacion(args.nodos, args.aristas, args.ordenes, seed=args.seed, directorio=args.salida,
+                                        procesos=args.procesos, tamano_bloque=args.bloque,
+                                        progreso=_imprimir_progreso, perfil=perfil, conservar_ordenes=False,
+                                        n_drones=args.drones, parametros_flota={"cargadores": args.cargadores},
+                                        despacho=args.despacho, capacidad_recorrido=args.capacidad_recorrido,
+                                        modo_grafo=args.grafo, vecinos=args.vecinos, peso_por_km=args.peso_km)
+
+    resumen = resultado["resumen"]
+    if args.perfil:
+        resumen["perfil"] = perfil.save(PERFILES_DIR, {"nodos": args.nodos, "aristas": resumen["aristas"],
+                                                       "grafo": args.grafo, "ordenes": args.ordenes, "seed": args.seed})
+    json.dump(resumen, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,166 @@
-import networkx as nx
-import matplotlib.pyplot as plt
-import streamlit as st
 class AVLNode:
+    __slots__ = ("key", "freq", "left", "right", "height", "size")
+
     def __init__(self, key, freq):
         self.key = key
         self.freq = freq
         self.left = None
         self.right = None
         self.height = 1
+        self.size = 1 # Nodos del subárbol, para consultas por posición
 
 class AVLTree:
+    """
+    AVL tree of (key, freq) entries. Methods take and return the root, as
+    in the original recursive version, but every operation is iterative
+    (explicit stacks instead of recursion), so depth is never a concern and
+    nodes use __slots__ to keep millions of routes compact. Every node also
+    stores its subtree size, so select/rank answer positional queries in
+    O(log n).
+    """
+
     def insert(self, root, key, freq):
         if not root:
             return AVLNode(key, freq)
 
-        if key < root.key:
-            root.left = self.insert(root.left, key, freq)
-        elif key > root.key:
-            root.right = self.insert(root.right, key, freq)
-        else:
-            root.freq = freq
+        camino = []
+        nodo = root
+        while nodo:
+            if key < nodo.key:
+                camino.append((nodo, "left"))
+                nodo = nodo.left
+            elif key > nodo.key:
+                camino.append((nodo, "right"))
+                nodo = nodo.right
+            else:
+                nodo.freq = freq
+                return root
+
+        padre, lado = camino[-1]
+        setattr(padre, lado, AVLNode(key, freq))
+        return self._rebalancearCamino(camino)
+
+    def delete(self, root, key):
+        """Removes `key` if present. Returns the new root."""
+        camino = []
+        nodo = root
+        while nodo and nodo.key != key:
+            lado = "left" if key < nodo.key else "right"
+            camino.append((nodo, lado))
+            nodo = getattr(nodo, lado)
+        if not nodo:
             return root
 
+        if nodo.left and nodo.right:
+            # Se reemplaza por el sucesor en orden y se elimina el sucesor, que no tiene hijo izquierdo
+            camino.append((nodo, "right"))
+            sucesor = nodo.right
+            while sucesor.left:
+                camino.append((sucesor, "left"))
+                sucesor = sucesor.left
+            nodo.key, nodo.freq = sucesor.key, sucesor.freq
+            nodo = sucesor
+
+        hijo = nodo.left or nodo.right
+        if not camino:
+            return hijo
+        padre, lado = camino[-1]
+        setattr(padre, lado, hijo)
+        return self._rebalancearCamino(camino)
 
-    # resto igual (rotaciones y balanceos)
+    def search(self, root, key):
+        """Node with `key`, or None."""
+        nodo = root
+        while nodo:
+            if key < nodo.key:
+                nodo = nodo.left
+            elif key > nodo.key:
+                nodo = nodo.right
+            else:
+                return nodo
+        return None
 
+    def buildFromSorted(self, items):
+        """
+        Builds a balanced tree in O(n) from (key, freq) pairs sorted by key.
+        Repeated keys keep the last freq, as insert does.
+        """
+        entradas = []
+        for key, freq in items:
+            if entradas and key == entradas[-1][0]:
+                entradas[-1] = (key, freq)
+                continue
+            if entradas and key < entradas[-1][0]:
+                raise ValueError("buildFromSorted requiere las claves en orden ascendente")
+            entradas.append((key, freq))
+        if not entradas:
+            return None
 
-        root.height = 1 + max(self.getHeight(root.left), self.getHeight(root.right))
+        # Cada rango [desde, hasta) toma su punto medio como raíz; los tamaños de los
+        # subárboles difieren en a lo más uno, así que el resultado ya está balanceado
+        creados = []
+        root = None
+        pendientes = [(0, len(entradas), None, None)]
+        while pendientes:
+            desde, hasta, padre, lado = pendientes.pop()
+            medio = (desde + hasta) // 2
+            nodo = AVLNode(*entradas[medio])
+            creados.append(nodo)
+            if padre is None:
+                root = nodo
+            else:
+                setattr(padre, lado, nodo)
+            if desde < medio:
+                pendientes.append((desde, medio, nodo, "left"))
+            if medio + 1 < hasta:
+                pendientes.append((medio + 1, hasta, nodo, "right"))
+        # Los hijos se crean después que su padre: en orden inverso las alturas ya están listas
+        for nodo in reversed(creados):
+            self._actualizar(nodo)
+        return root
+
+    def _actualizar(self, nodo):
+        nodo.height = 1 + max(self.getHeight(nodo.left), self.getHeight(nodo.right))
+        nodo.size = 1 + self.getSize(nodo.left) + self.getSize(nodo.right)
+
+    def _rebalancear(self, root):
+        self._actualizar(root)
 
         balance = self.getBalance(root)
 
-        # Rotaciones AVL
-        # Left Left
-        if balance > 1 and key < root.left.key:
-            return self.rightRotate(root)
-        # Right Right
-        if balance < -1 and key > root.right.key:
-            return self.leftRotate(root)
-        # Left Right
-        if balance > 1 and key > root.left.key:
-            root.left = self.leftRotate(root.left)
+        # Rotaciones AVL (según el balance del hijo, válido tanto al insertar como al eliminar)
+        if balance > 1:
+            # Left Right
+            if self.getBalance(root.left) < 0:
+                root.left = self.leftRotate(root.left)
+            # Left Left
             return self.rightRotate(root)
-        # Right Left
-        if balance < -1 and key < root.right.key:
-            root.right = self.rightRotate(root.right)
+        if balance < -1:
+            # Right Left
+            if self.getBalance(root.right) > 0:
+                root.right = self.rightRotate(root.right)
+            # Right Right
             return self.leftRotate(root)
 
         return root
 
+    def _rebalancearCamino(self, camino):
+        """Rebalances the nodes of `camino` bottom-up, re-linking rotated subtrees. Returns the root."""
+        nuevo = None
+        for i in range(len(camino) - 1, -1, -1):
+            nuevo = self._rebalancear(camino[i][0])
+            if i:
+                padre, lado = camino[i - 1]
+                setattr(padre, lado, nuevo)
+        return nuevo
+
     def leftRotate(self, z):
         y = z.right
         T2 = y.left
         y.left = z
         z.right = T2
-        z.height = 1 + max(self.getHeight(z.left), self.getHeight(z.right))
-        y.height = 1 + max(self.getHeight(y.left), self.getHeight(y.right))
+        self._actualizar(z)
+        self._actualizar(y)
         return y
 
     def rightRotate(self, z):
@@ -62,8 +168,8 @@ class AVLTree:
         T3 = y.right
         y.right = z
         z.left = T3
-        z.height = 1 + max(self.getHeight(z.left), self.getHeight(z.right))
-        y.height = 1 + max(self.getHeight(y.left), self.getHeight(y.right))
+        self._actualizar(z)
+        self._actualizar(y)
         return y
 
     def getHeight(self, root):
@@ -71,16 +177,228 @@ class AVLTree:
             return 0
         return root.height
 
+    def getSize(self, root):
+        if not root:
+            return 0
+        return root.size
+
     def getBalance(self, root):
         if not root:
             return 0
         return self.getHeight(root.left) - self.getHeight(root.right)
 
+    def select(self, root, i):
+        """Node at in-order position i (0-based), or None if out of range."""
+        if i < 0 or i >= self.getSize(root):
+            return None
+        nodo = root
+        while nodo:
+            izquierda = self.getSize(nodo.left)
+            if i < izquierda:
+                nodo = nodo.left
+            elif i > izquierda:
+                i -= izquierda + 1
+                nodo = nodo.right
+            else:
+                return nodo
+        return None
+
+    def rank(self, root, key):
+        """Number of keys smaller than `key`."""
+        menores = 0
+        nodo = root
+        while nodo:
+            if key <= nodo.key:
+                nodo = nodo.left
+            else:
+                menores += self.getSize(nodo.left) + 1
+                nodo = nodo.right
+        return menores
+
     def preorder(self, root):
         res = []
-        if root:
-            res.append((root.key, root.freq))
-            res += self.preorder(root.left)
-            res += self.preorder(root.right)
+        pila = [root] if root else []
+        while pila:
+            nodo = pila.pop()
+            res.append((nodo.key, nodo.freq))
+            if nodo.right:
+                pila.append(nodo.right)
+            if nodo.left:
+                pila.append(nodo.left)
         return res
-    
+
+    def inorder(self, root):
+        """Yields (key, freq) in ascending key order."""
+        return self.rangeQuery(root)
+
+    def rangeQuery(self, root, desde=None, hasta=None):
+        """Yields (key, freq) with desde <= key <= hasta (None = unbounded), in ascending order."""
+        pila = []
+        nodo = root
+        while pila or nodo:
+            # Baja por la izquierda solo mientras pueda haber claves >= desde
+            while nodo:
+                if desde is not None and nodo.key < desde:
+                    nodo = nodo.right
+                    continue
+                pila.append(nodo)
+                nodo = nodo.left
+            if not pila:
+                return
+            nodo = pila.pop()
+            if hasta is not None and nodo.key > hasta:
+                return
+            yield nodo.key, nodo.freq
+            nodo = nodo.right
+
+
+class IndiceFrecuencias:
+    """
+    Routes ordered by frequency: an AVLTree keyed by (-freq, ruta), so an
+    in-order walk yields the most used routes first (ties by route), plus a
+    ruta -> freq map to find a route's current key. Changing a frequency is
+    a delete and an insert, O(log n); top(k) walks k nodes, O(log n + k).
+    """
+
+    def __init__(self, frecuencias=None):
+        self.avl = AVLTree()
+        self.frecuencias = dict(frecuencias or {})
+        self.root = self.avl.buildFromSorted(sorted(((-freq, ruta), freq) for ruta, freq in self.frecuencias.items()))
+
+    def __len__(self):
+        return len(self.frecuencias)
+
+    def __contains__(self, ruta):
+        return ruta in self.frecuencias
+
+    def copia(self):
+        """Independent copy in O(n): the tree is rebuilt from its own in-order walk, without sorting."""
+        copia = IndiceFrecuencias()
+        copia.frecuencias = dict(self.frecuencias)
+        copia.root = copia.avl.buildFromSorted(self.avl.inorder(self.root))
+        return copia
+
+    def frecuencia(self, ruta):
+        return self.frecuencias.get(ruta, 0)
+
+    def fijar(self, ruta, freq):
+        """Sets the frequency of `ruta`; 0 or less removes it."""
+        anterior = self.frecuencias.get(ruta)
+        if anterior is not None:
+            self.root = self.avl.delete(self.root, (-anterior, ruta))
+        if freq > 0:
+            self.frecuencias[ruta] = freq
+            self.root = self.avl.insert(self.root, (-freq, ruta), freq)
+        else:
+            self.frecuencias.pop(ruta, None)
+
+    def incrementar(self, ruta, delta=1):
+        self.fijar(ruta, self.frecuencias.get(ruta, 0) + delta)
+
+    def actualizar(self, frecuencias):
+        """Adds every (ruta, delta) of a rutas_usadas-like map."""
+        for ruta, delta in frecuencias.items():
+            self.incrementar(ruta, delta)
+
+    def top(self, k):
+        """The k most frequent routes as (ruta, freq), most frequent first."""
+        resultado = []
+        if k <= 0:
+            return resultado
+        for (_, ruta), freq in self.avl.inorder(self.root):
+            resultado.append((ruta, freq))
+            if len(resultado) >= k:
+                break
+        return resultado
+
+    def posicion(self, ruta):
+        """1-based position of `ruta` in the frequency ranking, or None."""
+        freq = self.frecuencias.get(ruta)
+        if freq is None:
+            return None
+        return self.avl.rank(self.root, (-freq, ruta)) + 1
+
+    def items(self):
+        """Every (ruta, freq), most frequent first."""
+        for (_, ruta), freq in self.avl.inorder(self.root):
+            yield ruta, freq
+
+
+FORMATO_INDICE_RUTAS = 1
+
+
+def clave_ruta(ruta):
+    """Key of a route in the route AVL: shorter route strings first, then alphabetical."""
+    return (len(ruta), ruta)
+
+
+class IndiceRutas:
+    """
+    Route history index kept across dashboard reruns and API requests: the
+    route AVL keyed by clave_ruta (the one drawn in Route Analytics) plus
+    an IndiceFrecuencias for top-k. registrar and sincronizar update both
+    trees in O(log n) per changed route instead of rebuilding them.
+
+    a_dict/desde_dict give a JSON-friendly form (routes in key order) that is
+    stored as indice_rutas.json next to rutas_usadas.json; restoring it
+    rebuilds the key tree with buildFromSorted, without sorting.
+    """
+
+    def __init__(self, rutas_usadas=None):
+        self.avl = AVLTree()
+        rutas_usadas = rutas_usadas or {}
+        self.root = self.avl.buildFromSorted(sorted((clave_ruta(ruta), freq) for ruta, freq in rutas_usadas.items()))
+        self.frecuencias = IndiceFrecuencias(rutas_usadas)
+        self.version = 0 # Aumenta con cada cambio; permite cachear lo derivado del árbol (p. ej. su dibujo)
+
+    def __len__(self):
+        return len(self.frecuencias)
+
+    def copia(self):
+        """Independent copy (same routes and version) in O(n), for updating without touching this one."""
+        copia = IndiceRutas()
+        copia.root = copia.avl.buildFromSorted(self.avl.inorder(self.root))
+        copia.frecuencias = self.frecuencias.copia()
+        copia.version = self.version
+        return copia
+
+    def registrar(self, ruta, delta=1):
+        """Adds `delta` uses of `ruta` (the route string, "A → B → C")."""
+        self.fijar(ruta, self.frecuencias.frecuencia(ruta) + delta)
+
+    def fijar(self, ruta, freq):
+        self.version += 1
+        if freq > 0:
+            self.root = self.avl.insert(self.root, clave_ruta(ruta), freq)
+        else:
+            self.root = self.avl.delete(self.root, clave_ruta(ruta))
+        self.frecuencias.fijar(ruta, freq)
+
+    def sincronizar(self, rutas_usadas):
+        """
+        Brings the index to the frequencies of `rutas_usadas`, touching only
+        the routes that differ. Returns the number of routes changed.
+        """
+        actuales = self.frecuencias.frecuencias
+        cambios = [(ruta, freq) for ruta, freq in rutas_usadas.items() if actuales.get(ruta) != freq]
+        cambios.extend((ruta, 0) for ruta in actuales if ruta not in rutas_usadas)
+        for ruta, freq in cambios:
+            self.fijar(ruta, freq)
+        return len(cambios)
+
+    def top(self, k):
+        return self.frecuencias.top(k)
+
+    def a_dict(self):
+        return {"formato": FORMATO_INDICE_RUTAS, "rutas": [[ruta, freq] for (_, ruta), freq in self.avl.inorder(self.root)]}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        if not isinstance(datos, dict) or datos.get("formato") != FORMATO_INDICE_RUTAS:
+            raise ValueError("Formato de índice de rutas no soportado")
+        indice = cls()
+        rutas = datos["rutas"]
+        # Guardadas en orden de clave: el árbol se arma directamente en O(n)
+        indice.root = indice.avl.buildFromSorted((clave_ruta(ruta), freq) for ruta, freq in rutas)
+        indice.frecuencias = IndiceFrecuencias({ruta: freq for ruta, freq in rutas})
+        return indice
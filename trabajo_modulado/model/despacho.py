@@ -0,0 +1,145 @@
+import heapq
+
+# Prioridad 1 es la más urgente; a igual prioridad sale primero la orden más antigua
+PRIORIDAD_POR_DEFECTO = 3
+
+
+def clave_prioridad(orden):
+    """Dispatch order of a single order: (prioridad, fecha_creacion, número de orden)."""
+    orden_id = str(orden.get("id", ""))
+    numero = int(orden_id[1:]) if orden_id[1:].isdigit() else 0
+    return (orden.get("prioridad") or PRIORIDAD_POR_DEFECTO, orden.get("fecha_creacion") or "", numero)
+
+
+class PlanificadorDespacho:
+    """
+    Priority queue of pending orders for dispatch.
+
+    Orders come out by (prioridad, fecha_creacion, insertion order), so
+    priority 1 goes first and ties go to the oldest order. Besides the
+    global heap there is one heap per destination storage node, so a batch
+    of orders bound to the same storage can be taken without scanning.
+    Both heaps share their entries; removing an order only marks its entry
+    and dead entries are skipped when they reach the top (lazy deletion),
+    which keeps agregar, quitar and siguiente at O(log n) amortised.
+
+    Orders are identified by `clave` (the order id unless another key is
+    given, e.g. a list index).
+    """
+
+    _ORDEN, _CLAVE, _DESTINO = 3, 4, 5
+
+    def __init__(self):
+        self._heap = []
+        self._por_destino = {}
+        self._entradas = {}
+        self._secuencia = 0
+        self._muertas = 0
+
+    @classmethod
+    def desde_ordenes(cls, ordenes, estado="Pendiente"):
+        """Builds the queue from every order in `estado` with one O(n) heapify."""
+        planificador = cls()
+        for orden in ordenes:
+            if orden.get("status") == estado:
+                entrada = planificador._nueva_entrada(orden, orden["id"])
+                planificador._heap.append(entrada)
+                planificador._por_destino.setdefault(entrada[cls._DESTINO], []).append(entrada)
+        heapq.heapify(planificador._heap)
+        for heap in planificador._por_destino.values():
+            heapq.heapify(heap)
+        return planificador
+
+    def _nueva_entrada(self, orden, clave):
+        if clave in self._entradas:
+            raise ValueError(f"La orden '{clave}' ya está en la cola")
+        prioridad, fecha, _ = clave_prioridad(orden)
+        # [prioridad, fecha, secuencia, orden, clave, destino]; orden = None marca la entrada como eliminada
+        entrada = [prioridad, fecha, self._secuencia, orden, clave, orden["destino"]]
+        self._secuencia += 1
+        self._entradas[clave] = entrada
+        return entrada
+
+    def agregar(self, orden, clave=None):
+        entrada = self._nueva_entrada(orden, orden["id"] if clave is None else clave)
+        heapq.heappush(self._heap, entrada)
+        heapq.heappush(self._por_destino.setdefault(entrada[self._DESTINO], []), entrada)
+
+    def quitar(self, clave):
+        """Removes a queued order (e.g. cancelled). Returns False if it was not queued."""
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return False
+        self._matar(entrada)
+        return True
+
+    def _matar(self, entrada):
+        entrada[self._ORDEN] = None
+        self._muertas += 1
+        # Cada entrada viva está dos veces (global y por destino); compacta cuando dominan las muertas
+        if self._muertas > 64 and self._muertas > 2 * len(self._entradas):
+            self._compactar()
+
+    def _compactar(self):
+        self._heap = [e for e in self._heap if e[self._ORDEN] is not None]
+        heapq.heapify(self._heap)
+        for destino in list(self._por_destino):
+            heap = [e for e in self._por_destino[destino] if e[self._ORDEN] is not None]
+            if heap:
+                heapq.heapify(heap)
+                self._por_destino[destino] = heap
+            else:
+                del self._por_destino[destino]
+        self._muertas = 0
+
+    @staticmethod
+    def _tope(heap):
+        while heap and heap[0][PlanificadorDespacho._ORDEN] is None:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _tomar(self, entrada):
+        del self._entradas[entrada[self._CLAVE]]
+        orden = entrada[self._ORDEN]
+        self._matar(entrada)
+        return entrada[self._CLAVE], orden
+
+    def siguiente(self):
+        """Pops the most urgent order. Returns its clave (None if the queue is empty)."""
+        entrada = self._tope(self._heap)
+        if entrada is None:
+            return None
+        return self._tomar(entrada)[0]
+
+    def lote(self, maximo, destino=None):
+        """
+        Pops up to `maximo` orders bound to the same storage node, most urgent
+        first. Without `destino` the storage of the most urgent order overall
+        is used. Returns a list of (clave, orden).
+        """
+        if destino is None:
+            primera = self._tope(self._heap)
+            if primera is None:
+                return []
+            destino = primera[self._DESTINO]
+        tomadas = []
+        while len(tomadas) < maximo:
+            # Se vuelve a leer: _tomar puede compactar y reemplazar la lista
+            entrada = self._tope(self._por_destino.get(destino, []))
+            if entrada is None:
+                break
+            tomadas.append(self._tomar(entrada))
+        return tomadas
+
+    def pendientes_por_destino(self):
+        """destino -> number of queued orders."""
+        conteo = {}
+        for entrada in self._entradas.values():
+            conteo[entrada[self._DESTINO]] = conteo.get(entrada[self._DESTINO], 0) + 1
+        return conteo
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave):
+        return clave in self._entradas
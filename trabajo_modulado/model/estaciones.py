@@ -0,0 +1,247 @@
+import networkx as nx
+import numpy as np
+
+from .ruta import MAX_BATTERY
+
+LIMITE_FLOYD = 1500 # Hasta este número de nodos la matriz se calcula con Floyd-Warshall vectorizado
+BLOQUE_PARES = 2048 # Pares de demanda evaluados a la vez (acota la memoria de las matrices pares x candidatos)
+
+
+def demanda_desde_rutas(rutas_usadas):
+    """(origen, destino) -> trips, from the rutas_usadas map ("A → B → C" -> frequency)."""
+    demanda = {}
+    for ruta_str, frecuencia in rutas_usadas.items():
+        nodos = ruta_str.split(" → ")
+        if len(nodos) > 1:
+            par = (nodos[0], nodos[-1])
+            demanda[par] = demanda.get(par, 0) + frecuencia
+    return demanda
+
+
+def demanda_desde_ordenes(ordenes):
+    """(origen, destino) -> number of orders."""
+    demanda = {}
+    for orden in ordenes:
+        par = (orden["origen"], orden["destino"])
+        demanda[par] = demanda.get(par, 0) + 1
+    return demanda
+
+
+def matriz_distancias(G, nodos):
+    """
+    Shortest-path costs between `nodos` (len(nodos) x len(nodos), inf if unreachable).
+
+    Small graphs use a numpy Floyd-Warshall over the whole graph (one
+    vectorised min-plus update per pivot); larger ones run Dijkstra only from
+    the requested nodes.
+    """
+    indice = {nodo: i for i, nodo in enumerate(nodos)}
+    if G.number_of_nodes() <= LIMITE_FLOYD:
+        todos = list(G.nodes)
+        posicion = {nodo: i for i, nodo in enumerate(todos)}
+        D = np.full((len(todos), len(todos)), np.inf)
+        np.fill_diagonal(D, 0.0)
+        for u, v, datos in G.edges(data=True):
+            w = min(D[posicion[u], posicion[v]], datos['weight'])
+            D[posicion[u], posicion[v]] = D[posicion[v], posicion[u]] = w
+        for k in range(len(todos)):
+            np.minimum(D, D[:, k, None] + D[None, k, :], out=D)
+        filas = [posicion[nodo] for nodo in nodos]
+        return D[np.ix_(filas, filas)]
+
+    D = np.full((len(nodos), len(nodos)), np.inf)
+    for nodo in nodos:
+        distancias = nx.single_source_dijkstra_path_length(G, nodo, weight='weight')
+        fila = D[indice[nodo]]
+        for destino, d in distancias.items():
+            j = indice.get(destino)
+            if j is not None:
+                fila[j] = d
+    return D
+
+
+def _mejora(objetivo, actual):
+    """Lexicographic improvement with a relative tolerance (candidate sums are accumulated in float32)."""
+    tolerancia = 1e-5 * max(1.0, actual[1])
+    if objetivo[0] < actual[0] - 0.5:
+        return True
+    return objetivo[0] <= actual[0] + 0.5 and objetivo[1] < actual[1] - tolerancia
+
+
+class OptimizadorEstaciones:
+    """
+    Chooses where to place k recharge stations for a given demand.
+
+    A drone leaves its origin fully charged and can fly any shortest path of
+    length <= max_bateria between two charging points (origin, station,
+    destination), as in dijkstra_with_battery. With a station set R the cost
+    of a pair is the cheapest chain o -> r1 -> ... -> rj -> d of such hops,
+    and the objective is lexicographic: first the demand that has no
+    feasible chain, then the total cost of the feasible demand.
+    Stations are only added while they improve it, so fewer than k may be
+    returned.
+
+    Everything runs on a distance matrix over the relevant nodes (demand
+    endpoints and candidates), compiled once. Adding one station c can only
+    improve a pair through c, so the gain of every candidate is evaluated at
+    once with two vectorised min-plus products (pairs -> c and c -> pairs).
+    The greedy selection is then refined with swap local search.
+    """
+
+    def __init__(self, G, demanda, max_bateria=None, candidatos=None):
+        self.max_bateria = MAX_BATTERY if max_bateria is None else max_bateria
+        demanda = {par: peso for par, peso in demanda.items() if par[0] in G and par[1] in G and peso > 0}
+        if candidatos is None:
+            # Por defecto cualquier nodo que no sea de almacenamiento puede recibir una estación
+            candidatos = [n for n, d in G.nodes(data=True) if d.get('role') != 'storage']
+        self.candidatos = list(dict.fromkeys(candidatos))
+
+        nodos = list(dict.fromkeys([o for o, _ in demanda] + [d for _, d in demanda] + self.candidatos))
+        self.nodos = nodos
+        self.indice = {nodo: i for i, nodo in enumerate(nodos)}
+        D = matriz_distancias(G, nodos)
+        # Solo sirven los saltos que caben en una carga; float32 basta para pesos enteros y reduce a la mitad el tráfico de memoria
+        self.saltos = np.where(D <= self.max_bateria, D, np.inf).astype(np.float32)
+
+        self.pares = list(demanda)
+        self.origenes = np.array([self.indice[o] for o, _ in self.pares], dtype=np.int64)
+        self.destinos = np.array([self.indice[d] for _, d in self.pares], dtype=np.int64)
+        self.pesos = np.array([demanda[par] for par in self.pares], dtype=np.float64)
+        self._pesos32 = self.pesos.astype(np.float32)
+        self.idx_candidatos = np.array([self.indice[c] for c in self.candidatos], dtype=np.int64)
+        # El alcance hasta una estación solo depende del extremo (grafo no dirigido), no del par:
+        # se calcula una vez por nodo distinto y cada par lo lee por índice
+        self.extremos, inverso = np.unique(np.concatenate([self.origenes, self.destinos]), return_inverse=True)
+        self._inv_origen = inverso[:len(self.pares)]
+        self._inv_destino = inverso[len(self.pares):]
+
+    # --- Estado para un conjunto de estaciones ---
+    def _cierre(self, estaciones):
+        """Cheapest station-to-station chains (Floyd-Warshall over the stations only)."""
+        C = self.saltos[np.ix_(estaciones, estaciones)].copy()
+        for k in range(len(estaciones)):
+            np.minimum(C, C[:, k, None] + C[None, k, :], out=C)
+        return C
+
+    def _estado(self, estaciones):
+        """
+        For the station set (node indices): best cost per pair and best cost
+        from each demand endpoint to each station (alcance).
+        """
+        costo = self.saltos[self.origenes, self.destinos]
+        if not estaciones:
+            return costo, np.empty((len(self.extremos), 0), np.float32)
+        alcance = self._minplus(self.saltos[np.ix_(self.extremos, estaciones)], self._cierre(estaciones))
+        # Una cadena o -> ... -> d con estaciones pasa por alguna estación r: o -> r y r -> d
+        for inicio in range(0, len(self.pares), BLOQUE_PARES):
+            fin = inicio + BLOQUE_PARES
+            via = alcance[self._inv_origen[inicio:fin]] + alcance[self._inv_destino[inicio:fin]]
+            np.minimum(costo[inicio:fin], via.min(axis=1), out=costo[inicio:fin])
+        return costo, alcance
+
+    @staticmethod
+    def _minplus(A, B):
+        """(A ⊗ B)[i, j] = min_k A[i, k] + B[k, j], one k at a time to keep memory at A's size."""
+        resultado = np.full((A.shape[0], B.shape[1]), np.inf, dtype=np.float32)
+        for k in range(A.shape[1]):
+            np.minimum(resultado, A[:, k, None] + B[None, k, :], out=resultado)
+        return resultado
+
+    def _objetivo(self, costo):
+        factible = np.isfinite(costo)
+        return (float(self.pesos[~factible].sum()), float((self.pesos[factible] * costo[factible].astype(np.float64)).sum()))
+
+    def evaluar(self, estaciones):
+        """Metrics for a list of station node ids."""
+        idx = [self.indice[e] for e in estaciones if e in self.indice]
+        costo, _ = self._estado(idx)
+        return self._metricas(costo)
+
+    def _metricas(self, costo):
+        no_factible, total = self._objetivo(costo)
+        factible_peso = float(self.pesos.sum()) - no_factible
+        return {
+            "demanda_total": float(self.pesos.sum()),
+            "demanda_no_factible": no_factible,
+            "pares_no_factibles": int((~np.isfinite(costo)).sum()),
+            "costo_promedio": total / factible_peso if factible_peso else 0.0,
+            "costo_total": total,
+        }
+
+    # --- Búsqueda ---
+    def _mejor_candidato(self, estaciones, columnas):
+        """
+        Evaluates adding each candidate in `columnas` (node indices) to
+        `estaciones`. Returns (objective, candidate index).
+        """
+        if len(columnas) == 0:
+            return None, None
+        costo, alcance = self._estado(estaciones)
+        # Mejor llegada de cada extremo a cada candidato c: directo o pasando por estaciones actuales
+        hasta_c = self.saltos[np.ix_(self.extremos, columnas)]
+        if estaciones:
+            np.minimum(hasta_c, self._minplus(alcance, self.saltos[np.ix_(estaciones, columnas)]), out=hasta_c)
+        no_factible = np.zeros(len(columnas))
+        total = np.zeros(len(columnas))
+        for inicio in range(0, len(self.pares), BLOQUE_PARES):
+            fin = inicio + BLOQUE_PARES
+            nuevo = hasta_c[self._inv_origen[inicio:fin]]
+            nuevo += hasta_c[self._inv_destino[inicio:fin]]
+            np.minimum(nuevo, costo[inicio:fin, None], out=nuevo)
+            infactible = np.isinf(nuevo)
+            nuevo[infactible] = 0.0
+            # Las sumas ponderadas por candidato son productos matriz-vector
+            pesos = self._pesos32[inicio:fin]
+            no_factible += pesos @ infactible
+            total += pesos @ nuevo
+        # Orden lexicográfico: primero demanda no factible, después costo total
+        mejor = np.lexsort((total, no_factible))[0]
+        return (float(no_factible[mejor]), float(total[mejor])), int(columnas[mejor])
+
+    def _libres(self, estaciones, cerca_de=None):
+        usados = set(estaciones)
+        columnas = self.idx_candidatos
+        if cerca_de is not None:
+            columnas = columnas[np.isfinite(self.saltos[cerca_de, columnas])]
+        return np.array([c for c in columnas if c not in usados and c != cerca_de], dtype=np.int64)
+
+    def optimizar(self, k, iteraciones_intercambio=20):
+        """
+        Greedy selection of up to k stations followed by swap local search.
+        The greedy phase stops early when no candidate improves the objective.
+
+        Returns:
+            dict: estaciones (node ids), metricas, historial (objective after each greedy step
+            and accepted swap).
+        """
+        k = min(k, len(self.idx_candidatos))
+        estaciones = []
+        historial = []
+        actual = self._objetivo(self._estado(estaciones)[0])
+        for _ in range(k):
+            objetivo, candidato = self._mejor_candidato(estaciones, self._libres(estaciones))
+            # Una estación que no mejora ninguna ruta no vale su coste: se deja de agregar
+            if candidato is None or not _mejora(objetivo, actual):
+                break
+            actual = objetivo
+            estaciones.append(candidato)
+            historial.append({"paso": "agregar", "estacion": self.nodos[candidato],
+                              "demanda_no_factible": objetivo[0], "costo_total": objetivo[1]})
+
+        for _ in range(iteraciones_intercambio):
+            mejora = None
+            for posicion, saliente in enumerate(estaciones):
+                resto = estaciones[:posicion] + estaciones[posicion + 1:]
+                # Solo se prueba mover la estación a un nodo a un salto de batería de donde está
+                objetivo, candidato = self._mejor_candidato(resto, self._libres(estaciones, cerca_de=saliente))
+                if candidato is not None and _mejora(objetivo, actual) and (mejora is None or objetivo < mejora[0]):
+                    mejora = (objetivo, posicion, candidato)
+            if mejora is None:
+                break
+            actual, posicion, candidato = mejora
+            historial.append({"paso": "intercambiar", "sale": self.nodos[estaciones[posicion]],
+                              "entra": self.nodos[candidato], "demanda_no_factible": actual[0], "costo_total": actual[1]})
+            estaciones[posicion] = candidato
+
+        ids = [self.nodos[e] for e in estaciones]
+        return {"estaciones": ids, "metricas": self.evaluar(ids), "historial": historial}
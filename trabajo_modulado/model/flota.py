@@ -0,0 +1,263 @@
+import heapq
+from collections import deque
+from datetime import datetime, timedelta
+
+from .ruta import nodos_recarga
+from .despacho import PlanificadorDespacho
+
+MINUTOS_POR_UNIDAD = 1.0 # Minutos de vuelo por unidad de peso de arista
+MINUTOS_CARGA_POR_UNIDAD = 0.5 # Minutos de carga por unidad de batería consumida
+CARGADORES_POR_ESTACION = 2 # Drones que una estación de recarga puede cargar a la vez
+MINUTOS_PREPARACION = 2.0 # Carga del paquete antes de despegar
+
+# Tipos de evento. Los eventos son (t, tipo, secuencia, dato): el orden numérico
+# del tipo desempata eventos simultáneos (primero se liberan recursos y después
+# se asignan) y la secuencia mantiene el orden de llegada dentro de un mismo tipo.
+_FIN_CARGA = 0
+_LLEGADA = 1
+_LIBRE = 2
+_ORDEN = 3
+
+_FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+class SimuladorFlota:
+    """
+    Discrete-event simulation of a drone fleet serving orders along their
+    battery-feasible routes (encontrar_ruta_con_bateria).
+
+    Each mission flies the order's route from its origin to its destination.
+    Time only advances between events kept in a heap: order release, arrival
+    at a recharge node or at the destination, end of a charge, and a drone
+    becoming free. Consecutive hops without a recharge node are a single
+    flight, so the number of events depends on the recharge stops, not on the
+    route length. Battery follows the same model as the router: whatever was
+    consumed since the last charge is recharged at every recharge node on the
+    route (at most `cargadores` drones at a time per station, the rest wait in
+    FIFO order) and at the destination storage node, which has no limit.
+
+    Drones are interchangeable and start each mission at the order's origin:
+    pickup and repositioning flights are not modelled.
+    """
+
+    def __init__(self, G, n_drones, minutos_por_unidad=MINUTOS_POR_UNIDAD,
+                 minutos_carga_por_unidad=MINUTOS_CARGA_POR_UNIDAD, cargadores=CARGADORES_POR_ESTACION,
+                 minutos_preparacion=MINUTOS_PREPARACION):
+        if n_drones < 1:
+            raise ValueError("Se necesita al menos un dron")
+        self.G = G
+        self.n_drones = n_drones
+        self.minutos_por_unidad = minutos_por_unidad
+        self.minutos_carga_por_unidad = minutos_carga_por_unidad
+        self.cargadores = cargadores
+        self.minutos_preparacion = minutos_preparacion
+        self.recargas = nodos_recarga(G)
+        self._tramos = {}
+
+    def tramos(self, ruta):
+        """
+        Splits a route into flights that end at a recharge node or at the
+        destination: [(nodo, minutos_de_vuelo, bateria_consumida), ...].
+        Cached per route.
+        """
+        clave = tuple(ruta)
+        tramos = self._tramos.get(clave)
+        if tramos is None:
+            tramos = []
+            consumo = 0
+            for i in range(1, len(ruta)):
+                consumo += self.G.edges[ruta[i - 1], ruta[i]]['weight']
+                if ruta[i] in self.recargas or i == len(ruta) - 1:
+                    tramos.append((ruta[i], consumo * self.minutos_por_unidad, consumo))
+                    consumo = 0
+            self._tramos[clave] = tramos
+        return tramos
+
+    def simular(self, ordenes, rutas_por_par, inicio=None, cola=None):
+        """
+        Runs the simulation until every routable order is delivered. Delivered
+        orders get status "Delivered" and `fecha_entrega`; orders without a
+        route in rutas_por_par ((origen, destino) -> (path, cost)) are left
+        untouched.
+
+        Args:
+            inicio: datetime of minute 0; defaults to the earliest fecha_creacion.
+                Each order is released at its fecha_creacion.
+            cola: pending-order queue with agregar(orden, clave), siguiente()
+                and __len__, e.g. despacho.PlanificadorDespacho for priority
+                dispatch; defaults to FIFO by release time.
+
+        Returns:
+            dict: summary metrics (times in minutes).
+        """
+        fechas = {}
+        creaciones = []
+        for orden in ordenes:
+            texto = orden["fecha_creacion"]
+            if texto not in fechas:
+                fechas[texto] = datetime.strptime(texto, _FORMATO_FECHA)
+            creaciones.append(fechas[texto])
+        if inicio is None:
+            inicio = min(creaciones) if creaciones else datetime.now()
+
+        eventos = []
+        secuencia = 0
+        sin_ruta = 0
+        tramos_orden = [None] * len(ordenes)
+        liberacion = [0.0] * len(ordenes)
+        for i, orden in enumerate(ordenes):
+            ruta, _ = rutas_por_par.get((orden["origen"], orden["destino"]), (None, None))
+            if not ruta or len(ruta) < 2:
+                sin_ruta += 1
+                continue
+            tramos_orden[i] = self.tramos(ruta)
+            liberacion[i] = max(0.0, (creaciones[i] - inicio).total_seconds() / 60)
+            eventos.append((liberacion[i], _ORDEN, secuencia, i))
+            secuencia += 1
+        heapq.heapify(eventos)
+
+        pendientes = cola if cola is not None else _ColaFIFO()
+        libres = list(range(self.n_drones))
+        # Estado de cada dron en listas paralelas: orden en curso y próximo tramo
+        orden_dron = [None] * self.n_drones
+        tramo_dron = [0] * self.n_drones
+        salida_dron = [0.0] * self.n_drones
+        ocupacion = {} # estación -> cargadores en uso
+        espera = {} # estación -> deque de (dron, consumo, llegada)
+        cola_maxima = {}
+
+        entregadas = 0
+        espera_despacho = 0.0
+        espera_despacho_max = 0.0
+        espera_prioridad = {}
+        despachadas_prioridad = {}
+        espera_estaciones = 0.0
+        cargas_estacion = 0
+        tiempo_ocupado = 0.0
+        fin = 0.0
+        fin_ocupacion = 0.0
+        n_eventos = 0
+
+        def despachar(t):
+            nonlocal secuencia, espera_despacho, espera_despacho_max
+            while libres and len(pendientes):
+                i = pendientes.siguiente()
+                dron = libres.pop()
+                orden_dron[dron] = i
+                tramo_dron[dron] = 0
+                salida_dron[dron] = t
+                demora = t - liberacion[i]
+                espera_despacho += demora
+                prioridad = ordenes[i].get("prioridad")
+                espera_prioridad[prioridad] = espera_prioridad.get(prioridad, 0.0) + demora
+                despachadas_prioridad[prioridad] = despachadas_prioridad.get(prioridad, 0) + 1
+                if demora > espera_despacho_max:
+                    espera_despacho_max = demora
+                heapq.heappush(eventos, (t + self.minutos_preparacion + tramos_orden[i][0][1], _LLEGADA, secuencia, dron))
+                secuencia += 1
+
+        def iniciar_carga(t, dron, estacion, consumo):
+            nonlocal secuencia
+            ocupacion[estacion] = ocupacion.get(estacion, 0) + 1
+            heapq.heappush(eventos, (t + consumo * self.minutos_carga_por_unidad, _FIN_CARGA, secuencia, dron))
+            secuencia += 1
+
+        while eventos:
+            t, tipo, _, dato = heapq.heappop(eventos)
+            n_eventos += 1
+
+            if tipo == _ORDEN:
+                pendientes.agregar(ordenes[dato], dato)
+                despachar(t)
+
+            elif tipo == _LLEGADA:
+                dron = dato
+                i = orden_dron[dron]
+                tramos = tramos_orden[i]
+                nodo, _, consumo = tramos[tramo_dron[dron]]
+                if tramo_dron[dron] == len(tramos) - 1:
+                    orden = ordenes[i]
+                    orden["status"] = "Delivered"
+                    orden["fecha_entrega"] = (inicio + timedelta(minutes=t)).strftime(_FORMATO_FECHA)
+                    entregadas += 1
+                    fin = max(fin, t)
+                    # Carga en el almacenamiento de destino antes de volver a estar disponible
+                    libre_en = t + consumo * self.minutos_carga_por_unidad
+                    tiempo_ocupado += libre_en - salida_dron[dron]
+                    fin_ocupacion = max(fin_ocupacion, libre_en)
+                    heapq.heappush(eventos, (libre_en, _LIBRE, secuencia, dron))
+                    secuencia += 1
+                elif ocupacion.get(nodo, 0) < self.cargadores:
+                    cargas_estacion += 1
+                    iniciar_carga(t, dron, nodo, consumo)
+                else:
+                    cola_estacion = espera.setdefault(nodo, deque())
+                    cola_estacion.append((dron, consumo, t))
+                    if len(cola_estacion) > cola_maxima.get(nodo, 0):
+                        cola_maxima[nodo] = len(cola_estacion)
+
+            elif tipo == _FIN_CARGA:
+                dron = dato
+                tramos = tramos_orden[orden_dron[dron]]
+                estacion = tramos[tramo_dron[dron]][0]
+                ocupacion[estacion] -= 1
+                cola_estacion = espera.get(estacion)
+                if cola_estacion:
+                    siguiente, consumo, llegada = cola_estacion.popleft()
+                    espera_estaciones += t - llegada
+                    cargas_estacion += 1
+                    iniciar_carga(t, siguiente, estacion, consumo)
+                tramo_dron[dron] += 1
+                heapq.heappush(eventos, (t + tramos[tramo_dron[dron]][1], _LLEGADA, secuencia, dron))
+                secuencia += 1
+
+            else:  # _LIBRE
+                orden_dron[dato] = None
+                libres.append(dato)
+                despachar(t)
+
+        return {
+            "drones": self.n_drones,
+            "ordenes_entregadas": entregadas,
+            "ordenes_sin_ruta": sin_ruta,
+            "eventos": n_eventos,
+            "minutos_totales": fin,
+            "espera_despacho_promedio": espera_despacho / entregadas if entregadas else 0.0,
+            "espera_despacho_maxima": espera_despacho_max,
+            "espera_despacho_por_prioridad": {p: espera_prioridad[p] / despachadas_prioridad[p]
+                                              for p in sorted(espera_prioridad, key=str)},
+            "cargas_en_estaciones": cargas_estacion,
+            "espera_estaciones_promedio": espera_estaciones / cargas_estacion if cargas_estacion else 0.0,
+            "estaciones_con_cola": len(cola_maxima),
+            "cola_estacion_maxima": max(cola_maxima.values(), default=0),
+            "utilizacion_flota": tiempo_ocupado / (self.n_drones * fin_ocupacion) if fin_ocupacion else 0.0,
+            "inicio": inicio.strftime(_FORMATO_FECHA),
+        }
+
+
+class _ColaFIFO:
+    def __init__(self):
+        self._cola = deque()
+
+    def agregar(self, orden, clave):
+        self._cola.append(clave)
+
+    def siguiente(self):
+        return self._cola.popleft()
+
+    def __len__(self):
+        return len(self._cola)
+
+
+def simular_flota(G, ordenes, n_drones, rutas_por_par=None, prioridad=True, **parametros):
+    """
+    Convenience wrapper: routes the orders (if rutas_por_par is not given) and
+    runs SimuladorFlota over them, dispatching by priority unless
+    prioridad=False. Returns the summary dict.
+    """
+    if rutas_por_par is None:
+        from .ruta_paralela import EnrutadorParalelo
+        with EnrutadorParalelo(G, 1) as enrutador:
+            rutas_por_par = enrutador.enrutar([(o["origen"], o["destino"]) for o in ordenes])
+    cola = PlanificadorDespacho() if prioridad else None
+    return SimuladorFlota(G, n_drones, **parametros).simular(ordenes, rutas_por_par, cola=cola)
@@ -1,6 +1,11 @@
 import networkx as nx
 import numpy as np
 
+from .indice_espacial import IndiceEspacial, haversine_km
+
+VECINOS_POR_DEFECTO = 4
+PESO_POR_KM = 5 # Unidades de batería por km volado; con MAX_BATTERY = 50 el alcance es de 10 km
+
 def generar_aristas_aleatorias(nodos, m):
     G = nx.Graph()
     for nodo in nodos:
@@ -14,6 +19,59 @@ def generar_aristas_aleatorias(nodos, m):
             G.add_edge(n1, n2, weight=np.random.randint(1,10))
     return G
 
+def generar_aristas_geograficas(nodos, k=VECINOS_POR_DEFECTO, peso_por_km=PESO_POR_KM):
+    """
+    Connects every node to its k nearest neighbours by great-circle distance
+    (IndiceEspacial.k_vecinos_todos) with integer weights proportional to
+    the distance: max(1, round(km * peso_por_km)). Components left apart by
+    the kNN graph are then joined by their shortest link, so the result is
+    connected.
+    """
+    G = nx.Graph()
+    for nodo in nodos:
+        G.add_node(nodo["id"], role=nodo["role"])
+    if len(nodos) < 2:
+        return G
+
+    indice = IndiceEspacial(nodos)
+    vecinos, distancias = indice.k_vecinos_todos(k)
+    n = len(nodos)
+    origen = np.repeat(np.arange(n), vecinos.shape[1])
+    destino = vecinos.ravel()
+    km = distancias.ravel()
+    validas = destino >= 0
+    origen, destino, km = origen[validas], destino[validas], km[validas]
+    # Cada arista una sola vez: (a, b) con a < b; si ambos nodos se eligen, aparece dos veces con la misma distancia
+    a, b = np.minimum(origen, destino), np.maximum(origen, destino)
+    _, unicas = np.unique(a * n + b, return_index=True)
+    unicas.sort()
+    pesos = np.maximum(1, np.rint(km[unicas] * peso_por_km)).astype(np.int64)
+    ids = indice.ids
+    G.add_edges_from((ids[i], ids[j], {"weight": int(w)}) for i, j, w in zip(a[unicas], b[unicas], pesos))
+
+    _conectar_componentes(G, indice, peso_por_km)
+    return G
+
+def _conectar_componentes(G, indice, peso_por_km):
+    """Joins each component except the largest to its nearest node outside it, until G is connected."""
+    posicion = {nodo_id: i for i, nodo_id in enumerate(indice.ids)}
+    while True:
+        componentes = sorted(nx.connected_components(G), key=len)
+        if len(componentes) < 2:
+            return
+        etiqueta = np.empty(len(indice.ids), dtype=np.int64)
+        for c, componente in enumerate(componentes):
+            etiqueta[[posicion[nodo] for nodo in componente]] = c
+        for c, componente in enumerate(componentes[:-1]):
+            miembros = np.array([posicion[nodo] for nodo in componente])
+            afuera = np.flatnonzero(etiqueta != c)
+            d = haversine_km(indice.lat[miembros, None], indice.lon[miembros, None],
+                             indice.lat[None, afuera], indice.lon[None, afuera])
+            i, j = np.unravel_index(np.argmin(d), d.shape)
+            G.add_edge(indice.ids[miembros[i]], indice.ids[afuera[j]], weight=int(max(1, round(d[i, j] * peso_por_km))))
+            # Lo que se unió en esta ronda se trata como un solo componente
+            etiqueta[etiqueta == c] = etiqueta[afuera[j]]
+
 def kruskal_mst(G):
     """
     Calculates the Minimum Spanning Tree (MST) using Kruskal's algorithm.
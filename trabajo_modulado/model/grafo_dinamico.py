@@ -0,0 +1,398 @@
+from collections import deque
+import heapq
+
+import networkx as nx
+import numpy as np
+
+from .grafo import kruskal_mst
+from .ruta import MAX_BATTERY, encontrar_rutas_lote, ESTADISTICAS_BUSQUEDA
+
+HISTORIAL_MAXIMO = 200 # Cambios recientes que se conservan en el grafo (y en grafo.json)
+_TOLERANCIA = 1e-9
+
+
+def clave_arista(u, v):
+    """Undirected edge key: the two endpoints in a fixed order."""
+    return (u, v) if u <= v else (v, u)
+
+
+class DistanciasDinamicas:
+    """
+    All-pairs shortest paths (distance and predecessor matrices) kept up to
+    date under single-edge changes instead of re-running Floyd-Warshall:
+
+    - cheaper edge u-v: every pair can only improve through the edge, so
+      D = min(D, D[:, u] + w + D[v, :], D[:, v] + w + D[u, :]) in O(n^2).
+    - more expensive or closed edge: only sources whose shortest-path tree
+      uses the edge are affected, and in each of them only the subtree
+      below the edge. Its nodes are re-settled with a Dijkstra seeded from
+      their neighbours outside the subtree, whose distances did not change.
+    """
+
+    def __init__(self, G):
+        self.nodos = list(G.nodes)
+        self.indice = {nodo: i for i, nodo in enumerate(self.nodos)}
+        n = len(self.nodos)
+        D = np.full((n, n), np.inf)
+        P = np.full((n, n), -1, dtype=np.int64) # P[i, j]: nodo anterior a j en el camino desde i
+        np.fill_diagonal(D, 0.0)
+        for u, v, datos in G.edges(data=True):
+            i, j = self.indice[u], self.indice[v]
+            D[i, j] = D[j, i] = datos['weight']
+            P[i, j], P[j, i] = i, j
+        for k in range(n):
+            via = D[:, k, None] + D[None, k, :]
+            mejor = via < D
+            D = np.where(mejor, via, D)
+            P = np.where(mejor, P[k][None, :], P)
+        self.D = D
+        self.P = P
+
+    def distancia(self, origen, destino):
+        return float(self.D[self.indice[origen], self.indice[destino]])
+
+    def camino(self, origen, destino):
+        """Shortest path as a list of node ids, or None if unreachable."""
+        i, j = self.indice[origen], self.indice[destino]
+        if not np.isfinite(self.D[i, j]):
+            return None
+        camino = [j]
+        while camino[-1] != i:
+            camino.append(int(self.P[i, camino[-1]]))
+        return [self.nodos[k] for k in reversed(camino)]
+
+    def disminuir(self, u, v, peso):
+        """Edge u-v is now cheaper (or was reopened) with weight `peso`. Returns the number of improved pairs."""
+        a, b = self.indice[u], self.indice[v]
+        D, P = self.D, self.P
+        via_ab = D[:, a, None] + peso + D[None, b, :]
+        via_ba = D[:, b, None] + peso + D[None, a, :]
+        mejor_ab = (via_ab < D - _TOLERANCIA) & (via_ab <= via_ba)
+        mejor_ba = (via_ba < D - _TOLERANCIA) & ~mejor_ab
+        # El tramo final de i -> a -> b -> j es el camino de b a j; para j = b el anterior es a
+        fila_b, fila_a = P[b].copy(), P[a].copy()
+        fila_b[b], fila_a[a] = a, b
+        self.D = np.where(mejor_ab, via_ab, np.where(mejor_ba, via_ba, D))
+        self.P = np.where(mejor_ab, fila_b[None, :], np.where(mejor_ba, fila_a[None, :], P))
+        return int(mejor_ab.sum() + mejor_ba.sum())
+
+    def aumentar(self, G, u, v):
+        """
+        Edge u-v got more expensive or was closed; G already reflects the
+        change. Returns the number of repaired rows.
+        """
+        a, b = self.indice[u], self.indice[v]
+        # La fila i cambia solo si su árbol de caminos usa la arista; entonces cambia el subárbol bajo ella
+        filas = np.flatnonzero((self.P[:, b] == a) | (self.P[:, a] == b))
+        for i in filas:
+            raiz = b if self.P[i, b] == a else a
+            self._reparar_subarbol(G, i, raiz)
+        return len(filas)
+
+    def _reparar_subarbol(self, G, i, raiz):
+        D, P = self.D[i], self.P[i]
+        # Pertenencia al subárbol de `raiz` por saltos dobles sobre los predecesores
+        ancestro = np.where(P < 0, i, P)
+        en_subarbol = np.zeros(len(P), dtype=bool)
+        en_subarbol[raiz] = True
+        while True:
+            en_subarbol |= en_subarbol[ancestro]
+            siguiente = ancestro[ancestro]
+            if np.array_equal(siguiente, ancestro):
+                break
+            ancestro = siguiente
+        subarbol = np.flatnonzero(en_subarbol)
+        D[subarbol] = np.inf
+        P[subarbol] = -1
+
+        # Dijkstra dentro del subárbol, sembrado desde los vecinos de afuera (sus distancias siguen siendo exactas)
+        heap = []
+        for t in subarbol:
+            nodo = self.nodos[t]
+            for vecino, datos in G.adj[nodo].items():
+                x = self.indice[vecino]
+                if not en_subarbol[x] and D[x] + datos['weight'] < D[t]:
+                    D[t] = D[x] + datos['weight']
+                    P[t] = x
+            if np.isfinite(D[t]):
+                heap.append((D[t], t))
+        heapq.heapify(heap)
+        while heap:
+            d, t = heapq.heappop(heap)
+            if d > D[t]:
+                continue
+            for vecino, datos in G.adj[self.nodos[t]].items():
+                x = self.indice[vecino]
+                if en_subarbol[x] and d + datos['weight'] < D[x]:
+                    D[x] = d + datos['weight']
+                    P[x] = t
+                    heapq.heappush(heap, (D[x], x))
+        # Grafo no dirigido: la columna de la fila reparada se copia por simetría
+        self.D[subarbol, i] = D[subarbol]
+
+
+class ArbolExpansionDinamico:
+    """
+    Minimum spanning tree (forest, if the graph is disconnected) repaired
+    locally after each edge change instead of re-running Kruskal:
+
+    - tree edge that got cheaper, or non-tree edge that got more expensive or
+      closed: the tree does not change.
+    - tree edge that got more expensive or closed: it is removed and the
+      cheapest edge across the resulting cut reconnects the two sides
+      (scanning only the smaller side).
+    - non-tree edge that got cheaper or reopened: it replaces the heaviest
+      edge on the tree path between its endpoints, if that one is heavier.
+    """
+
+    def __init__(self, G):
+        self.adyacencia = {nodo: {} for nodo in G.nodes}
+        for u, v in kruskal_mst(G):
+            self._agregar(u, v, G.edges[u, v]['weight'])
+
+    def _agregar(self, u, v, peso):
+        self.adyacencia[u][v] = peso
+        self.adyacencia[v][u] = peso
+
+    def _quitar(self, u, v):
+        del self.adyacencia[u][v]
+        del self.adyacencia[v][u]
+
+    def aristas(self):
+        return [(u, v, peso) for u, vecinos in self.adyacencia.items() for v, peso in vecinos.items() if u <= v]
+
+    def peso_total(self):
+        return sum(peso for _, _, peso in self.aristas())
+
+    def _componente(self, inicio, limite):
+        """Tree nodes reachable from `inicio`, stopping once more than `limite` are found."""
+        vistos = {inicio}
+        cola = deque([inicio])
+        while cola and len(vistos) <= limite:
+            for vecino in self.adyacencia[cola.popleft()]:
+                if vecino not in vistos:
+                    vistos.add(vecino)
+                    cola.append(vecino)
+        return vistos, not cola
+
+    def _camino(self, u, v):
+        padres = {u: None}
+        cola = deque([u])
+        while cola:
+            actual = cola.popleft()
+            if actual == v:
+                camino = []
+                while padres[actual] is not None:
+                    camino.append((padres[actual], actual))
+                    actual = padres[actual]
+                return camino
+            for vecino in self.adyacencia[actual]:
+                if vecino not in padres:
+                    padres[vecino] = actual
+                    cola.append(vecino)
+        return None
+
+    def actualizar(self, G, u, v, peso_anterior, peso):
+        """
+        Applies the change of edge u-v from `peso_anterior` to `peso` (None =
+        closed; peso_anterior None = reopened). G already reflects the
+        change. Returns the number of tree edges swapped.
+        """
+        if v in self.adyacencia[u]:
+            if peso is not None and peso <= self.adyacencia[u][v]:
+                self._agregar(u, v, peso)
+                return 0
+            self._quitar(u, v)
+            # Se recorre el lado más chico del corte: los dos BFS avanzan hasta que uno se agota
+            limite = 1
+            while True:
+                lado_u, completo_u = self._componente(u, limite)
+                if completo_u:
+                    lado = lado_u
+                    break
+                lado_v, completo_v = self._componente(v, limite)
+                if completo_v:
+                    lado = lado_v
+                    break
+                limite *= 2
+            mejor = None
+            for x in lado:
+                for y, datos in G.adj[x].items():
+                    if y not in lado and (mejor is None or datos['weight'] < mejor[2]):
+                        mejor = (x, y, datos['weight'])
+            if mejor is not None:
+                self._agregar(*mejor)
+            return 0 if mejor is not None and clave_arista(mejor[0], mejor[1]) == clave_arista(u, v) else 1
+
+        if peso is None or (peso_anterior is not None and peso >= peso_anterior):
+            return 0
+        camino = self._camino(u, v)
+        if camino is None:
+            self._agregar(u, v, peso) # Une dos componentes del bosque
+            return 1
+        x, y = max(camino, key=lambda arista: self.adyacencia[arista[0]][arista[1]])
+        if self.adyacencia[x][y] <= peso:
+            return 0
+        self._quitar(x, y)
+        self._agregar(u, v, peso)
+        return 1
+
+
+class GrafoDinamico:
+    """
+    A graph whose edge weights change while it is being served (wind,
+    no-fly zones, congestion), with a version number and the data derived
+    from it kept consistent incrementally.
+
+    - Every batch of changes bumps G.graph["version"]; closed edges are
+      removed from G and remembered in G.graph["aristas_cerradas"] with their
+      last weight, and recent changes are logged in G.graph["cambios"], so
+      node_link_data(G) persists all of it in grafo.json.
+    - Battery routes (encontrar_rutas_lote) are cached per (origen, destino)
+      with an inverse index edge -> cached pairs. A more expensive or closed
+      edge invalidates only the routes that use it; a cheaper or reopened
+      edge invalidates the routes that use it and the pairs that had no
+      route. Routes that do not touch a cheaper edge are left cached: they
+      are still feasible with the same cost, although a fresh search could
+      now find another one.
+    - All-pairs shortest paths (DistanciasDinamicas) and the MST
+      (ArbolExpansionDinamico) are built on first use and then repaired per
+      change.
+    """
+
+    def __init__(self, G, max_bateria=None):
+        self.G = G
+        self.max_bateria = MAX_BATTERY if max_bateria is None else max_bateria
+        G.graph.setdefault("version", 0)
+        G.graph.setdefault("aristas_cerradas", [])
+        G.graph.setdefault("cambios", [])
+        self.cerradas = {clave_arista(u, v): peso for u, v, peso in G.graph["aristas_cerradas"]}
+        self._rutas = {} # (origen, destino) -> (camino, costo)
+        self._pares_por_arista = {}
+        self._sin_ruta = set()
+        self._distancias = None
+        self._mst = None
+
+    @property
+    def version(self):
+        return self.G.graph["version"]
+
+    # --- Rutas con batería ---
+    def rutas(self, pares):
+        """(origen, destino) -> (path, cost) for each pair, searching only the pairs not cached."""
+        pares = list(pares)
+        faltantes = {par for par in pares if par not in self._rutas}
+        ESTADISTICAS_BUSQUEDA["bfs_bateria"]["aciertos_cache"] += len(pares) - len(faltantes)
+        if faltantes:
+            for par, (camino, costo) in encontrar_rutas_lote(self.G, faltantes, self.max_bateria).items():
+                self._rutas[par] = (camino, costo)
+                if camino is None:
+                    self._sin_ruta.add(par)
+                    continue
+                for i in range(1, len(camino)):
+                    self._pares_por_arista.setdefault(clave_arista(camino[i - 1], camino[i]), set()).add(par)
+        return {par: self._rutas[par] for par in pares}
+
+    def ruta(self, origen, destino):
+        return self.rutas([(origen, destino)])[(origen, destino)]
+
+    def _invalidar(self, arista, sin_ruta):
+        invalidados = self._pares_por_arista.pop(arista, set())
+        for par in invalidados:
+            camino, _ = self._rutas.pop(par)
+            for i in range(1, len(camino)):
+                otra = clave_arista(camino[i - 1], camino[i])
+                if otra != arista:
+                    self._pares_por_arista[otra].discard(par)
+        if sin_ruta:
+            for par in self._sin_ruta:
+                del self._rutas[par]
+            invalidados |= self._sin_ruta
+            self._sin_ruta = set()
+        return invalidados
+
+    # --- Cambios ---
+    def distancias(self):
+        if self._distancias is None:
+            self._distancias = DistanciasDinamicas(self.G)
+        return self._distancias
+
+    def mst(self):
+        if self._mst is None:
+            self._mst = ArbolExpansionDinamico(self.G)
+        return self._mst
+
+    def actualizar(self, cambios):
+        """
+        Applies a batch of edge changes as one new graph version. Each change
+        is a dict with origen, destino and either peso (new weight; also
+        reopens a closed edge) or cerrada (True closes the edge, False
+        reopens it with its last weight unless peso is given).
+
+        The whole batch is validated before anything is applied; an invalid
+        change raises ValueError.
+
+        Returns:
+            dict: version, aplicados, pares_invalidados (set of pairs whose cached
+            route was dropped), filas_recalculadas (APSP rows rebuilt, if built)
+            and cambios_mst (tree edges swapped, if built).
+        """
+        cambios = list(cambios)
+        for i, cambio in enumerate(cambios):
+            u, v = cambio["origen"], cambio["destino"]
+            arista = clave_arista(u, v)
+            peso, cerrada = cambio.get("peso"), cambio.get("cerrada")
+            if peso is not None and peso <= 0:
+                raise ValueError(f"Cambio {i}: el peso debe ser positivo")
+            if not self.G.has_edge(u, v) and arista not in self.cerradas:
+                raise ValueError(f"Cambio {i}: la arista {u}-{v} no existe")
+            if peso is None and cerrada is None:
+                raise ValueError(f"Cambio {i}: se necesita peso o cerrada")
+            if cerrada and peso is not None:
+                raise ValueError(f"Cambio {i}: una arista cerrada no lleva peso")
+
+        resumen = {"version": self.version + 1, "aplicados": 0, "pares_invalidados": set(),
+                   "filas_recalculadas": 0, "cambios_mst": 0}
+        for cambio in cambios:
+            u, v = cambio["origen"], cambio["destino"]
+            arista = clave_arista(u, v)
+            abierta = self.G.has_edge(u, v)
+            peso_anterior = self.G.edges[u, v]['weight'] if abierta else None
+            if cambio.get("cerrada"):
+                if not abierta:
+                    continue
+                self.G.remove_edge(u, v)
+                self.cerradas[arista] = peso_anterior
+                peso = None
+            elif abierta:
+                peso = cambio.get("peso")
+                if peso is None or peso == peso_anterior: # Reabrir una arista abierta no cambia nada
+                    continue
+                self.G.edges[u, v]['weight'] = peso
+            else:
+                peso = cambio.get("peso") or self.cerradas[arista]
+                del self.cerradas[arista]
+                self.G.add_edge(u, v, weight=peso)
+
+            # Más barata (o reabierta): puede aparecer una ruta para pares que no tenían
+            mas_barata = peso is not None and (peso_anterior is None or peso < peso_anterior)
+            resumen["pares_invalidados"] |= self._invalidar(arista, sin_ruta=mas_barata)
+            if self._distancias is not None:
+                if mas_barata:
+                    self._distancias.disminuir(u, v, peso)
+                else:
+                    resumen["filas_recalculadas"] += self._distancias.aumentar(self.G, u, v)
+            if self._mst is not None:
+                resumen["cambios_mst"] += self._mst.actualizar(self.G, u, v, peso_anterior, peso)
+
+            self.G.graph["cambios"].append({"version": resumen["version"], "origen": u, "destino": v,
+                                            "peso_anterior": peso_anterior, "peso": peso})
+            resumen["aplicados"] += 1
+
+        if resumen["aplicados"]:
+            self.G.graph["version"] = resumen["version"]
+            del self.G.graph["cambios"][:-HISTORIAL_MAXIMO]
+            self.G.graph["aristas_cerradas"] = [[u, v, peso] for (u, v), peso in self.cerradas.items()]
+        else:
+            resumen["version"] = self.version
+        return resumen
@@ -0,0 +1,218 @@
+import math
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0088
+# La proyección local subestima la distancia real en menos de 1% a escala de ciudad;
+# el margen mantiene exactos los cortes de búsqueda
+_MARGEN = 0.99
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments in degrees, scalars or numpy arrays (broadcast)."""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class _Rejilla:
+    """Grid buckets (cell -> node positions) plus the same nodes sorted by x, for one subset of nodes."""
+
+    def __init__(self, posiciones, x, y, celda_km):
+        self.posiciones = posiciones
+        self.celda_km = celda_km
+        cx = np.floor(x[posiciones] / celda_km).astype(np.int64)
+        cy = np.floor(y[posiciones] / celda_km).astype(np.int64)
+        self.celdas = {}
+        orden = np.lexsort((cy, cx))
+        claves = np.stack([cx[orden], cy[orden]], axis=1)
+        if len(orden):
+            cortes = np.flatnonzero(np.any(np.diff(claves, axis=0) != 0, axis=1)) + 1
+            for grupo in np.split(orden, cortes):
+                self.celdas[(int(cx[grupo[0]]), int(cy[grupo[0]]))] = posiciones[grupo]
+            self.limites = (int(cx.min()), int(cx.max()), int(cy.min()), int(cy.max()))
+        # Franja ordenada por x para las consultas por radio
+        por_x = np.argsort(x[posiciones], kind="stable")
+        self.ordenadas = posiciones[por_x]
+        self.x_ordenadas = x[self.ordenadas]
+
+    def anillo(self, cx, cy, r):
+        """Node positions in the cells at Chebyshev distance exactly r from (cx, cy), clipped to the occupied area."""
+        x0, x1, y0, y1 = self.limites
+        desde_x, hasta_x = max(cx - r, x0), min(cx + r, x1)
+        desde_y, hasta_y = max(cy - r + 1, y0), min(cy + r - 1, y1)
+        celdas = []
+        for fila in {cy - r, cy + r}:
+            if y0 <= fila <= y1:
+                celdas.extend((columna, fila) for columna in range(desde_x, hasta_x + 1))
+        for columna in {cx - r, cx + r}:
+            if x0 <= columna <= x1:
+                celdas.extend((columna, fila) for fila in range(desde_y, hasta_y + 1))
+        encontradas = [self.celdas[c] for c in celdas if c in self.celdas]
+        return np.concatenate(encontradas) if encontradas else None
+
+    def anillos(self, cx, cy):
+        """First ring that reaches an occupied cell and the ring after which every one has been visited."""
+        x0, x1, y0, y1 = self.limites
+        return (max(x0 - cx, cx - x1, y0 - cy, cy - y1, 0), max(cx - x0, x1 - cx, cy - y0, y1 - cy, 0))
+
+
+class IndiceEspacial:
+    """
+    Spatial index over the nodes' lat/lon for nearest-node, k-nearest and
+    radius queries without scanning every node.
+
+    Coordinates are projected to a local plane in km (equirectangular around
+    the nodes' mean latitude) and bucketed in a square grid, one grid per
+    role plus one for all nodes. A k-nearest query visits rings of cells
+    around the point and stops when the k-th best distance is closer than
+    anything in the unvisited rings; a radius query takes the band of nodes
+    whose x is within the radius (binary search) and filters it by y.
+    Candidate distances are always exact (vectorised haversine), the planar
+    projection is only used to decide which nodes to look at.
+    """
+
+    def __init__(self, nodos, celda_km=None):
+        self.nodos = list(nodos)
+        self.ids = [n["id"] for n in self.nodos]
+        self.roles = np.array([n.get("role") for n in self.nodos], dtype=object)
+        self.lat = np.array([n["lat"] for n in self.nodos], dtype=np.float64)
+        self.lon = np.array([n["lon"] for n in self.nodos], dtype=np.float64)
+        self._cos = math.cos(math.radians(float(self.lat.mean()))) if len(self.nodos) else 1.0
+        self.x, self.y = self._proyectar(self.lat, self.lon)
+
+        if celda_km is None:
+            # Alrededor de un nodo por celda con la densidad media del área cubierta
+            ancho = float(np.ptp(self.x)) if len(self.nodos) else 0.0
+            alto = float(np.ptp(self.y)) if len(self.nodos) else 0.0
+            n = max(len(self.nodos), 1)
+            celda_km = max(math.sqrt(ancho * alto / n), max(ancho, alto) / n)
+        self.celda_km = max(celda_km, 0.01)
+
+        todas = np.arange(len(self.nodos))
+        self._rejillas = {None: _Rejilla(todas, self.x, self.y, self.celda_km)}
+        for rol in set(self.roles.tolist()):
+            self._rejillas[rol] = _Rejilla(todas[self.roles == rol], self.x, self.y, self.celda_km)
+
+    def _proyectar(self, lat, lon):
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        return (RADIO_TIERRA_KM * np.radians(lon) * self._cos, RADIO_TIERRA_KM * np.radians(lat))
+
+    def _rejilla(self, rol):
+        return self._rejillas.get(rol)
+
+    def k_cercanos(self, lat, lon, k=1, rol=None):
+        """
+        The k nodes (optionally only of `rol`) closest to (lat, lon).
+
+        Returns:
+            list: (node id, distance in km) pairs, closest first.
+        """
+        rejilla = self._rejilla(rol)
+        if rejilla is None or k < 1 or not rejilla.celdas:
+            return []
+        x, y = self._proyectar(lat, lon)
+        cx, cy = int(math.floor(x / self.celda_km)), int(math.floor(y / self.celda_km))
+        r, maximo = rejilla.anillos(cx, cy)
+        posiciones = np.empty(0, dtype=np.int64)
+        distancias = np.empty(0)
+        while r <= maximo:
+            nuevas = rejilla.anillo(cx, cy, r)
+            if nuevas is not None:
+                posiciones = np.concatenate([posiciones, nuevas])
+                distancias = np.concatenate([distancias, haversine_km(lat, lon, self.lat[nuevas], self.lon[nuevas])])
+                if len(posiciones) > k:
+                    mejores = np.argpartition(distancias, k - 1)[:k]
+                    posiciones, distancias = posiciones[mejores], distancias[mejores]
+            # Todo lo que está fuera de los anillos 0..r queda a más de r celdas en el plano
+            if len(posiciones) >= k and distancias.max() <= r * self.celda_km * _MARGEN:
+                break
+            r += 1
+        orden = np.argsort(distancias, kind="stable")
+        return [(self.ids[posiciones[i]], float(distancias[i])) for i in orden]
+
+    def cercano(self, lat, lon, rol=None):
+        """Closest node (optionally only of `rol`) as (node id, distance in km), or None."""
+        resultado = self.k_cercanos(lat, lon, 1, rol)
+        return resultado[0] if resultado else None
+
+    def cercanos_lote(self, lats, lons, rol=None):
+        """Closest node for each point of a batch; list of (node id, distance in km) or None."""
+        return [self.cercano(lat, lon, rol) for lat, lon in zip(lats, lons)]
+
+    def en_radio(self, lat, lon, radio_km, rol=None):
+        """
+        Every node (optionally only of `rol`) within `radio_km` of (lat, lon).
+
+        Returns:
+            list: (node id, distance in km) pairs, closest first.
+        """
+        rejilla = self._rejilla(rol)
+        if rejilla is None or radio_km < 0:
+            return []
+        x, y = self._proyectar(lat, lon)
+        holgura = radio_km / _MARGEN
+        desde = np.searchsorted(rejilla.x_ordenadas, x - holgura, side="left")
+        hasta = np.searchsorted(rejilla.x_ordenadas, x + holgura, side="right")
+        banda = rejilla.ordenadas[desde:hasta]
+        banda = banda[np.abs(self.y[banda] - y) <= holgura]
+        distancias = haversine_km(lat, lon, self.lat[banda], self.lon[banda])
+        dentro = distancias <= radio_km
+        banda, distancias = banda[dentro], distancias[dentro]
+        orden = np.argsort(distancias, kind="stable")
+        return [(self.ids[banda[i]], float(distancias[i])) for i in orden]
+
+    def k_vecinos_todos(self, k):
+        """
+        The k nearest other nodes of every node at once, for building
+        neighbourhood graphs. Nodes are bucketed in cells holding about k+1
+        nodes each and every cell is solved with one vectorised haversine
+        matrix against its 3x3 block of cells; the few nodes whose k-th
+        neighbour could lie outside the block fall back to k_cercanos.
+
+        Returns:
+            tuple: (vecinos, distancias), arrays of shape (n, k) with node
+            positions and distances in km, closest first; -1 / inf where a
+            node has fewer than k other nodes.
+        """
+        n = len(self.nodos)
+        vecinos = np.full((n, max(k, 0)), -1, dtype=np.int64)
+        distancias = np.full((n, max(k, 0)), np.inf)
+        k_real = min(k, n - 1)
+        if k_real < 1:
+            return vecinos, distancias
+
+        celda = self.celda_km * math.sqrt(k_real + 1)
+        cx = np.floor(self.x / celda).astype(np.int64)
+        cy = np.floor(self.y / celda).astype(np.int64)
+        orden = np.lexsort((cy, cx))
+        cortes = np.flatnonzero((np.diff(cx[orden]) != 0) | (np.diff(cy[orden]) != 0)) + 1
+        celdas = {(int(cx[g[0]]), int(cy[g[0]])): g for g in np.split(orden, cortes)}
+
+        pendientes = []
+        for (x0, y0), miembros in celdas.items():
+            bloque = [celdas[c] for c in ((x0 + dx, y0 + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)) if c in celdas]
+            candidatos = np.concatenate(bloque)
+            d = haversine_km(self.lat[miembros, None], self.lon[miembros, None],
+                             self.lat[None, candidatos], self.lon[None, candidatos])
+            d[miembros[:, None] == candidatos[None, :]] = np.inf # Un nodo no es vecino de sí mismo
+            tomar = min(k_real, len(candidatos) - 1)
+            if tomar < 1:
+                pendientes.extend(miembros.tolist())
+                continue
+            mejores = np.argpartition(d, tomar - 1, axis=1)[:, :tomar]
+            d_mejores = np.take_along_axis(d, mejores, axis=1)
+            por_distancia = np.argsort(d_mejores, axis=1, kind="stable")
+            vecinos[miembros, :tomar] = candidatos[np.take_along_axis(mejores, por_distancia, axis=1)]
+            distancias[miembros, :tomar] = np.take_along_axis(d_mejores, por_distancia, axis=1)
+            # Fuera del bloque 3x3 todo está a más de una celda: si el k-ésimo queda más lejos, no es seguro
+            dudosos = (tomar < k_real) | (distancias[miembros, k_real - 1] > celda * _MARGEN)
+            pendientes.extend(miembros[dudosos].tolist())
+
+        posicion = {nodo_id: i for i, nodo_id in enumerate(self.ids)}
+        for i in pendientes:
+            encontrados = [(posicion[nodo_id], d) for nodo_id, d in self.k_cercanos(self.lat[i], self.lon[i], k_real + 1)]
+            encontrados = [(j, d) for j, d in encontrados if j != i][:k_real]
+            vecinos[i, :len(encontrados)] = [j for j, _ in encontrados]
+            distancias[i, :len(encontrados)] = [d for _, d in encontrados]
+        return vecinos, distancias
@@ -1,35 +1,65 @@
 from datetime import datetime, timedelta
 import random
 
-def generar_ordenes(n_orders, nodos):
+def crear_orden(numero, cliente, destino_id, prioridad, fecha_creacion=None):
+    """
+    Builds a single pending order dict from a client node and a storage node id.
+    `numero` is the numeric part of the order id ("O{numero}").
+    """
+    if fecha_creacion is None:
+        fecha_creacion = datetime.now()
+    return {
+        "id": f"O{numero}",
+        "cliente": cliente["nombre"],
+        "cliente_id": cliente["client_id"],
+        "origen": cliente["id"],
+        "destino": destino_id,
+        "status": "Pendiente",
+        "fecha_creacion": fecha_creacion.strftime("%Y-%m-%d %H:%M:%S"),
+        "prioridad": prioridad,
+        "fecha_entrega": None,
+        "costo_total": 0
+    }
+
+def siguiente_numero_orden(ordenes):
+    """Returns the next free numeric id for orders named "O1", "O2", ..."""
+    mayor = 0
+    for orden in ordenes:
+        orden_id = str(orden.get("id", ""))
+        if orden_id[:1] == "O" and orden_id[1:].isdigit():
+            mayor = max(mayor, int(orden_id[1:]))
+    return mayor + 1
+
+def generar_ordenes_por_bloques(n_orders, nodos, tamano_bloque=10000):
+    """
+    Yields the same orders as generar_ordenes (same random draws, same ids)
+    in lists of at most `tamano_bloque`, so large simulations never hold
+    every order in memory at once.
+    """
     clientes = [n for n in nodos if n["role"] == "client"]
     storages = [n for n in nodos if n["role"] == "storage"]
 
     if not clientes or not storages:
-        return []
+        return
 
-    ordenes = []
+    bloque = []
     for i in range(1, n_orders + 1):
         cliente = random.choice(clientes)
         destino = random.choice(storages)
-        origen = cliente
 
         fecha_creacion = datetime.now()
         prioridad = random.randint(1, 3)
 
-        orden = {
-            "id": f"O{i}",
-            "cliente": cliente["nombre"],
-            "cliente_id": cliente["client_id"],
-            "origen": origen["id"],
-            "destino": destino["id"],
-            "status": "Pendiente",
-            "fecha_creacion": fecha_creacion.strftime("%Y-%m-%d %H:%M:%S"),
-            "prioridad": prioridad,
-            "fecha_entrega": None,
-            "costo_total": 0
-        }
-        ordenes.append(orden)
+        bloque.append(crear_orden(i, cliente, destino["id"], prioridad, fecha_creacion))
+        if len(bloque) == tamano_bloque:
+            yield bloque
+            bloque = []
 
-    return ordenes
+    if bloque:
+        yield bloque
 
+def generar_ordenes(n_orders, nodos):
+    ordenes = []
+    for bloque in generar_ordenes_por_bloques(n_orders, nodos):
+        ordenes.extend(bloque)
+    return ordenes
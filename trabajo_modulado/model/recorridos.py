@@ -0,0 +1,349 @@
+import math
+
+import networkx as nx
+import numpy as np
+
+from .ruta import MAX_BATTERY, nodos_recarga, dijkstra_with_battery
+
+CAPACIDAD_POR_DEFECTO = 4 # Órdenes que un dron puede llevar en un mismo recorrido
+
+
+class PlanificadorRecorridos:
+    """
+    Multi-stop tour planner for orders that share a storage node.
+
+    Pending orders are grouped by day (fecha_creacion) and destination
+    storage node. For each group a drone leaves the storage node, visits the
+    clients of up to `capacidad` orders and comes back, instead of flying one
+    round trip per order. Tours are built with the Clarke-Wright savings
+    heuristic and then improved with 2-opt, both over a distance matrix
+    compiled once per group.
+
+    Every leg of the matrix is a concrete path. Battery is checked like in
+    dijkstra_with_battery: consumption since the last recharge node (or since
+    leaving the storage node) must never exceed max_bateria. Each leg stores
+    what it consumes before its first recharge node and after its last one,
+    so a whole tour is checked in O(number of stops) whenever two tours are
+    merged or a 2-opt move is tried.
+
+    Legs are computed once per planner and reused by every group and call.
+    `tramos` lets several planners over the same graph share them (e.g. one
+    dict per graph version); it must be discarded when the graph changes.
+    """
+
+    def __init__(self, G, capacidad=CAPACIDAD_POR_DEFECTO, max_bateria=None, tramos=None):
+        if capacidad < 1:
+            raise ValueError("La capacidad debe ser al menos 1")
+        self.G = G
+        self.capacidad = capacidad
+        self.max_bateria = MAX_BATTERY if max_bateria is None else max_bateria
+        self.recargas = nodos_recarga(G)
+        self._dijkstra = {} # origen -> (predecesores, distancias) del camino más corto sin batería
+        self._tramos = {} if tramos is None else tramos # (origen, destino, max_bateria) -> (camino, perfil)
+
+    # --- Tramos y matriz de distancias ---
+    def _perfil(self, camino):
+        """(costo, consumo hasta la 1a recarga, consumo tras la última, pasa por recarga, interior factible)."""
+        costo = 0
+        carga = 0
+        prefijo = None
+        interior_ok = True
+        for i in range(1, len(camino)):
+            peso = self.G.edges[camino[i - 1], camino[i]]['weight']
+            costo += peso
+            carga += peso
+            if camino[i] in self.recargas and i < len(camino) - 1:
+                if prefijo is None:
+                    prefijo = carga
+                elif carga > self.max_bateria:
+                    interior_ok = False
+                carga = 0
+        if prefijo is None:
+            return costo, costo, costo, False, True
+        return costo, prefijo, carga, True, interior_ok
+
+    def _camino_corto(self, origen, destino):
+        if origen not in self._dijkstra:
+            self._dijkstra[origen] = nx.dijkstra_predecessor_and_distance(self.G, origen, weight='weight')
+        predecesores, distancias = self._dijkstra[origen]
+        if destino not in distancias:
+            return None
+        camino = [destino]
+        while camino[-1] != origen:
+            camino.append(predecesores[camino[-1]][0])
+        camino.reverse()
+        return camino
+
+    def _tramo(self, origen, destino):
+        """Cheapest path whose own segments fit the battery, starting fully charged (memoised)."""
+        tramo = self._tramos.get((origen, destino, self.max_bateria))
+        if tramo is not None:
+            return tramo
+        inverso = self._tramos.get((destino, origen, self.max_bateria))
+        if inverso is not None:
+            camino, perfil = inverso
+            if camino is None:
+                return inverso
+            # Mismo criterio que compilar_matriz: el tramo inverso es el mismo camino con prefijo y sufijo intercambiados
+            c, pre, suf, rec, ok = perfil
+            return camino[::-1], (c, suf, pre, rec, ok)
+        tramo = self._calcular_tramo(origen, destino)
+        self._tramos[(origen, destino, self.max_bateria)] = tramo
+        return tramo
+
+    def _calcular_tramo(self, origen, destino):
+        camino = self._camino_corto(origen, destino)
+        if camino is not None:
+            perfil = self._perfil(camino)
+            if self._factible([perfil]):
+                return camino, perfil
+        # El más corto no respeta la batería: se busca con estados (nodo, batería)
+        camino, _ = dijkstra_with_battery(self.G, origen, destino, self.max_bateria)
+        if camino is None:
+            return None, None
+        return camino, self._perfil(camino)
+
+    def compilar_matriz(self, deposito, paradas):
+        """
+        Builds the leg matrices for [deposito] + paradas (index 0 is the storage node).
+
+        Returns:
+            dict with numpy arrays costo, prefijo, sufijo, recarga, interior (n x n)
+            and caminos {(i, j): path}. Infeasible legs cost inf.
+        """
+        nodos = [deposito] + list(paradas)
+        n = len(nodos)
+        costo = np.full((n, n), np.inf)
+        prefijo = np.zeros((n, n))
+        sufijo = np.zeros((n, n))
+        recarga = np.zeros((n, n), dtype=bool)
+        interior = np.ones((n, n), dtype=bool)
+        caminos = {}
+        np.fill_diagonal(costo, 0.0)
+        for i in range(n):
+            for j in range(i + 1, n):
+                camino, perfil = self._tramo(nodos[i], nodos[j])
+                if camino is None:
+                    continue
+                c, pre, suf, rec, ok = perfil
+                # El grafo no es dirigido: el tramo inverso es el mismo camino con prefijo y sufijo intercambiados
+                costo[i, j] = costo[j, i] = c
+                prefijo[i, j], sufijo[i, j] = pre, suf
+                prefijo[j, i], sufijo[j, i] = suf, pre
+                recarga[i, j] = recarga[j, i] = rec
+                interior[i, j] = interior[j, i] = ok
+                caminos[(i, j)] = camino
+                caminos[(j, i)] = camino[::-1]
+        return {"nodos": nodos, "costo": costo, "prefijo": prefijo, "sufijo": sufijo,
+                "recarga": recarga, "interior": interior, "caminos": caminos}
+
+    # --- Factibilidad de batería ---
+    def _factible(self, perfiles):
+        carga = 0
+        for costo, prefijo, sufijo, recarga, interior in perfiles:
+            if not interior:
+                return False
+            if recarga:
+                if carga + prefijo > self.max_bateria:
+                    return False
+                carga = sufijo
+            else:
+                carga += costo
+            if carga > self.max_bateria:
+                return False
+        return True
+
+    def _recorrido_factible(self, matriz, secuencia):
+        """secuencia: stop indices without the storage node; the tour is 0 -> secuencia -> 0."""
+        puntos = [0] + secuencia + [0]
+        costo, prefijo, sufijo = matriz["costo"], matriz["prefijo"], matriz["sufijo"]
+        recarga, interior = matriz["recarga"], matriz["interior"]
+        perfiles = []
+        for a, b in zip(puntos, puntos[1:]):
+            if not math.isfinite(costo[a, b]):
+                return False
+            perfiles.append((costo[a, b], prefijo[a, b], sufijo[a, b], recarga[a, b], interior[a, b]))
+        return self._factible(perfiles)
+
+    @staticmethod
+    def _costo_recorrido(costo, secuencia):
+        puntos = [0] + secuencia + [0]
+        return float(sum(costo[a, b] for a, b in zip(puntos, puntos[1:])))
+
+    # --- Heurísticas ---
+    def _ahorros(self, matriz, demanda):
+        """Clarke-Wright (parallel version) with capacity and battery checks on every merge."""
+        costo = matriz["costo"]
+        n = len(demanda)
+        recorridos = {i: [i] for i in range(1, n) if self._recorrido_factible(matriz, [i])}
+        carga = {i: demanda[i] for i in recorridos}
+        recorrido_de = {i: i for i in recorridos}
+
+        # s(i, j) = d(0, i) + d(j, 0) - d(i, j), calculado de una vez para todos los pares.
+        # Solo pares con los tres tramos finitos: con un tramo inalcanzable sería inf - inf (NaN)
+        i_idx, j_idx = np.triu_indices(n, k=1)
+        desde_deposito = costo[0]
+        finitos = ((i_idx > 0) & np.isfinite(desde_deposito[i_idx]) & np.isfinite(desde_deposito[j_idx])
+                   & np.isfinite(costo[i_idx, j_idx]))
+        i_idx, j_idx = i_idx[finitos], j_idx[finitos]
+        valores = desde_deposito[i_idx] + desde_deposito[j_idx] - costo[i_idx, j_idx]
+        validos = valores > 0
+        orden = np.argsort(-valores[validos], kind="stable")
+        pares = zip(i_idx[validos][orden].tolist(), j_idx[validos][orden].tolist())
+
+        for i, j in pares:
+            if i not in recorrido_de or j not in recorrido_de:
+                continue
+            ri, rj = recorrido_de[i], recorrido_de[j]
+            if ri == rj or carga[ri] + carga[rj] > self.capacidad:
+                continue
+            a, b = recorridos[ri], recorridos[rj]
+            # i y j tienen que ser extremos; se orientan para que queden contiguos (... i, j ...)
+            if a[-1] != i:
+                if a[0] != i:
+                    continue
+                a = a[::-1]
+            if b[0] != j:
+                if b[-1] != j:
+                    continue
+                b = b[::-1]
+            unido = a + b
+            if not self._recorrido_factible(matriz, unido):
+                unido = b[::-1] + a[::-1]
+                if not self._recorrido_factible(matriz, unido):
+                    continue
+            recorridos[ri] = unido
+            carga[ri] += carga.pop(rj)
+            del recorridos[rj]
+            for parada in b:
+                recorrido_de[parada] = ri
+        return list(recorridos.values()), [i for i in range(1, n) if i not in recorrido_de]
+
+    def _dos_opt(self, matriz, secuencia):
+        """First-improvement 2-opt on one tour, only accepting battery-feasible moves."""
+        costo = matriz["costo"]
+        mejorado = True
+        while mejorado:
+            mejorado = False
+            puntos = [0] + secuencia + [0]
+            for a in range(len(puntos) - 2):
+                for b in range(a + 2, len(puntos) - 1):
+                    delta = (costo[puntos[a], puntos[b]] + costo[puntos[a + 1], puntos[b + 1]]
+                             - costo[puntos[a], puntos[a + 1]] - costo[puntos[b], puntos[b + 1]])
+                    if delta < -1e-9:
+                        candidata = puntos[1:a + 1] + puntos[a + 1:b + 1][::-1] + puntos[b + 1:-1]
+                        if self._recorrido_factible(matriz, candidata):
+                            secuencia = candidata
+                            mejorado = True
+                            break
+                if mejorado:
+                    break
+        return secuencia
+
+    # --- Planificación ---
+    def planificar_grupo(self, deposito, ordenes):
+        """
+        Plans the tours for orders that share the storage node `deposito`.
+
+        Returns:
+            tuple: (list of tour dicts, list of orders that no tour can serve)
+        """
+        por_cliente = {}
+        for orden in ordenes:
+            por_cliente.setdefault(orden["origen"], []).append(orden)
+
+        # Un cliente con más órdenes que la capacidad recibe viajes completos y el resto entra como parada
+        recorridos = []
+        paradas = []
+        ordenes_parada = []
+        for cliente, suyas in por_cliente.items():
+            while len(suyas) > self.capacidad:
+                recorridos.append((cliente, suyas[:self.capacidad]))
+                suyas = suyas[self.capacidad:]
+            paradas.append(cliente)
+            ordenes_parada.append(suyas)
+
+        matriz = self.compilar_matriz(deposito, paradas)
+        demanda = [0] + [len(suyas) for suyas in ordenes_parada]
+        secuencias, sin_servicio = self._ahorros(matriz, demanda)
+
+        resultado = []
+        indice_parada = {cliente: i + 1 for i, cliente in enumerate(paradas)}
+        inalcanzables = set(sin_servicio)
+        for cliente, suyas in recorridos:
+            i = indice_parada[cliente]
+            if i not in inalcanzables:
+                resultado.append(self._armar(matriz, deposito, [i], [suyas]))
+        for secuencia in secuencias:
+            secuencia = self._dos_opt(matriz, secuencia)
+            resultado.append(self._armar(matriz, deposito, secuencia, [ordenes_parada[i - 1] for i in secuencia]))
+
+        no_servidas = []
+        for i in sin_servicio:
+            no_servidas.extend(por_cliente[paradas[i - 1]])
+        return resultado, no_servidas
+
+    def _armar(self, matriz, deposito, secuencia, ordenes_por_parada):
+        puntos = [0] + secuencia + [0]
+        ruta = [deposito]
+        for a, b in zip(puntos, puntos[1:]):
+            ruta.extend(matriz["caminos"][(a, b)][1:])
+        ida_y_vuelta = float(sum(2 * matriz["costo"][0, i] * len(suyas)
+                                 for i, suyas in zip(secuencia, ordenes_por_parada)))
+        return {
+            "destino": deposito,
+            "paradas": [matriz["nodos"][i] for i in secuencia],
+            "ordenes": [orden["id"] for suyas in ordenes_por_parada for orden in suyas],
+            "ruta": ruta,
+            "costo": self._costo_recorrido(matriz["costo"], secuencia),
+            "costo_viajes_individuales": ida_y_vuelta,
+        }
+
+    def planificar(self, ordenes, estado="Pendiente"):
+        """
+        Plans tours for every order in `estado`, grouped by day and storage node.
+
+        Returns:
+            dict: recorridos (list), no_servidas (order ids) and resumen with the
+            trips and flown distance against one round trip per order.
+        """
+        grupos = {}
+        for orden in ordenes:
+            if orden.get("status") != estado:
+                continue
+            dia = (orden.get("fecha_creacion") or "")[:10]
+            grupos.setdefault((dia, orden["destino"]), []).append(orden)
+
+        recorridos = []
+        no_servidas = []
+        for (dia, deposito), del_grupo in sorted(grupos.items()):
+            planeados, sin_servicio = self.planificar_grupo(deposito, del_grupo)
+            for recorrido in planeados:
+                recorrido["dia"] = dia
+            recorridos.extend(planeados)
+            no_servidas.extend(orden["id"] for orden in sin_servicio)
+
+        servidas = sum(len(r["ordenes"]) for r in recorridos)
+        distancia = sum(r["costo"] for r in recorridos)
+        distancia_individual = sum(r["costo_viajes_individuales"] for r in recorridos)
+        por_dia = {}
+        for r in recorridos:
+            dia = por_dia.setdefault(r["dia"], {"viajes": 0, "distancia": 0.0, "ordenes": 0})
+            dia["viajes"] += 1
+            dia["distancia"] += r["costo"]
+            dia["ordenes"] += len(r["ordenes"])
+        return {
+            "recorridos": recorridos,
+            "no_servidas": no_servidas,
+            "resumen": {
+                "capacidad": self.capacidad,
+                "ordenes_servidas": servidas,
+                "ordenes_no_servidas": len(no_servidas),
+                "viajes": len(recorridos),
+                "viajes_individuales": servidas,
+                "distancia": distancia,
+                "distancia_viajes_individuales": distancia_individual,
+                "ahorro_distancia": 1 - distancia / distancia_individual if distancia_individual else 0.0,
+                "por_dia": por_dia,
+            },
+        }
@@ -4,35 +4,92 @@ import networkx as nx # For Floyd-Warshall later
 
 MAX_BATTERY = 50 # Default max battery
 
-def encontrar_ruta_con_bateria(G, origen, destino):
-    recargas = {n for n, d in G.nodes(data=True) if d['role'] == 'recharge'}
-    
-    # Queue con elementos: (nodo_actual, camino, bateria_actual)
-    queue = deque()
-    queue.append((origen, [origen], 0))
+# Contadores acumulados de las búsquedas con batería, por algoritmo.
+# Solo se suman enteros, así que no afectan el resultado de las rutas.
+# cola_maxima es el mayor tamaño que alcanzó la cola en una sola búsqueda.
+ESTADISTICAS_BUSQUEDA = {
+    algoritmo: {"busquedas": 0, "estados_expandidos": 0, "cola_maxima": 0, "aciertos_cache": 0}
+    for algoritmo in ("bfs_bateria", "dijkstra_bateria")
+}
+
+def _registrar_busqueda(algoritmo, expandidos, cola_maxima):
+    stats = ESTADISTICAS_BUSQUEDA[algoritmo]
+    stats["busquedas"] += 1
+    stats["estados_expandidos"] += expandidos
+    if cola_maxima > stats["cola_maxima"]:
+        stats["cola_maxima"] = cola_maxima
+
+def nodos_recarga(G):
+    return {n for n, d in G.nodes(data=True) if d.get('role') == 'recharge'}
+
+def encontrar_ruta_con_bateria(G, origen, destino, recargas=None, max_bateria=None):
+    if recargas is None:
+        recargas = nodos_recarga(G)
+    if max_bateria is None:
+        max_bateria = MAX_BATTERY
     
-    visitados = set()  # Guardamos (nodo, bateria_actual) para evitar ciclos
+    # Cada estado es (nodo_actual, bateria_actual). En vez de copiar el camino
+    # en cada estado guardamos el estado padre y reconstruimos al final.
+    inicio = (origen, 0)
+    padres = {inicio: None}  # También evita revisitar (nodo, bateria_actual)
+    queue = deque([inicio])
+    expandidos = 0
+    cola_maxima = 1
     
     while queue:
-        actual, camino, bateria = queue.popleft()
+        if len(queue) > cola_maxima:
+            cola_maxima = len(queue)
+        estado = queue.popleft()
+        expandidos += 1
+        actual, bateria = estado
         
         if actual == destino:
+            _registrar_busqueda("bfs_bateria", expandidos, cola_maxima)
+            camino = _reconstruir_camino(padres, estado)
             return camino, calcular_costo(G, camino)
         
-        for vecino in G.neighbors(actual):
-            peso = G.edges[actual, vecino]['weight']
+        for vecino, datos in G.adj[actual].items():
+            peso = datos['weight']
             
             # Si el nodo vecino es de recarga, bateria se reinicia
             nueva_bateria = peso if vecino in recargas else bateria + peso
             
-            if nueva_bateria <= MAX_BATTERY:
-                estado = (vecino, nueva_bateria)
-                if estado not in visitados:
-                    visitados.add(estado)
-                    queue.append((vecino, camino + [vecino], nueva_bateria))
+            if nueva_bateria <= max_bateria:
+                nuevo_estado = (vecino, nueva_bateria)
+                if nuevo_estado not in padres:
+                    padres[nuevo_estado] = estado
+                    queue.append(nuevo_estado)
                     
+    _registrar_busqueda("bfs_bateria", expandidos, cola_maxima)
     return None, None
 
+def _reconstruir_camino(padres, estado):
+    camino = []
+    while estado is not None:
+        camino.append(estado[0])
+        estado = padres[estado]
+    camino.reverse()
+    return camino
+
+def encontrar_rutas_lote(G, pares, max_bateria=None):
+    """
+    Routes a batch of (origen, destino) pairs with encontrar_ruta_con_bateria.
+    The recharge set is computed once and each distinct pair is searched once.
+
+    Returns:
+        dict: (origen, destino) -> (path, cost), with (None, None) for unreachable pairs.
+    """
+    recargas = nodos_recarga(G)
+    resultados = {}
+    aciertos = 0
+    for par in pares:
+        if par in resultados:
+            aciertos += 1
+        else:
+            resultados[par] = encontrar_ruta_con_bateria(G, par[0], par[1], recargas, max_bateria)
+    ESTADISTICAS_BUSQUEDA["bfs_bateria"]["aciertos_cache"] += aciertos
+    return resultados
+
 def calcular_costo(G, camino):
     return sum(G.edges[camino[i], camino[i+1]]['weight'] for i in range(len(camino)-1))
 
@@ -89,14 +146,21 @@ def dijkstra_with_battery(G, origen, destino, max_battery_allowance=MAX_BATTERY)
     dist[(origen, 0)] = 0
 
 
+    expanded = 0
+    queue_peak = 1
+
     while pq:
+        if len(pq) > queue_peak:
+            queue_peak = len(pq)
         total_cost, battery_on_segment, current_node, path = heapq.heappop(pq)
 
         # If this path to (current_node, battery_on_segment) is already worse than a known one, skip.
         if total_cost > dist.get((current_node, battery_on_segment), float('inf')):
             continue
+        expanded += 1
 
         if current_node == destino:
+            _registrar_busqueda("dijkstra_bateria", expanded, queue_peak)
             return path, total_cost
 
         for neighbor in G.neighbors(current_node):
@@ -124,6 +188,7 @@ def dijkstra_with_battery(G, origen, destino, max_battery_allowance=MAX_BATTERY)
                     dist[(neighbor, battery_for_next_segment_from_neighbor)] = new_total_cost
                     heapq.heappush(pq, (new_total_cost, battery_for_next_segment_from_neighbor, neighbor, path + [neighbor]))
     
+    _registrar_busqueda("dijkstra_bateria", expanded, queue_peak)
     return None, None
 
 
@@ -0,0 +1,271 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .ruta import MAX_BATTERY, ESTADISTICAS_BUSQUEDA
+
+# Debajo de este número de pares distintos no compensa levantar procesos
+MIN_PARES_PARALELO = 2000
+
+
+class GrafoCompacto:
+    """
+    Read-only CSR snapshot of a NetworkX graph for the battery router.
+
+    Nodes are numbered 0..n-1 in G.nodes order. The neighbours of node i are
+    indices[indptr[i]:indptr[i+1]], in the same order as G.adj, with the edge
+    weights in `pesos`. `recarga[i]` is 1 for recharge nodes. Keeping the
+    G.adj order makes the BFS below return exactly the same routes as
+    encontrar_ruta_con_bateria.
+    """
+
+    def __init__(self, G):
+        self.ids = list(G.nodes)
+        self.indice = {nodo: i for i, nodo in enumerate(self.ids)}
+        n = len(self.ids)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        vecinos = []
+        pesos = []
+        for i, nodo in enumerate(self.ids):
+            for vecino, datos in G.adj[nodo].items():
+                vecinos.append(self.indice[vecino])
+                pesos.append(datos['weight'])
+            indptr[i + 1] = len(vecinos)
+
+        self.indptr = indptr
+        self.indices = np.asarray(vecinos, dtype=np.int64)
+        # Pesos enteros se mantienen enteros para que los costos coincidan con calcular_costo
+        enteros = all(float(p).is_integer() for p in pesos)
+        self.pesos = np.asarray(pesos, dtype=np.int64 if enteros else np.float64)
+        self.recarga = np.asarray([1 if G.nodes[nodo].get('role') == 'recharge' else 0 for nodo in self.ids],
+                                  dtype=np.uint8)
+
+    def arreglos(self):
+        return {"indptr": self.indptr, "indices": self.indices, "pesos": self.pesos, "recarga": self.recarga}
+
+
+def bfs_bateria_multidestino(indptr, indices, pesos, recarga, origen, destinos, max_bateria):
+    """
+    Battery-constrained BFS over CSR arrays from one origin to several destinations.
+
+    BFS pop order does not depend on the destination, so the first time each
+    destination is popped gives the same route encontrar_ruta_con_bateria
+    would return for that pair. The search stops once every destination has
+    been reached or the state space is exhausted.
+
+    Returns:
+        tuple: (dict destino -> (path as node indices, cost) or None, states expanded, queue peak)
+    """
+    pendientes = set(destinos)
+    resultados = {d: None for d in pendientes}
+    inicio = (origen, 0)
+    padres = {inicio: None}  # estado -> (estado_padre, peso de la arista)
+    queue = deque([inicio])
+    expandidos = 0
+    cola_maxima = 1
+
+    while queue and pendientes:
+        if len(queue) > cola_maxima:
+            cola_maxima = len(queue)
+        estado = queue.popleft()
+        expandidos += 1
+        actual, bateria = estado
+
+        if actual in pendientes:
+            pendientes.discard(actual)
+            camino = []
+            costo = 0
+            paso = estado
+            while paso is not None:
+                camino.append(paso[0])
+                enlace = padres[paso]
+                if enlace is None:
+                    break
+                paso, peso = enlace
+                costo += peso
+            camino.reverse()
+            resultados[actual] = (camino, costo)
+
+        for k in range(indptr[actual], indptr[actual + 1]):
+            vecino = indices[k]
+            peso = pesos[k]
+            nueva_bateria = peso if recarga[vecino] else bateria + peso
+            if nueva_bateria <= max_bateria:
+                nuevo_estado = (vecino, nueva_bateria)
+                if nuevo_estado not in padres:
+                    padres[nuevo_estado] = (estado, peso)
+                    queue.append(nuevo_estado)
+
+    return resultados, expandidos, cola_maxima
+
+
+# --- Lado del proceso trabajador ---
+_GRAFO_TRABAJADOR = None
+
+_FORMATOS = {np.dtype(np.int64): 'q', np.dtype(np.float64): 'd', np.dtype(np.uint8): 'B'}
+
+
+def _adjuntar_memoria(nombre):
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False)  # Python 3.13+
+    except TypeError:
+        # Los trabajadores heredan el resource_tracker del padre (fork y spawn), así que
+        # registrar el bloque otra vez es inocuo y el padre sigue siendo quien lo libera
+        return shared_memory.SharedMemory(name=nombre)
+
+
+def _inicializar_trabajador(descriptores, max_bateria):
+    global _GRAFO_TRABAJADOR
+    bloques = []
+    vistas = {}
+    for nombre_arreglo, (nombre_shm, dtype, longitud) in descriptores.items():
+        shm = _adjuntar_memoria(nombre_shm)
+        bloques.append(shm)
+        # memoryview sin copia: indexarla devuelve int/float de Python, más rápido que escalares numpy
+        vistas[nombre_arreglo] = shm.buf.cast(_FORMATOS[np.dtype(dtype)])[:longitud]
+    _GRAFO_TRABAJADOR = (vistas, max_bateria, bloques)
+
+
+def _enrutar_bloque(grupos):
+    vistas, max_bateria, _ = _GRAFO_TRABAJADOR
+    return _resolver_grupos(vistas, max_bateria, grupos)
+
+
+def _resolver_grupos(vistas, max_bateria, grupos):
+    """Routes a chunk of [(origen, [destinos...]), ...] given as node indices."""
+    salida = []
+    expandidos_total = 0
+    cola_maxima_total = 0
+    for origen, destinos in grupos:
+        resultados, expandidos, cola_maxima = bfs_bateria_multidestino(
+            vistas["indptr"], vistas["indices"], vistas["pesos"], vistas["recarga"], origen, destinos, max_bateria)
+        salida.append((origen, resultados))
+        expandidos_total += expandidos
+        cola_maxima_total = max(cola_maxima_total, cola_maxima)
+    return salida, len(grupos), expandidos_total, cola_maxima_total
+
+
+class EnrutadorParalelo:
+    """
+    Process pool that routes (origen, destino) pairs with the battery BFS.
+
+    The graph is compiled to a GrafoCompacto and copied once into shared
+    memory; every worker attaches to the same blocks when it starts, so
+    nothing but the pairs and the resulting paths crosses process boundaries.
+    Pairs are grouped by origin and each group is solved with a single
+    multi-destination BFS. With procesos=1 no pool is started and the same
+    search runs in this process. Use as a context manager so the pool and the
+    shared memory are released.
+    """
+
+    def __init__(self, G, procesos=None, max_bateria=None):
+        self.grafo = GrafoCompacto(G)
+        self.procesos = procesos or os.cpu_count() or 1
+        self.max_bateria = MAX_BATTERY if max_bateria is None else max_bateria
+        self._bloques = []
+        self._pool = None
+        if self.procesos == 1:
+            # Listas de Python: indexarlas es más rápido que indexar arreglos numpy
+            self._local = {nombre: arreglo.tolist() for nombre, arreglo in self.grafo.arreglos().items()}
+            return
+        descriptores = {}
+        for nombre_arreglo, arreglo in self.grafo.arreglos().items():
+            shm = shared_memory.SharedMemory(create=True, size=max(arreglo.nbytes, 8))
+            destino = np.ndarray(arreglo.shape, dtype=arreglo.dtype, buffer=shm.buf)
+            destino[:] = arreglo
+            del destino  # Sin vistas vivas para poder cerrar el bloque después
+            self._bloques.append(shm)
+            descriptores[nombre_arreglo] = (shm.name, arreglo.dtype.str, len(arreglo))
+        self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_inicializar_trabajador,
+                                         initargs=(descriptores, self.max_bateria))
+
+    def enrutar(self, pares):
+        """
+        Returns:
+            dict: (origen, destino) -> (path, cost), with (None, None) for unreachable pairs,
+                  the same contract as encontrar_rutas_lote.
+        """
+        indice = self.grafo.indice
+        ids = self.grafo.ids
+        grupos = {}
+        distintos = set()
+        for par in pares:
+            if par in distintos:
+                continue
+            distintos.add(par)
+            origen, destino = par
+            if origen not in indice or destino not in indice:
+                continue
+            grupos.setdefault(indice[origen], []).append(indice[destino])
+        ESTADISTICAS_BUSQUEDA["bfs_bateria"]["aciertos_cache"] += len(pares) - len(distintos)
+
+        # Varios bloques por proceso para repartir bien orígenes con costos distintos
+        lista = list(grupos.items())
+        n_bloques = min(len(lista), self.procesos * 4) or 1
+        bloques = [lista[i::n_bloques] for i in range(n_bloques)]
+
+        resultados = {par: (None, None) for par in distintos}
+        stats = ESTADISTICAS_BUSQUEDA["bfs_bateria"]
+        if self._pool is None:
+            respuestas = [_resolver_grupos(self._local, self.max_bateria, lista)]
+        else:
+            respuestas = self._pool.map(_enrutar_bloque, bloques)
+        for salida, busquedas, expandidos, cola_maxima in respuestas:
+            stats["busquedas"] += busquedas
+            stats["estados_expandidos"] += expandidos
+            stats["cola_maxima"] = max(stats["cola_maxima"], cola_maxima)
+            for origen, por_destino in salida:
+                for destino, resultado in por_destino.items():
+                    if resultado is not None:
+                        camino, costo = resultado
+                        resultados[(ids[origen], ids[destino])] = ([ids[i] for i in camino], costo)
+        return resultados
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for shm in self._bloques:
+            shm.close()
+            shm.unlink()
+        self._bloques = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def registrar_rutas(ordenes, rutas_por_par, rutas_usadas):
+    """
+    Fills `costo_total` of each order from rutas_por_par and adds its route
+    to rutas_usadas ("A → B → C" -> frequency), in place. Orders without a
+    feasible route keep their cost and are not counted.
+    """
+    for orden in ordenes:
+        ruta, costo = rutas_por_par[(orden["origen"], orden["destino"])]
+        if ruta:
+            orden["costo_total"] = costo
+            ruta_str = " → ".join(ruta)
+            rutas_usadas[ruta_str] = rutas_usadas.get(ruta_str, 0) + 1
+    return rutas_usadas
+
+
+def enrutar_ordenes(G, ordenes, procesos=None, max_bateria=None):
+    """
+    Routes every order, fills its `costo_total` and returns the rutas_usadas
+    map ("A → B → C" -> frequency). Batches with fewer than MIN_PARES_PARALELO
+    distinct pairs are routed in this process.
+    """
+    pares = [(o["origen"], o["destino"]) for o in ordenes]
+    procesos = procesos or os.cpu_count() or 1
+    if len(set(pares)) < MIN_PARES_PARALELO:
+        procesos = 1
+    with EnrutadorParalelo(G, procesos, max_bateria) as enrutador:
+        rutas_por_par = enrutador.enrutar(pares)
+    return registrar_rutas(ordenes, rutas_por_par, {})
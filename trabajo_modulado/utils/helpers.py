@@ -13,3 +13,18 @@ def calcular_visitas_por_nodo(rutas_usadas, nodos):
     visitas_storage = { nid: visitas[nid] for nid in visitas if role_por_nodo.get(nid) == "storage" }
 
     return visitas_clientes, visitas_recharge, visitas_storage
+
+
+def top_n_con_otros(conteos, n, etiqueta_otros="Otros"):
+    """
+    The n largest (id, count) entries of `conteos`, largest first, plus one
+    (f"{etiqueta_otros} (k)", total) entry adding up the k remaining ones.
+    With n=None every entry is returned, sorted.
+    """
+    import heapq
+
+    if n is None or n >= len(conteos):
+        return sorted(conteos.items(), key=lambda item: item[1], reverse=True)
+    top = heapq.nlargest(n, conteos.items(), key=lambda item: item[1])
+    resto = sum(conteos.values()) - sum(valor for _, valor in top)
+    return top + [(f"{etiqueta_otros} ({len(conteos) - n})", resto)]
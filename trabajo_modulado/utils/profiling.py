@@ -0,0 +1,132 @@
+"""
+Opt-in profiling for the simulation pipeline.
+
+SimulationProfiler records wall time per named stage and, optionally, a
+cProfile of the whole run and tracemalloc memory per stage. When disabled,
+stage() is a no-op, so the pipeline can always be wrapped. Entering the same
+stage repeatedly adds up its time under a single record. Used as a context
+manager, the profiler is started on entry and stopped on exit even if the run
+raises, so cProfile and tracemalloc are never left running.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class SimulationProfiler:
+    def __init__(self, enabled=True, use_cprofile=False, use_tracemalloc=False):
+        self.enabled = enabled
+        self.use_cprofile = enabled and use_cprofile
+        self.use_tracemalloc = enabled and use_tracemalloc
+        self.stages = []
+        self._profile = cProfile.Profile() if self.use_cprofile else None
+        self._snapshot = None
+        self._started_tracemalloc = False
+        self._running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def start(self):
+        self._running = True
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self._profile is not None:
+            self._profile.enable()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        if self._profile is not None:
+            self._profile.disable()
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self._record(name)
+            record["seconds"] += time.perf_counter() - start
+            record["calls"] += 1
+            if self.use_tracemalloc and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                record["memory_delta_bytes"] = record.get("memory_delta_bytes", 0) + current - memory_before
+                record["memory_peak_bytes"] = max(record.get("memory_peak_bytes", 0), peak)
+
+    def _record(self, name):
+        # A stage entered several times (e.g. once per chunk) accumulates into one record
+        for record in self.stages:
+            if record["stage"] == name:
+                return record
+        record = {"stage": name, "seconds": 0.0, "calls": 0}
+        self.stages.append(record)
+        return record
+
+    def total_seconds(self):
+        return sum(s["seconds"] for s in self.stages)
+
+    def cprofile_text(self, limit=25):
+        if self._profile is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def tracemalloc_text(self, limit=25):
+        if self._snapshot is None:
+            return ""
+        return "\n".join(str(stat) for stat in self._snapshot.statistics("lineno")[:limit])
+
+    def save(self, directory, metadata=None):
+        """
+        Writes the collected data to a timestamped folder inside `directory`:
+        stage timings (JSON), the cProfile dump (.prof, readable with pstats or
+        snakeviz) and the tracemalloc top allocations. Returns the written paths.
+        """
+        folder = os.path.join(directory, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+
+        timings_path = os.path.join(folder, "etapas.json")
+        with open(timings_path, "w") as f:
+            json.dump({"metadata": metadata or {}, "total_seconds": self.total_seconds(),
+                       "stages": self.stages}, f, indent=2)
+        paths.append(timings_path)
+
+        if self._profile is not None:
+            prof_path = os.path.join(folder, "simulacion.prof")
+            self._profile.dump_stats(prof_path)
+            paths.append(prof_path)
+
+        if self._snapshot is not None:
+            memory_path = os.path.join(folder, "memoria.txt")
+            with open(memory_path, "w") as f:
+                f.write(self.tracemalloc_text(limit=100))
+            paths.append(memory_path)
+
+        return paths
@@ -1,27 +1,208 @@
-from io import BytesIO
+from io import BytesIO, StringIO
+from collections import Counter, OrderedDict
+import csv
+import heapq
+from itertools import chain, islice
+from operator import itemgetter
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-import matplotlib.pyplot as plt
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.graphics.shapes import Drawing, Group, String
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.charts.barcharts import VerticalBarChart
 import pandas as pd
-from collections import Counter
+
+GRAFICOS_VECTORIALES = "vector" # Gráficos dibujados con reportlab.graphics: sin rasterizar y sin matplotlib
+GRAFICOS_PNG = "png" # Gráficos de matplotlib rasterizados a `dpi`
+DPI_POR_DEFECTO = 150
+SECCIONES_EN_CACHE = 16 # Versiones de datos cuyo contenido calculado se conserva
+FILAS_POR_BLOQUE = 50_000 # Filas por bloque en las exportaciones CSV/Parquet
+FLOWABLES_EN_ESPERA = 4 # Elementos de la historia generados por adelantado en el informe completo
+
+FORMATO_CSV = "csv"
+FORMATO_PARQUET = "parquet"
+
+ROLE_BAR_COLORS = {'client': 'red', 'storage': 'blue', 'recharge': 'green'}
+PIE_COLORS = [colors.HexColor(c) for c in ("#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd")] # Ciclo de matplotlib
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+# Celdas de los apéndices: texto de una línea en la fuente por defecto de Table, así todas las filas miden lo mismo
+FUENTE_CELDA = ('Helvetica', 10)
+RELLENO_CELDA = 12 # LEFTPADDING + RIGHTPADDING por defecto de Table
+RELLENO_MARCO = 12 # Padding del Frame de SimpleDocTemplate, 6 pt por lado
+ANCHO_RUTA = 5*inch
+
+# Contenido ya calculado de cada informe (tablas y gráficos), por versión de datos y opciones de gráficos
+_secciones_cache = OrderedDict()
 
 # Helper function to save matplotlib fig to a BytesIO object to be used by ReportLab Image
-def fig_to_img_bytes(fig):
+def fig_to_img_bytes(fig, dpi=DPI_POR_DEFECTO):
+    import matplotlib.pyplot as plt
+
     img_bytes = BytesIO()
-    fig.savefig(img_bytes, format='PNG', dpi=300)
+    fig.savefig(img_bytes, format='PNG', dpi=dpi)
     plt.close(fig) # Close the figure to free memory
     img_bytes.seek(0)
     return img_bytes
 
-def generate_report_pdf(nodos, ordenes, rutas_usadas):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter,
-                            rightMargin=72, leftMargin=72,
-                            topMargin=72, bottomMargin=18)
-    styles = getSampleStyleSheet()
+def _contenido_rutas(rutas_usadas, indice_rutas):
+    if not rutas_usadas:
+        return None
+    if indice_rutas is not None:
+        return indice_rutas.top(10)
+    return heapq.nlargest(10, rutas_usadas.items(), key=itemgetter(1))
+
+def _contenido_clientes(nodos, ordenes):
+    """Rows (header first) of the top-10 clients table; None without orders, [] without valid cliente_id."""
+    if not ordenes:
+        return None
+    df_ordenes = pd.DataFrame(ordenes)
+
+    # Validación extra: asegurar que existe cliente_id y que tiene valores válidos
+    if 'cliente_id' not in df_ordenes.columns or not df_ordenes['cliente_id'].notnull().any():
+        return []
+    client_counts = df_ordenes['cliente_id'].value_counts().head(10).reset_index()
+    client_counts.columns = ['cliente_id', 'total_ordenes']
+
+    # Buscar nombres de clientes en nodos (diccionario: una búsqueda por fila)
+    nombres = {n['client_id']: n.get('nombre') for n in nodos if n.get('role') == 'client' and 'client_id' in n}
+    if nombres:
+        data_clients = [["Cliente ID", "Nombre", "Total Órdenes"]]
+        for cliente_id, total in zip(client_counts['cliente_id'], client_counts['total_ordenes']):
+            nombre = nombres.get(cliente_id)
+            data_clients.append([cliente_id, 'N/A' if nombre is None or pd.isna(nombre) else nombre, str(total)])
+    else:
+        data_clients = [["Cliente ID", "Total Órdenes"]]
+        for cliente_id, total in zip(client_counts['cliente_id'], client_counts['total_ordenes']):
+            data_clients.append([cliente_id, str(total)])
+    return data_clients
+
+def _visitas_por_nodo(rutas_usadas):
+    node_visits = Counter()
+    for ruta_str, freq in rutas_usadas.items():
+        for node_id in ruta_str.split(" → "):
+            node_visits[node_id] += freq
+    return node_visits
+
+def _contenido_graficos(nodos, node_visits, node_roles, graficos, dpi):
+    """Pie and bar chart data, plus the PNGs when graficos == GRAFICOS_PNG."""
+    top_n = 5
+    contenido = {"roles": Counter(n["role"] for n in nodos), "visitas": [], "top_n": top_n}
+
+    if node_visits:
+        # Separate visits by role for top nodes (roles leídos del diccionario, no con una máscara de pandas por nodo)
+        por_rol = {'client': {}, 'storage': {}, 'recharge': {}}
+        for nid, role in node_roles.items():
+            if role in por_rol:
+                por_rol[role][nid] = node_visits.get(nid, 0)
+        for role in ('client', 'storage', 'recharge'):
+            # Node IDs are unique across roles, so the three top lists never overlap
+            contenido["visitas"].extend((nid, visits, role) for nid, visits in Counter(por_rol[role]).most_common(top_n))
+
+    if graficos == GRAFICOS_PNG:
+        import matplotlib.pyplot as plt
+
+        role_counts = contenido["roles"]
+        fig_pie, ax_pie = plt.subplots(figsize=(5, 4)) # Adjusted size for PDF
+        ax_pie.pie(role_counts.values(), labels=role_counts.keys(), autopct='%1.1f%%', startangle=90)
+        ax_pie.axis('equal')
+        ax_pie.set_title("Distribución de Nodos por Rol")
+        contenido["png_roles"] = fig_to_img_bytes(fig_pie, dpi).getvalue()
+
+        if contenido["visitas"]:
+            fig_bar, ax_bar = plt.subplots(figsize=(6, 4)) # Adjusted size
+            ax_bar.bar([v[0] for v in contenido["visitas"]], [v[1] for v in contenido["visitas"]],
+                       color=[ROLE_BAR_COLORS.get(v[2], 'gray') for v in contenido["visitas"]])
+            ax_bar.set_xlabel("Nodo ID")
+            ax_bar.set_ylabel("Número de Visitas")
+            ax_bar.set_title(f"Top Nodos Visitados (hasta N={top_n} por categoría)")
+            plt.xticks(rotation=45, ha="right")
+            plt.tight_layout() # Important for labels not getting cut off
+            contenido["png_visitas"] = fig_to_img_bytes(fig_bar, dpi).getvalue()
+    return contenido
+
+def _contenido_informe(nodos, ordenes, rutas_usadas, indice_rutas, graficos, dpi):
+    contenido = {"rutas": _contenido_rutas(rutas_usadas, indice_rutas), "clientes": _contenido_clientes(nodos, ordenes)}
+    node_roles = {n['id']: n['role'] for n in nodos}
+    node_visits = _visitas_por_nodo(rutas_usadas) if rutas_usadas else Counter()
+    contenido["nodos"] = [[node_id, node_roles.get(node_id, 'Desconocido'), str(visits)]
+                          for node_id, visits in node_visits.most_common(10)] if rutas_usadas else None # Top 10 visited nodes
+    contenido["graficos"] = _contenido_graficos(nodos, node_visits, node_roles, graficos, dpi) if nodos else None
+    return contenido
+
+def _grafico_roles_vectorial(role_counts):
+    drawing = Drawing(4*inch, 3.2*inch)
+    drawing.add(String(2*inch, 3.0*inch, "Distribución de Nodos por Rol", textAnchor='middle', fontName='Helvetica', fontSize=11))
+    pie = Pie()
+    pie.x, pie.y = 1.1*inch, 0.35*inch
+    pie.width = pie.height = 2.3*inch
+    pie.startAngle = 90
+    pie.direction = 'anticlockwise' # Como matplotlib con startangle=90
+    total = sum(role_counts.values())
+    pie.data = list(role_counts.values())
+    pie.labels = [f"{role} ({count / total:.1%})" for role, count in role_counts.items()]
+    pie.simpleLabels = 1
+    for i in range(len(pie.data)):
+        pie.slices[i].fillColor = PIE_COLORS[i % len(PIE_COLORS)]
+        pie.slices[i].strokeColor = colors.white
+    drawing.add(pie)
+    return drawing
+
+def _grafico_visitas_vectorial(visitas, top_n):
+    drawing = Drawing(5.5*inch, 3.7*inch)
+    drawing.add(String(2.75*inch, 3.5*inch, f"Top Nodos Visitados (hasta N={top_n} por categoría)",
+                       textAnchor='middle', fontName='Helvetica', fontSize=11))
+    chart = VerticalBarChart()
+    chart.x, chart.y = 0.6*inch, 0.75*inch
+    chart.width, chart.height = 4.7*inch, 2.5*inch
+    chart.data = [[v[1] for v in visitas]]
+    chart.valueAxis.valueMin = 0
+    chart.categoryAxis.categoryNames = [str(v[0]) for v in visitas]
+    chart.categoryAxis.labels.angle = 45
+    chart.categoryAxis.labels.boxAnchor = 'ne'
+    chart.categoryAxis.labels.fontSize = 7
+    chart.bars.strokeColor = None
+    for i, v in enumerate(visitas):
+        chart.bars[(0, i)].fillColor = getattr(colors, ROLE_BAR_COLORS.get(v[2], 'gray'))
+    drawing.add(chart)
+    drawing.add(String(2.75*inch, 0.05*inch, "Nodo ID", textAnchor='middle', fontName='Helvetica', fontSize=9))
+    eje_y = Group(String(0, 0, "Número de Visitas", textAnchor='middle', fontName='Helvetica', fontSize=9))
+    eje_y.transform = (0, 1, -1, 0, 0.2*inch, 2*inch) # Texto vertical
+    drawing.add(eje_y)
+    return drawing
+
+def _tabla(data, col_widths, repeat_rows=0):
+    table = Table(data, colWidths=col_widths, repeatRows=repeat_rows)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+def _contenido_en_cache(nodos, ordenes, rutas_usadas, indice_rutas, graficos, dpi, version):
+    clave = (version, graficos, dpi if graficos == GRAFICOS_PNG else None)
+    contenido = _secciones_cache.get(clave) if version is not None else None
+    if contenido is None:
+        contenido = _contenido_informe(nodos, ordenes, rutas_usadas, indice_rutas, graficos, dpi)
+        if version is not None:
+            _secciones_cache[clave] = contenido
+            while len(_secciones_cache) > SECCIONES_EN_CACHE:
+                _secciones_cache.popitem(last=False)
+    else:
+        _secciones_cache.move_to_end(clave)
+    return contenido
+
+def _historia_resumen(contenido, rutas_usadas, graficos, styles):
+    """Flowables of the summary report: top-10 tables and charts."""
     story = []
 
     # Title
@@ -30,179 +211,314 @@ def generate_report_pdf(nodos, ordenes, rutas_usadas):
 
     # --- Section: Rutas Frecuentes ---
     story.append(Paragraph("Rutas Más Frecuentes", styles['h2']))
-    if rutas_usadas:
-        sorted_rutas = sorted(rutas_usadas.items(), key=lambda item: item[1], reverse=True)
+    if contenido["rutas"] is not None:
         data = [["Ruta", "Frecuencia"]]
-        for ruta, freq in sorted_rutas[:10]: # Display top 10
+        for ruta, freq in contenido["rutas"]: # Display top 10
             data.append([Paragraph(ruta, styles['Normal']), str(freq)])
-        
-        table_rutas = Table(data, colWidths=[4*inch, 1*inch])
-        table_rutas.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0,0), (-1,-1), 1, colors.black)
-        ]))
-        story.append(table_rutas)
+        story.append(_tabla(data, [4*inch, 1*inch]))
     else:
         story.append(Paragraph("No hay datos de rutas usadas.", styles['Normal']))
     story.append(Spacer(1, 0.2*inch))
 
     # --- Section: Clientes Más Recurrentes ---
     story.append(Paragraph("Clientes Más Recurrentes (por nº de órdenes)", styles['h2']))
-    
-    if not ordenes:
+    if contenido["clientes"] is None:
         story.append(Paragraph("No hay datos de órdenes.", styles['Normal']))
-        story.append(Spacer(1, 0.2*inch))
+    elif not contenido["clientes"]:
+        story.append(Paragraph("No hay datos válidos de 'cliente_id' en las órdenes para generar este reporte.", styles['Normal']))
     else:
-        df_ordenes = pd.DataFrame(ordenes)
-    
-        # Validación extra: asegurar que existe cliente_id y que tiene valores válidos
-        if 'cliente_id' in df_ordenes.columns and df_ordenes['cliente_id'].notnull().any():
-            client_counts = df_ordenes['cliente_id'].value_counts().reset_index()
-            client_counts.columns = ['cliente_id', 'total_ordenes']
-    
-            # Buscar nombres de clientes en nodos
-            df_nodos_clientes = pd.DataFrame([n for n in nodos if n.get('role') == 'client'])
-            tiene_nombres = (not df_nodos_clientes.empty) and ('client_id' in df_nodos_clientes.columns)
-    
-            if tiene_nombres:
-                client_counts = pd.merge(
-                    client_counts,
-                    df_nodos_clientes[['client_id', 'nombre']],
-                    left_on='cliente_id',
-                    right_on='client_id',
-                    how='left'
-                )
-                client_counts['nombre'] = client_counts['nombre'].fillna('N/A')
-                data_clients = [["Cliente ID", "Nombre", "Total Órdenes"]]
-                for _, row in client_counts.head(10).iterrows():
-                    data_clients.append([row['cliente_id'], row['nombre'], str(row['total_ordenes'])])
-            else:
-                data_clients = [["Cliente ID", "Total Órdenes"]]
-                for _, row in client_counts.head(10).iterrows():
-                    data_clients.append([row['cliente_id'], str(row['total_ordenes'])])
-    
-            table_clients = Table(
-                data_clients,
-                colWidths=[1*inch, 2.5*inch, 1.5*inch] if len(data_clients[0]) == 3 else [2*inch, 2*inch]
-            )
-            table_clients.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            story.append(table_clients)
-        else:
-            story.append(Paragraph("No hay datos válidos de 'cliente_id' en las órdenes para generar este reporte.", styles['Normal']))
-    
+        data_clients = contenido["clientes"]
+        story.append(_tabla(data_clients, [1*inch, 2.5*inch, 1.5*inch] if len(data_clients[0]) == 3 else [2*inch, 2*inch]))
     story.append(Spacer(1, 0.2*inch))
 
     # --- Section: Nodos Más Utilizados ---
     story.append(Paragraph("Nodos Más Utilizados (en rutas)", styles['h2']))
-    if rutas_usadas:
-        node_visits = Counter()
-        for ruta_str, freq in rutas_usadas.items():
-            nodes_in_path = ruta_str.split(" → ")
-            for node_id in nodes_in_path:
-                node_visits[node_id] += freq
-        
-        sorted_node_visits = node_visits.most_common(10) # Top 10 visited nodes
-        data_nodes = [["Nodo ID", "Rol", "Visitas"]]
-        node_roles = {n['id']: n['role'] for n in nodos}
-        for node_id, visits in sorted_node_visits:
-            role = node_roles.get(node_id, 'Desconocido')
-            data_nodes.append([node_id, role, str(visits)])
-        
-        table_nodes = Table(data_nodes, colWidths=[1.5*inch, 1.5*inch, 1*inch])
-        table_nodes.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0,0), (-1,-1), 1, colors.black)
-        ]))
-        story.append(table_nodes)
+    if contenido["nodos"] is not None:
+        story.append(_tabla([["Nodo ID", "Rol", "Visitas"]] + contenido["nodos"], [1.5*inch, 1.5*inch, 1*inch]))
     else:
         story.append(Paragraph("No hay datos de rutas usadas para calcular visitas a nodos.", styles['Normal']))
     story.append(Spacer(1, 0.2*inch))
 
     # --- Section: Gráficas ---
     story.append(Paragraph("Gráficas del Sistema", styles['h2']))
-    if nodos:
+    contenido_graficos = contenido["graficos"]
+    if contenido_graficos is not None:
         # Pie chart: Proportion of nodes by role
-        roles = [n["role"] for n in nodos]
-        role_counts = Counter(roles)
-        
-        fig_pie, ax_pie = plt.subplots(figsize=(5, 4)) # Adjusted size for PDF
-        ax_pie.pie(role_counts.values(), labels=role_counts.keys(), autopct='%1.1f%%', startangle=90)
-        ax_pie.axis('equal')
-        ax_pie.set_title("Distribución de Nodos por Rol")
-        
-        img_pie_data = fig_to_img_bytes(fig_pie)
-        story.append(Image(img_pie_data, width=4*inch, height=3.2*inch)) # Adjusted size
+        if graficos == GRAFICOS_PNG:
+            story.append(Image(BytesIO(contenido_graficos["png_roles"]), width=4*inch, height=3.2*inch)) # Adjusted size
+        else:
+            story.append(_grafico_roles_vectorial(contenido_graficos["roles"]))
         story.append(Spacer(1, 0.2*inch))
 
         # Bar chart: Comparison of visits for top N nodes (if rutas_usadas)
-        if rutas_usadas and node_visits: # node_visits calculated above
-            # Separate visits by role for top nodes
-            df_all_nodes = pd.DataFrame(nodos)
-            
-            client_nodes_visits = {nid: node_visits.get(nid,0) for nid in df_all_nodes[df_all_nodes['role']=='client']['id']}
-            storage_nodes_visits = {nid: node_visits.get(nid,0) for nid in df_all_nodes[df_all_nodes['role']=='storage']['id']}
-            recharge_nodes_visits = {nid: node_visits.get(nid,0) for nid in df_all_nodes[df_all_nodes['role']=='recharge']['id']}
-
-            top_n = 5
-            top_clients = Counter(client_nodes_visits).most_common(top_n)
-            top_storages = Counter(storage_nodes_visits).most_common(top_n)
-            top_recharges = Counter(recharge_nodes_visits).most_common(top_n)
-            
-            if top_clients or top_storages or top_recharges:
-                fig_bar, ax_bar = plt.subplots(figsize=(6, 4)) # Adjusted size
-                
-                bar_data = {}
-                if top_clients:
-                    bar_data.update(dict(top_clients))
-                if top_storages:
-                    bar_data.update(dict(top_storages)) # Note: if node IDs overlap, this will overwrite. Assuming IDs are unique across roles.
-                if top_recharges:                                 # If node IDs can be e.g. "N1" for client and "N1" for storage, this needs care.
-                    bar_data.update(dict(top_recharges))      # For this project, node IDs are unique (A, B, C...).
-
-                node_ids_for_bar = list(bar_data.keys())
-                visit_counts_for_bar = list(bar_data.values())
-                colors_for_bar = []
-                for nid in node_ids_for_bar:
-                    role = df_all_nodes[df_all_nodes['id'] == nid]['role'].iloc[0]
-                    if role == 'client': colors_for_bar.append('red')
-                    elif role == 'storage': colors_for_bar.append('blue')
-                    elif role == 'recharge': colors_for_bar.append('green')
-                    else: colors_for_bar.append('gray')
-
-                ax_bar.bar(node_ids_for_bar, visit_counts_for_bar, color=colors_for_bar)
-                ax_bar.set_xlabel("Nodo ID")
-                ax_bar.set_ylabel("Número de Visitas")
-                ax_bar.set_title(f"Top Nodos Visitados (hasta N={top_n} por categoría)")
-                plt.xticks(rotation=45, ha="right")
-                plt.tight_layout() # Important for labels not getting cut off
-
-                img_bar_data = fig_to_img_bytes(fig_bar)
-                story.append(Image(img_bar_data, width=5.5*inch, height=3.7*inch)) # Adjusted size
-            else:
-                story.append(Paragraph("No hay suficientes datos de visitas para generar el gráfico de barras de nodos.", styles['Normal']))
-        else:
+        if not rutas_usadas:
             story.append(Paragraph("No hay datos de rutas usadas para generar el gráfico de barras de visitas a nodos.", styles['Normal']))
+        elif not contenido_graficos["visitas"]:
+            story.append(Paragraph("No hay suficientes datos de visitas para generar el gráfico de barras de nodos.", styles['Normal']))
+        elif graficos == GRAFICOS_PNG:
+            story.append(Image(BytesIO(contenido_graficos["png_visitas"]), width=5.5*inch, height=3.7*inch)) # Adjusted size
+        else:
+            story.append(_grafico_visitas_vectorial(contenido_graficos["visitas"], contenido_graficos["top_n"]))
     else:
         story.append(Paragraph("No hay datos de nodos para generar gráficas.", styles['Normal']))
 
-    doc.build(story)
+    return story
+
+def _filas_clientes(nodos, ordenes, rutas_usadas, indice_rutas):
+    resumen = {} # cliente_id -> [órdenes, entregadas, costo]
+    for orden in ordenes or ():
+        cliente_id = orden.get('cliente_id')
+        if cliente_id is None:
+            continue
+        fila = resumen.get(cliente_id)
+        if fila is None:
+            fila = resumen[cliente_id] = [0, 0, 0.0]
+        fila[0] += 1
+        if orden.get('status') == 'Delivered':
+            fila[1] += 1
+        fila[2] += orden.get('costo_total') or 0
+    nombres = {n['client_id']: n.get('nombre') for n in nodos if n.get('role') == 'client' and 'client_id' in n}
+    for cliente_id in sorted(resumen, key=lambda c: (-resumen[c][0], str(c))):
+        total, entregadas, costo = resumen[cliente_id]
+        nombre = nombres.get(cliente_id)
+        yield (str(cliente_id), 'N/A' if nombre is None or pd.isna(nombre) else nombre, total, entregadas, float(costo))
+
+def _filas_nodos(nodos, ordenes, rutas_usadas, indice_rutas):
+    node_visits = _visitas_por_nodo(rutas_usadas) if rutas_usadas else Counter()
+    for n in nodos:
+        yield (n['id'], n.get('role', 'Desconocido'), node_visits.get(n['id'], 0), float(n['lat']), float(n['lon']))
+
+def _filas_rutas(nodos, ordenes, rutas_usadas, indice_rutas):
+    if indice_rutas is not None:
+        yield from indice_rutas.items()
+    elif rutas_usadas:
+        yield from sorted(rutas_usadas.items(), key=lambda item: (-item[1], item[0]))
+
+def _celda_ruta(ruta):
+    """
+    Route as plain single-line text. A route wider than its column keeps its first and
+    last nodes around "…"; the CSV/Parquet exports have every route whole.
+    """
+    disponible = ANCHO_RUTA - RELLENO_CELDA
+    if stringWidth(ruta, *FUENTE_CELDA) <= disponible:
+        return ruta
+    nodos = ruta.split(" → ")
+    separador = stringWidth(" → ", *FUENTE_CELDA)
+    disponible -= stringWidth(" → … → ", *FUENTE_CELDA)
+    inicio, fin = [], []
+    i, j = 0, len(nodos) - 1
+    # Se alternan nodos del principio y del final mientras quepan
+    while i <= j:
+        lado = inicio if len(inicio) <= len(fin) else fin
+        nodo = nodos[i] if lado is inicio else nodos[j]
+        ancho = stringWidth(nodo, *FUENTE_CELDA) + (separador if lado else 0)
+        if ancho > disponible:
+            break
+        disponible -= ancho
+        lado.append(nodo)
+        if lado is inicio:
+            i += 1
+        else:
+            j -= 1
+    if not inicio or not fin:
+        # Un solo nodo no cabe: se corta por caracteres
+        corte = len(ruta)
+        while corte and stringWidth(ruta[:corte] + "…", *FUENTE_CELDA) > ANCHO_RUTA - RELLENO_CELDA:
+            corte -= 1
+        return ruta[:corte] + "…"
+    return " → ".join(inicio) + " → … → " + " → ".join(reversed(fin))
+
+_decimales = "{:.2f}".format
+_coordenada = "{:.5f}".format
+
+# Apéndices del informe completo: columnas (nombre y tipo) de las exportaciones, y título, encabezados,
+# anchos y formato de cada celda en el PDF
+APENDICES = {
+    "clientes": {
+        "titulo": "Apéndice: Órdenes por Cliente",
+        "columnas": [("cliente_id", "string"), ("nombre", "string"), ("total_ordenes", "int64"),
+                     ("entregadas", "int64"), ("costo_total", "float64")],
+        "encabezados": ["Cliente ID", "Nombre", "Total Órdenes", "Entregadas", "Costo Total"],
+        "anchos": [1*inch, 1.8*inch, 1.2*inch, 1*inch, 1*inch],
+        "formatos": [str, str, str, str, _decimales],
+        "filas": _filas_clientes,
+    },
+    "nodos": {
+        "titulo": "Apéndice: Visitas por Nodo",
+        "columnas": [("nodo_id", "string"), ("rol", "string"), ("visitas", "int64"),
+                     ("lat", "float64"), ("lon", "float64")],
+        "encabezados": ["Nodo ID", "Rol", "Visitas", "Latitud", "Longitud"],
+        "anchos": [1.2*inch, 1.2*inch, 1*inch, 1.3*inch, 1.3*inch],
+        "formatos": [str, str, str, _coordenada, _coordenada],
+        "filas": _filas_nodos,
+    },
+    "rutas": {
+        "titulo": "Apéndice: Frecuencia de Rutas",
+        "columnas": [("ruta", "string"), ("frecuencia", "int64")],
+        "encabezados": ["Ruta", "Frecuencia"],
+        "anchos": [ANCHO_RUTA, 1*inch],
+        "formatos": [_celda_ruta, str],
+        "filas": _filas_rutas,
+    },
+}
+
+def filas_apendice(apendice, nodos, ordenes, rutas_usadas, indice_rutas=None):
+    """
+    Every row of one appendix (tuples in APENDICES[apendice]["columnas"] order), as a generator:
+    clients by number of orders, nodes in file order with their visits, routes most frequent first.
+    """
+    return APENDICES[apendice]["filas"](nodos, ordenes, rutas_usadas, indice_rutas)
+
+def _bloques(filas, tamano):
+    filas = iter(filas)
+    while True:
+        bloque = list(islice(filas, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+def _filas_que_caben(encabezados, anchos, alto):
+    """Rows of an appendix table (header repeated, one line per cell) that fit in `alto` points."""
+    _, con_una = _tabla([encabezados, [""] * len(anchos)], anchos).wrap(0, alto)
+    _, con_dos = _tabla([encabezados] + [[""] * len(anchos)] * 2, anchos).wrap(0, alto)
+    alto_fila = con_dos - con_una
+    return max(1, int((alto - (con_una - alto_fila)) // alto_fila))
+
+def _tablas_por_pagina(filas, primera, por_pagina):
+    """Blocks of rows: `primera` rows for the page with the title, then `por_pagina` per page."""
+    filas = iter(filas)
+    bloque = list(islice(filas, primera))
+    while bloque:
+        yield bloque
+        bloque = list(islice(filas, por_pagina))
+
+def _historia_apendices(apendices, nodos, ordenes, rutas_usadas, indice_rutas, max_filas, styles, ancho, alto):
+    """
+    Appendix flowables, one table per page: each table has as many rows as fit in the
+    `ancho` x `alto` frame, so ReportLab never has to split one.
+    """
+    for apendice in apendices:
+        spec = APENDICES[apendice]
+        formatos = spec["formatos"]
+        yield PageBreak()
+        titulo = Paragraph(spec["titulo"], styles['h2'])
+        # En lo alto del marco ReportLab omite spaceBefore; spaceAfter sí ocupa lugar
+        _, alto_titulo = titulo.wrap(ancho, alto)
+        yield titulo
+        por_pagina = _filas_que_caben(spec["encabezados"], spec["anchos"], alto)
+        primera = _filas_que_caben(spec["encabezados"], spec["anchos"], alto - alto_titulo - styles['h2'].spaceAfter)
+        filas = filas_apendice(apendice, nodos, ordenes, rutas_usadas, indice_rutas)
+        total = 0
+        for bloque in _tablas_por_pagina(islice(filas, max_filas), primera, por_pagina):
+            data = [spec["encabezados"]]
+            data.extend([formato(valor) for formato, valor in zip(formatos, fila)] for fila in bloque)
+            yield _tabla(data, spec["anchos"], repeat_rows=1)
+            total += len(bloque)
+        if not total:
+            yield Paragraph("No hay datos para este apéndice.", styles['Normal'])
+        elif total == max_filas and next(filas, None) is not None:
+            yield Spacer(1, 0.1*inch)
+            yield Paragraph(f"Se muestran las primeras {max_filas} filas; el apéndice completo está en la exportación CSV/Parquet.",
+                            styles['Normal'])
+
+class _HistoriaPerezosa(list):
+    """
+    Story for doc.build that is filled from an iterable while ReportLab consumes it.
+    The build loop checks len(flowables) before handling each flowable, so topping
+    the list up there keeps only FLOWABLES_EN_ESPERA flowables alive instead of
+    every table of the report.
+    """
+    def __init__(self, flowables):
+        super().__init__()
+        self._pendientes = iter(flowables)
+
+    def __len__(self):
+        while self._pendientes is not None and list.__len__(self) < FLOWABLES_EN_ESPERA:
+            siguiente = next(self._pendientes, None)
+            if siguiente is None:
+                self._pendientes = None
+            else:
+                self.append(siguiente)
+        return list.__len__(self)
+
+def generate_report_pdf(nodos, ordenes, rutas_usadas, indice_rutas=None, graficos=GRAFICOS_VECTORIALES,
+                        dpi=DPI_POR_DEFECTO, version=None):
+    """
+    PDF report of the simulation data.
+
+    indice_rutas: optional IndiceFrecuencias already built over rutas_usadas (top-k without scanning every route).
+    graficos: GRAFICOS_VECTORIALES draws the charts as ReportLab vector graphics; GRAFICOS_PNG embeds
+        matplotlib charts rasterised at `dpi`.
+    version: identifier of the data (e.g. the API's data_version). When given, the computed tables and
+        charts are cached under it and reused by later reports of the same data and chart options.
+    """
+    contenido = _contenido_en_cache(nodos, ordenes, rutas_usadas, indice_rutas, graficos, dpi, version)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=72, leftMargin=72,
+                            topMargin=72, bottomMargin=18)
+    doc.build(_historia_resumen(contenido, rutas_usadas, graficos, getSampleStyleSheet()))
     buffer.seek(0)
     return buffer
+
+def generate_full_report_pdf(destino, nodos, ordenes, rutas_usadas, indice_rutas=None, apendices=tuple(APENDICES),
+                             graficos=GRAFICOS_VECTORIALES, dpi=DPI_POR_DEFECTO, version=None, max_filas=None):
+    """
+    The summary report followed by full appendices (see APENDICES), written to `destino`
+    (a path or a binary file object).
+
+    Appendix tables are generated one page of rows at a time while the document is laid
+    out, so no list of every row or every table is ever built. ReportLab still keeps
+    the drawing commands of finished pages until the file is saved, so memory grows with
+    the number of pages (tens of MB per hundred thousand rows); for larger data sets use
+    max_filas and the CSV/Parquet exports (exportar_apendice).
+
+    apendices: keys of APENDICES to append, in order.
+    max_filas: optional limit of rows per appendix; a note is added where an appendix is cut.
+    The other arguments are those of generate_report_pdf.
+    """
+    contenido = _contenido_en_cache(nodos, ordenes, rutas_usadas, indice_rutas, graficos, dpi, version)
+    styles = getSampleStyleSheet()
+    doc = SimpleDocTemplate(destino, pagesize=letter,
+                            rightMargin=72, leftMargin=72,
+                            topMargin=72, bottomMargin=18, pageCompression=1)
+    doc.build(_HistoriaPerezosa(chain(
+        _historia_resumen(contenido, rutas_usadas, graficos, styles),
+        _historia_apendices(apendices, nodos, ordenes, rutas_usadas, indice_rutas, max_filas, styles,
+                            doc.width - RELLENO_MARCO, doc.height - RELLENO_MARCO))))
+    return destino
+
+def iter_apendice_csv(apendice, nodos, ordenes, rutas_usadas, indice_rutas=None):
+    """CSV of one appendix as UTF-8 byte chunks: the header, then FILAS_POR_BLOQUE rows per chunk."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([nombre for nombre, _ in APENDICES[apendice]["columnas"]])
+    for bloque in _bloques(filas_apendice(apendice, nodos, ordenes, rutas_usadas, indice_rutas), FILAS_POR_BLOQUE):
+        writer.writerows(bloque)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell(): # Apéndice vacío: solo el encabezado
+        yield buffer.getvalue().encode("utf-8")
+
+def exportar_apendice(destino, apendice, nodos, ordenes, rutas_usadas, indice_rutas=None, formato=FORMATO_CSV):
+    """
+    Writes one appendix to `destino` (a path) as CSV or Parquet, FILAS_POR_BLOQUE rows at a time.
+    Parquet needs pyarrow, which is imported only here.
+    """
+    if formato == FORMATO_CSV:
+        with open(destino, "wb") as f:
+            for trozo in iter_apendice_csv(apendice, nodos, ordenes, rutas_usadas, indice_rutas):
+                f.write(trozo)
+    elif formato == FORMATO_PARQUET:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(nombre, getattr(pa, tipo)()) for nombre, tipo in APENDICES[apendice]["columnas"]])
+        with pq.ParquetWriter(destino, schema) as writer:
+            for bloque in _bloques(filas_apendice(apendice, nodos, ordenes, rutas_usadas, indice_rutas), FILAS_POR_BLOQUE):
+                columnas = [pa.array(valores, type=campo.type) for valores, campo in zip(zip(*bloque), schema)]
+                writer.write_batch(pa.RecordBatch.from_arrays(columnas, schema=schema))
+    else:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    return destino
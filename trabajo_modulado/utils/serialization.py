@@ -0,0 +1,143 @@
+"""
+JSON encoding with an optional fast backend.
+
+orjson or msgspec are used when installed, otherwise the standard library
+json module. Everything works on bytes so API responses and the data files
+in api/data go through the same encoder. Files are written compact (no
+indentation) and atomically, so a reader never sees a half-written file.
+Large arrays can be streamed to disk chunk by chunk with dump_array_file, and
+grown with append_array_file without encoding the items already stored.
+"""
+import json
+import os
+import shutil
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _default(obj):
+    # numpy scalars (coordinates from generar_nodos, weights from generar_aristas_aleatorias)
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+    DecodeError = (orjson.JSONDecodeError,)
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+    DecodeError = (msgspec.DecodeError,)
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj):
+        return _encoder.encode(obj)
+
+    def loads(data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return _decoder.decode(data)
+
+else:
+    JSON_BACKEND = "json"
+    DecodeError = (json.JSONDecodeError, UnicodeDecodeError)
+
+    def dumps(obj):
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+def load_file(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump_file(path, obj):
+    """Writes obj to path atomically. Returns the os.stat_result of the written file."""
+    payload = dumps(obj)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            stat = os.fstat(f.fileno())
+        os.replace(tmp_path, path) # Keeps the inode, size and mtime of the temporary file
+        return stat
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def dump_array_file(path, chunks):
+    """
+    Writes an iterable of lists to `path` as one JSON array, encoding a chunk
+    at a time so the full array never has to be built in memory. Atomic like
+    dump_file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(b"[")
+            first = True
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if not first:
+                    f.write(b",")
+                f.write(dumps(chunk)[1:-1])
+                first = False
+            f.write(b"]")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def append_array_file(path, items):
+    """
+    Appends `items` to the JSON array stored at `path`, encoding only the new
+    items: the file is copied and its closing bracket replaced. Atomic like
+    dump_file. Returns the os.stat_result of the written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        shutil.copyfile(path, tmp_path)
+        with open(tmp_path, "r+b") as f:
+            f.seek(-2, os.SEEK_END)
+            final = f.read(2)
+            if not final.endswith(b"]"):
+                raise ValueError(f"{os.path.basename(path)} does not end with a JSON array")
+            f.seek(-1, os.SEEK_END)
+            if items:
+                f.write(dumps(items)[1:] if final == b"[]" else b"," + dumps(items)[1:])
+            else:
+                f.write(b"]")
+            f.flush()
+            stat = os.fstat(f.fileno())
+        os.replace(tmp_path, path)
+        return stat
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,11 +1,16 @@
 import matplotlib.pyplot as plt
 import networkx as nx
 import streamlit as st
+import json
 import folium
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import st_folium
+from .map_builder import create_base_map
 
 # Temuco's approximate center
 TEMUCO_CENTER = [-38.7359, -72.5904]
+PROFUNDIDAD_AVL = 4 # Niveles dibujados por defecto: a lo más 2^4 - 1 = 15 nodos, sin importar el tamaño del árbol
+PROFUNDIDAD_AVL_MAXIMA = 6
 
 def visualizar_red(G, ruta=None): # This is the old function, will be replaced by folium map
     pos = nx.spring_layout(G, seed=42)
@@ -33,65 +38,145 @@ def visualizar_red(G, ruta=None): # This is the old function, will be replaced b
     st.pyplot(plt.gcf())
 
 
-def visualizar_mapa_folium(G, ruta=None, mst_edges=None):
-    # Create a Folium map centered on Temuco
-    m = folium.Map(location=TEMUCO_CENTER, zoom_start=13)
-
-    role_colors_map = {"storage": "blue", "recharge": "green", "client": "red", "default": "gray"}
-    node_info = G.nodes(data=True)
-
-    # Add nodes to the map
-    for node_id, data in node_info:
-        lat = data.get("lat")
-        lon = data.get("lon")
-        role = data.get("role", "default")
-        color = role_colors_map.get(role, "gray")
-        
-        if lat is not None and lon is not None:
-            tooltip_text = f"ID: {node_id}<br>Role: {role}"
-            if role == "client":
-                tooltip_text += f"<br>Client ID: {data.get('client_id', 'N/A')}"
-                tooltip_text += f"<br>Name: {data.get('nombre', 'N/A')}"
-            
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=5,
-                color=color,
-                fill=True,
-                fill_color=color,
-                fill_opacity=0.7,
-                tooltip=tooltip_text
-            ).add_to(m)
-
-    # Add all edges to the map (thin gray lines)
-    for u, v, data in G.edges(data=True):
-        u_data = G.nodes[u]
-        v_data = G.nodes[v]
-        if all(k in u_data for k in ("lat", "lon")) and all(k in v_data for k in ("lat", "lon")):
-            points = [(u_data["lat"], u_data["lon"]), (v_data["lat"], v_data["lon"])]
-            folium.PolyLine(points, color="gray", weight=1, opacity=0.5).add_to(m)
+ROLE_COLORS_MAP = {"storage": "blue", "recharge": "green", "client": "red", "default": "gray"}
+UMBRAL_CLUSTER = 300 # Con más nodos se dibujan agrupados en clústeres (FastMarkerCluster) en lugar de uno por uno
+UMBRAL_ARISTAS = 5000 # Con más aristas la capa de aristas empieza oculta (se activa en el control de capas)
+DECIMALES_COORDENADAS = 5 # ~1 m; acorta el GeoJSON que se envía al navegador
+
+# Marcador de cada nodo en modo clúster: fila [lat, lon, rol, tooltip]
+_CALLBACK_NODO = """
+function (row) {
+    var colores = %s;
+    var color = colores[row[2]] || colores["default"];
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 5, color: color, fill: true, fillColor: color, fillOpacity: 0.7});
+    marker.bindTooltip(row[3]);
+    return marker;
+}
+""" % json.dumps(ROLE_COLORS_MAP)
+
+
+def _coordenadas(data):
+    lat, lon = data.get("lat"), data.get("lon")
+    if lat is None or lon is None:
+        return None
+    return [round(float(lon), DECIMALES_COORDENADAS), round(float(lat), DECIMALES_COORDENADAS)]
+
+
+def _tooltip_nodo(node_id, data):
+    role = data.get("role", "default")
+    tooltip_text = f"ID: {node_id}<br>Role: {role}"
+    if role == "client":
+        tooltip_text += f"<br>Client ID: {data.get('client_id', 'N/A')}"
+        tooltip_text += f"<br>Name: {data.get('nombre', 'N/A')}"
+    return tooltip_text
+
+
+def nodos_geojson(G):
+    """Nodes with coordinates as one GeoJSON FeatureCollection of points (role and tooltip as properties)."""
+    features = []
+    for node_id, data in G.nodes(data=True):
+        punto = _coordenadas(data)
+        if punto is not None:
+            features.append({"type": "Feature", "geometry": {"type": "Point", "coordinates": punto},
+                             "properties": {"role": data.get("role", "default"), "tooltip": _tooltip_nodo(node_id, data)}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def aristas_geojson(G, aristas=None, etiqueta=None):
+    """
+    Edges as GeoJSON. Without `etiqueta` all of them go in a single
+    MultiLineString feature (the base layer has no per-edge tooltip);
+    with it, one LineString per edge whose tooltip is etiqueta(u, v).
+    """
+    lineas = []
+    for u, v in (G.edges() if aristas is None else aristas):
+        a, b = _coordenadas(G.nodes[u]), _coordenadas(G.nodes[v])
+        if a is not None and b is not None:
+            lineas.append((u, v, [a, b]))
+    if etiqueta is None:
+        features = [{"type": "Feature", "geometry": {"type": "MultiLineString", "coordinates": [l for _, _, l in lineas]},
+                     "properties": {}}] if lineas else []
+    else:
+        features = [{"type": "Feature", "geometry": {"type": "LineString", "coordinates": l},
+                     "properties": {"tooltip": etiqueta(u, v)}} for u, v, l in lineas]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def construir_mapa_base(G):
+    """
+    Map with the whole network, independent of any highlight: edges as one
+    GeoJSON layer (simplified per zoom level by Leaflet's smooth_factor) and
+    nodes as one GeoJSON layer, or clustered with FastMarkerCluster above
+    UMBRAL_CLUSTER nodes. visualizar_mapa_folium keeps the returned object
+    per graph, which only saves building these layers: st_folium renders the
+    whole map again and re-sends it on every rerun, so an overlay-only update
+    (sending just the highlight) is not achieved.
+    """
+    m = create_base_map(TEMUCO_CENTER[0], TEMUCO_CENTER[1], zoom_start=13, prefer_canvas=True)
+
+    if G.number_of_edges():
+        folium.GeoJson(aristas_geojson(G), name="Aristas", smooth_factor=2.0, show=G.number_of_edges() <= UMBRAL_ARISTAS,
+                       style_function=lambda feature: {"color": "gray", "weight": 1, "opacity": 0.5}).add_to(m)
+
+    if G.number_of_nodes() > UMBRAL_CLUSTER:
+        filas = []
+        for node_id, data in G.nodes(data=True):
+            punto = _coordenadas(data)
+            if punto is not None:
+                filas.append([punto[1], punto[0], data.get("role", "default"), _tooltip_nodo(node_id, data)])
+        FastMarkerCluster(filas, callback=_CALLBACK_NODO, name="Nodos").add_to(m)
+    else:
+        nodos = nodos_geojson(G)
+        # folium rejects a tooltip field on an empty layer; nodes without coordinates are not drawn
+        if nodos["features"]:
+            folium.GeoJson(nodos, name="Nodos",
+                           marker=folium.CircleMarker(radius=5, fill=True, fill_opacity=0.7),
+                           style_function=lambda feature: {"color": ROLE_COLORS_MAP.get(feature["properties"]["role"], "gray"),
+                                                           "fillColor": ROLE_COLORS_MAP.get(feature["properties"]["role"], "gray")},
+                           tooltip=folium.GeoJsonTooltip(fields=["tooltip"], labels=False)).add_to(m)
+
+    folium.LayerControl().add_to(m)
+    return m
 
+
+def capa_resaltado(G, ruta=None, mst_edges=None):
+    """Feature group with only the highlighted MST edges and/or route, sent on top of the cached base map."""
+    capa = folium.FeatureGroup(name="Resaltado")
     # Highlight MST edges if provided (thicker, distinct color e.g., purple)
-    if mst_edges:
-        for u, v in mst_edges:
-            u_data = G.nodes[u]
-            v_data = G.nodes[v]
-            if all(k in u_data for k in ("lat", "lon")) and all(k in v_data for k in ("lat", "lon")):
-                points = [(u_data["lat"], u_data["lon"]), (v_data["lat"], v_data["lon"])]
-                folium.PolyLine(points, color="purple", weight=3, opacity=0.8, tooltip=f"MST Edge: {u}-{v}").add_to(m)
-    
+    mst = aristas_geojson(G, mst_edges, lambda u, v: f"MST Edge: {u}-{v}") if mst_edges else None
+    if mst and mst["features"]:
+        folium.GeoJson(mst,
+                       style_function=lambda feature: {"color": "purple", "weight": 3, "opacity": 0.8},
+                       tooltip=folium.GeoJsonTooltip(fields=["tooltip"], labels=False)).add_to(capa)
     # Highlight the specific route if provided (thicker, distinct color e.g., orange)
-    if ruta:
-        aristas_ruta = list(zip(ruta, ruta[1:]))
-        for u, v in aristas_ruta:
-            u_data = G.nodes[u]
-            v_data = G.nodes[v]
-            if all(k in u_data for k in ("lat", "lon")) and all(k in v_data for k in ("lat", "lon")):
-                points = [(u_data["lat"], u_data["lon"]), (v_data["lat"], v_data["lon"])]
-                folium.PolyLine(points, color="orange", weight=4, opacity=1, tooltip=f"Route: {u} → {v}").add_to(m)
+    tramos = aristas_geojson(G, list(zip(ruta, ruta[1:])), lambda u, v: f"Route: {u} → {v}") if ruta else None
+    if tramos and tramos["features"]:
+        folium.GeoJson(tramos,
+                       style_function=lambda feature: {"color": "orange", "weight": 4, "opacity": 1},
+                       tooltip=folium.GeoJsonTooltip(fields=["tooltip"], labels=False)).add_to(capa)
+    return capa
+
+
+def visualizar_mapa_folium(G, ruta=None, mst_edges=None):
+    """
+    Shows the network on a Folium map. The base map object is built once per
+    graph (same object and G.graph["version"], node and edge counts) and kept
+    in session_state, so its layers are not rebuilt. st_folium still renders
+    it to a JS string and sends it to the browser on every rerun; the route
+    or MST highlight goes in feature_group_to_add, so changing it updates the
+    keyed component without remounting the Leaflet map.
+    """
+    firma = (G.graph.get("version", 0), G.number_of_nodes(), G.number_of_edges())
+    cache = st.session_state.get("mapa_base")
+    # Se guarda el grafo mismo para no confundir un grafo nuevo con la misma firma
+    if cache is None or cache[0] is not G or cache[1] != firma:
+        cache = (G, firma, construir_mapa_base(G))
+        st.session_state["mapa_base"] = cache
 
     # Display the map in Streamlit
-    st_folium(m, width=700, height=500)
+    st_folium(cache[2], width=700, height=500, key="mapa_red", render=False,
+              feature_group_to_add=capa_resaltado(G, ruta, mst_edges), returned_objects=[])
 
 
 def asignar_etiquetas_cortas(nodos_ids):
@@ -120,48 +205,109 @@ def node_label(node):
     return f"{ruta_str}\nFreq: {node.freq}"
 
 
-def avl_to_networkx(root):
-    G = nx.DiGraph()
+def layout_avl(root, profundidad=PROFUNDIDAD_AVL):
+    """
+    Layout of the top `profundidad` levels of the subtree at `root`,
+    computed iteratively: x is the in-order position among the drawn nodes,
+    y minus the depth. Nodes are identified by position, not by label, so
+    equal labels don't collide. Cost depends on the drawn levels only.
 
-    def add_edges(node):
-        if not node:
-            return
-        label = node_label(node)
-        G.add_node(label)
-        if node.left:
-            left_label = node_label(node.left)
-            G.add_edge(label, left_label)
-            add_edges(node.left)
-        if node.right:
-            right_label = node_label(node.right)
-            G.add_edge(label, right_label)
-            add_edges(node.right)
+    Returns:
+        dict: nodos, list of (key, label, x, y, hidden descendants), and
+        aristas, list of (parent position, child position).
+    """
+    visibles = [] # (nodo, nivel, padre) en orden
+    pila = []
+    nodo, nivel, padre = root, 0, None
+    while pila or nodo:
+        while nodo:
+            pila.append((nodo, nivel, padre))
+            nodo, nivel, padre = (nodo.left, nivel + 1, nodo) if nivel + 1 < profundidad else (None, nivel, padre)
+        nodo, nivel, padre = pila.pop()
+        visibles.append((nodo, nivel, padre))
+        nodo, nivel, padre = (nodo.right, nivel + 1, nodo) if nivel + 1 < profundidad else (None, nivel, padre)
 
-    add_edges(root)
-    return G
+    posicion = {id(n): i for i, (n, _, _) in enumerate(visibles)}
+    nodos = []
+    aristas = []
+    for i, (n, nivel, padre) in enumerate(visibles):
+        # En el último nivel dibujado se indica cuántos descendientes quedan ocultos
+        ocultos = n.size - 1 if nivel == profundidad - 1 else 0
+        nodos.append((n.key, node_label(n), i, -nivel, ocultos))
+        if padre is not None:
+            aristas.append((posicion[id(padre)], i))
+    return {"nodos": nodos, "aristas": aristas}
+
+
+def dibujar_layout_avl(layout):
+    nodos, aristas = layout["nodos"], layout["aristas"]
+    fig, ax = plt.subplots(figsize=(12, 6))
+    for i, j in aristas:
+        ax.plot([nodos[i][2], nodos[j][2]], [nodos[i][3], nodos[j][3]], color="gray", linewidth=1, zorder=1)
+    colores = ["orange" if ocultos else "lightblue" for *_, ocultos in nodos]
+    ax.scatter([n[2] for n in nodos], [n[3] for n in nodos], s=1200, c=colores, zorder=2)
+    tamano = 8 if len(nodos) <= 15 else 6
+    for _, etiqueta, x, y, ocultos in nodos:
+        ax.text(x, y, etiqueta, ha="center", va="center", fontsize=tamano, fontweight="bold", zorder=3)
+        if ocultos:
+            ax.text(x, y - 0.4, f"+{ocultos} nodos", ha="center", va="center", fontsize=tamano, color="dimgray")
+    ax.set_ylim(min(n[3] for n in nodos) - 0.7, 0.5)
+    ax.set_xlim(-0.7, len(nodos) - 0.3)
+    ax.axis("off")
+    return fig
 
-def assign_positions(root):
-    positions = {}
-    def _assign(node, depth, pos):
-        if node is None:
-            return
-        label = node_label(node)
-        positions[label] = (pos, -depth)
-        offset = 1 / (depth + 2)
-        _assign(node.left, depth + 1, pos - offset)
-        _assign(node.right, depth + 1, pos + offset)
-    _assign(root, 0, 0.5)
-    return positions
-
-def visualizar_avl(root):
+
+def visualizar_avl(root, version=None, key="avl"):
+    """
+    Draws a window of the AVL tree: `PROFUNDIDAD_AVL` levels (adjustable)
+    below a chosen subtree root, so drawing time does not grow with the
+    tree. Orange nodes have hidden descendants; choosing one in "Expandir
+    subárbol" redraws the tree from that node. The layout is kept in
+    session_state and reused while the tree (`version`, e.g.
+    IndiceRutas.version), the subtree and the depth stay the same.
+    """
     if not root:
         st.info("El árbol AVL está vacío.")
         return
 
-    G = avl_to_networkx(root)
-    pos = assign_positions(root)
+    estado_foco = f"{key}_foco"
+    foco = st.session_state.get(estado_foco)
+    subarbol = root
+    if foco is not None:
+        while subarbol and subarbol.key != foco:
+            subarbol = subarbol.left if foco < subarbol.key else subarbol.right
+        if subarbol is None:
+            # La ruta ya no está en el árbol: se vuelve a la raíz
+            st.session_state[estado_foco] = foco = None
+            subarbol = root
 
-    plt.figure(figsize=(12, 8))
-    nx.draw(G, pos, with_labels=True, node_size=2500, node_color="lightblue",
-            font_size=8, font_weight="bold", arrows=True)
-    st.pyplot(plt.gcf())
+    col1, col2 = st.columns([3, 1])
+    profundidad = col1.slider("Niveles visibles", min_value=1, max_value=PROFUNDIDAD_AVL_MAXIMA,
+                              value=PROFUNDIDAD_AVL, key=f"{key}_profundidad")
+    if foco is not None and col2.button("⬆ Volver a la raíz", key=f"{key}_raiz"):
+        st.session_state[estado_foco] = None
+        st.rerun()
+
+    # El layout se reutiliza mientras no cambien el árbol, el subárbol ni la profundidad;
+    # se guarda la raíz misma para no confundir un árbol nuevo con la misma versión
+    cache = st.session_state.get(f"{key}_layout")
+    firma = (version, foco, profundidad)
+    if version is None or cache is None or cache[0] is not root or cache[1] != firma:
+        cache = (root, firma, layout_avl(subarbol, profundidad))
+        st.session_state[f"{key}_layout"] = cache
+    layout = cache[2]
+
+    st.caption(f"{subarbol.size} nodos en este subárbol (altura {subarbol.height}); se muestran {len(layout['nodos'])}.")
+    fig = dibujar_layout_avl(layout)
+    st.pyplot(fig)
+    plt.close(fig)
+
+    expandibles = [(clave, etiqueta) for clave, etiqueta, _, _, ocultos in layout["nodos"] if ocultos]
+    if expandibles:
+        etiquetas = dict(expandibles)
+        elegido = st.selectbox("Expandir subárbol", [None] + [clave for clave, _ in expandibles],
+                               format_func=lambda clave: "—" if clave is None else etiquetas[clave].replace("\n", " | "),
+                               key=f"{key}_expandir_{foco}_{profundidad}")
+        if elegido is not None:
+            st.session_state[estado_foco] = elegido
+            st.rerun()
@@ -1,12 +1,15 @@
 import folium
 
-def create_base_map(center_lat=-38.7359, center_lon=-72.5904, zoom_start=13):
+def create_base_map(center_lat=-38.7359, center_lon=-72.5904, zoom_start=13, prefer_canvas=False):
     """
     Crea y retorna un mapa base centrado en Temuco o en las coordenadas indicadas.
+    Con prefer_canvas las capas vectoriales se dibujan en un canvas, mucho más
+    rápido que SVG cuando hay miles de nodos o aristas.
     """
     my_map = folium.Map(
         location=[center_lat, center_lon],
         zoom_start=zoom_start,
-        control_scale=True
+        control_scale=True,
+        prefer_canvas=prefer_canvas
     )
     return my_map